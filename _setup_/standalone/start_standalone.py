@@ -1,2 +1,5 @@
 import mocap_browser
-mocap_browser.main()
+
+# guard so process pool workers importing this script do not open the browser
+if __name__ == "__main__":
+    mocap_browser.main()
@@ -10,7 +10,18 @@ def reload_modules():
     else:
         from imp import reload
     
+    from . import anim_data
+    from . import anim_curves
+    from . import fk_utils
+    from . import anim_source
+    from . import bvh_utils
+    from . import bake_cache
+    from . import file_crawler
+    from . import folder_cache
     from . import fbx_utils
+    from .gl_utils import camera
+    from .gl_utils import culling
+    from .gl_utils import picking
     from .gl_utils import scene_utils
     from . import mocap_browser_constants
     from . import mocap_browser_logger
@@ -18,7 +29,18 @@ def reload_modules():
     from . import mocap_browser_dcc_maya
     from . import mocap_browser_system
     from . import mocap_browser_ui
+    reload(anim_data)
+    reload(anim_curves)
+    reload(fk_utils)
+    reload(anim_source)
+    reload(bvh_utils)
+    reload(bake_cache)
+    reload(file_crawler)
+    reload(folder_cache)
     reload(fbx_utils)
+    reload(camera)
+    reload(culling)
+    reload(picking)
     reload(scene_utils)
     reload(mocap_browser_constants)
     reload(mocap_browser_logger)
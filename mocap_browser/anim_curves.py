@@ -0,0 +1,105 @@
+"""
+Keyframed animation curves evaluated with NumPy
+
+memory is proportional to the number of keys, so keyframe reduced clips stay small,
+and evaluation at any number of (fractional) frame times is a single vectorized pass
+"""
+import numpy as np
+
+INTERPOLATION_CONSTANT = 0
+INTERPOLATION_LINEAR = 1
+INTERPOLATION_CUBIC = 2
+
+
+class AnimCurve(object):
+    """
+    Keys of a single float channel
+
+    times are in frames, slopes are the left/right derivatives of each key in value per frame,
+    the interpolation of a key applies to the segment that starts at it.
+    values outside the keyed range hold the first/last key
+    """
+
+    def __init__(self, times, values, interpolations=None, left_slopes=None, right_slopes=None):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+
+        if interpolations is None:
+            interpolations = np.full(len(self.times), INTERPOLATION_LINEAR)
+        self.interpolations = np.asarray(interpolations, dtype=np.int8)
+
+        # cubic keys without explicit slopes get catmull-rom style tangents from their neighbours
+        if left_slopes is None or right_slopes is None:
+            estimated_slopes = self.estimate_slopes()
+        self.left_slopes = estimated_slopes if left_slopes is None else np.asarray(left_slopes, dtype=np.float64)
+        self.right_slopes = estimated_slopes if right_slopes is None else np.asarray(right_slopes, dtype=np.float64)
+
+    @property
+    def key_count(self):
+        return len(self.times)
+
+    def estimate_slopes(self):
+        if self.key_count < 2:
+            return np.zeros(self.key_count)
+        return np.gradient(self.values, self.times)
+
+    def evaluate(self, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        if self.key_count == 0:
+            return np.zeros(frames.shape)
+        if self.key_count == 1:
+            return np.full(frames.shape, self.values[0])
+
+        times = self.times
+        segments = np.clip(np.searchsorted(times, frames, side="right") - 1, 0, self.key_count - 2)
+        start_times = times[segments]
+        durations = times[segments + 1] - start_times
+        u = np.clip((frames - start_times) / np.where(durations > 0, durations, 1.0), 0.0, 1.0)
+
+        start_values = self.values[segments]
+        end_values = self.values[segments + 1]
+        interpolations = self.interpolations[segments]
+
+        # constant by default
+        result = start_values.copy()
+
+        linear = interpolations == INTERPOLATION_LINEAR
+        result[linear] = start_values[linear] + (end_values[linear] - start_values[linear]) * u[linear]
+
+        cubic = interpolations == INTERPOLATION_CUBIC
+        if cubic.any():
+            cu = u[cubic]
+            cu2 = cu * cu
+            cu3 = cu2 * cu
+            cubic_durations = durations[cubic]
+            result[cubic] = (
+                (2 * cu3 - 3 * cu2 + 1) * start_values[cubic]
+                + (cu3 - 2 * cu2 + cu) * cubic_durations * self.right_slopes[segments[cubic]]
+                + (-2 * cu3 + 3 * cu2) * end_values[cubic]
+                + (cu3 - cu2) * cubic_durations * self.left_slopes[segments[cubic] + 1]
+            )
+
+        # hold the end keys outside the keyed range
+        result[frames <= times[0]] = self.values[0]
+        result[frames >= times[-1]] = self.values[-1]
+        return result
+
+
+class CurveVectorChannel(object):
+    """three AnimCurves (or None for unanimated axes) evaluated as one (n, 3) vector channel"""
+
+    def __init__(self, static_value, curves=(None, None, None)):
+        self.static_value = np.asarray(static_value, dtype=np.float64).reshape(3)
+        self.curves = list(curves)
+
+    @property
+    def key_count(self):
+        return sum(curve.key_count for curve in self.curves if curve)
+
+    def evaluate(self, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        values = np.tile(self.static_value, (len(frames), 1))
+        for axis_index, curve in enumerate(self.curves):
+            if curve and curve.key_count:
+                values[:, axis_index] = curve.evaluate(frames)
+        return values
@@ -0,0 +1,166 @@
+import re
+import fnmatch
+
+import numpy as np
+
+# {preset name: (joint name pattern, visible)}
+JOINT_VISIBILITY_PRESETS = {
+    "Show All": (".*", True),
+    "Hide Fingers": ("Finger|Thumb|Index|Middle|Ring|Pinky", False),
+    "Hide Toes": ("Toe", False),
+    "Hide End Joints": ("_End$|End$|Nub$", False),
+}
+
+
+# joints that are taken as the performer's root for the trajectory, before falling back to the first joint,
+# the whole name after any namespace or prefix so LeftHip and pelvis_twist don't count
+ROOT_JOINT_PATTERN = r"(^|[:_| ])(hips?|pelvis)$"
+
+
+class RootTrajectory(object):
+    """
+    Ground plane path of the root joint over a whole take
+
+    points are (frames, 3) with y flattened to 0, speeds are (frames,) in units per second
+    and distances are the (frames,) cumulative distance travelled along the ground
+    """
+
+    def __init__(self, points, speeds, distances):
+        self.points = points
+        self.speeds = speeds
+        self.distances = distances
+
+    @property
+    def total_distance(self):
+        return float(self.distances[-1]) if len(self.distances) else 0.0
+
+    def get_marker_interval(self, marker_count=10):
+        """a round 1, 2 or 5 * 10^n distance between markers, giving about marker_count markers"""
+        if self.total_distance <= 0:
+            return 0.0
+        raw_interval = self.total_distance / marker_count
+        magnitude = 10 ** np.floor(np.log10(raw_interval))
+        for step in (1, 2, 5, 10):
+            if step * magnitude >= raw_interval:
+                return float(step * magnitude)
+        return float(10 * magnitude)
+
+    def get_marker_points(self, interval):
+        """(markers, 3) points along the path every interval units of distance"""
+        if interval <= 0 or len(self.points) < 2:
+            return np.zeros((0, 3), dtype=np.float32)
+
+        marker_distances = np.arange(interval, self.total_distance, interval)
+        # distances never decrease, so each marker falls between two frames
+        frame_indices = np.clip(np.searchsorted(self.distances, marker_distances), 1, len(self.distances) - 1)
+        segment_starts = self.distances[frame_indices - 1]
+        segment_lengths = self.distances[frame_indices] - segment_starts
+        blend = (marker_distances - segment_starts) / np.where(segment_lengths > 0, segment_lengths, 1.0)
+        return (
+            self.points[frame_indices - 1]
+            + (self.points[frame_indices] - self.points[frame_indices - 1]) * blend[:, np.newaxis]
+        ).astype(np.float32)
+
+
+def compile_joint_pattern(pattern):
+    """glob style patterns like *Finger* are converted, anything else is a case insensitive regex"""
+    if "*" in pattern and ".*" not in pattern:
+        pattern = fnmatch.translate(pattern)
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def get_joint_names_matching(joint_names, pattern):
+    regex = compile_joint_pattern(pattern)
+    return [name for name in joint_names if regex.search(name)]
+
+
+class BakedAnimation(object):
+    """
+    Skeleton animation sampled once into contiguous arrays
+
+    positions are stored as a (frames, joints, 3) float32 array,
+    parent_indices holds the index of each joint's parent joint (-1 for roots)
+    """
+
+    def __init__(self, joint_names, parent_indices, positions, start_frame=0, fps=30.0):
+        self.joint_names = list(joint_names)
+        self.parent_indices = np.asarray(parent_indices, dtype=np.int32)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.start_frame = int(start_frame)
+        self.fps = float(fps)
+        self.name_to_index = {name: i for i, name in enumerate(self.joint_names)}
+
+        # (bones, 2) array of [child, parent] joint indices, every joint with a parent is a bone
+        child_indices = np.flatnonzero(self.parent_indices >= 0).astype(np.int32)
+        self.bone_indices = np.stack((child_indices, self.parent_indices[child_indices]), axis=1)
+
+        self._frame_bounds = None
+        self._bounds = None
+        self._root_trajectory = None
+
+    @property
+    def frame_count(self):
+        return self.positions.shape[0]
+
+    @property
+    def joint_count(self):
+        return len(self.joint_names)
+
+    @property
+    def end_frame(self):
+        return self.start_frame + self.frame_count - 1
+
+    def get_frame_index(self, frame):
+        """Index into the positions array for a timeline frame, clamped to the baked range"""
+        frame_index = int(frame) - self.start_frame
+        return max(0, min(frame_index, self.frame_count - 1))
+
+    def get_positions(self, frame):
+        """(joints, 3) array of global joint positions at frame"""
+        return self.positions[self.get_frame_index(frame)]
+
+    def get_frame_bounds(self):
+        """(frames, 2, 3) min and max xyz corners of the box around every frame's pose, computed once"""
+        if self._frame_bounds is None:
+            self._frame_bounds = np.zeros((self.frame_count, 2, 3), dtype=np.float32)
+            if self.positions.size:
+                self._frame_bounds[:, 0] = self.positions.min(axis=1)
+                self._frame_bounds[:, 1] = self.positions.max(axis=1)
+        return self._frame_bounds
+
+    def get_pose_bounds(self, frame):
+        """(min, max) xyz corners of the box around the pose at frame"""
+        frame_bounds = self.get_frame_bounds()
+        if not len(frame_bounds):
+            return np.zeros(3, dtype=np.float32), np.zeros(3, dtype=np.float32)
+        pose_bounds = frame_bounds[self.get_frame_index(frame)]
+        return pose_bounds[0], pose_bounds[1]
+
+    def get_bounds(self):
+        """(min, max) xyz corners of the box containing every joint on every frame, computed once"""
+        if self._bounds is None:
+            frame_bounds = self.get_frame_bounds()
+            if len(frame_bounds):
+                self._bounds = (frame_bounds[:, 0].min(axis=0), frame_bounds[:, 1].max(axis=0))
+            else:
+                self._bounds = (np.zeros(3, dtype=np.float32), np.zeros(3, dtype=np.float32))
+        return self._bounds
+
+    def get_root_joint_index(self):
+        """the hips joint if there is one, otherwise the first joint"""
+        root_names = get_joint_names_matching(self.joint_names, ROOT_JOINT_PATTERN)
+        return self.name_to_index[root_names[0]] if root_names else 0
+
+    def get_root_trajectory(self):
+        """RootTrajectory of the root joint, computed once"""
+        if self._root_trajectory is None:
+            points = np.array(self.positions[:, self.get_root_joint_index()], dtype=np.float32)
+            points[:, 1] = 0.0
+
+            step_lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+            distances = np.concatenate(([0.0], np.cumsum(step_lengths)))
+            speeds = np.concatenate(([0.0], step_lengths)) * self.fps
+            if len(speeds) > 1:
+                speeds[0] = speeds[1]
+            self._root_trajectory = RootTrajectory(points, speeds.astype(np.float32), distances)
+        return self._root_trajectory
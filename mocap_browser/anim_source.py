@@ -0,0 +1,141 @@
+import os
+import importlib
+
+import numpy as np
+
+from .anim_data import BakedAnimation
+from . import mocap_browser_logger
+
+log = mocap_browser_logger.get_logger()
+
+# {file extension: (module, class name)}, modules are imported on first use
+# so formats with missing dependencies (the FBX SDK) don't break the other ones
+SOURCE_CLASSES = {
+    ".fbx": ("fbx_utils", "FbxHandler"),
+    ".bvh": ("bvh_utils", "BvhHandler"),
+}
+
+
+class AnimationSource(object):
+    """A clip the viewport can display, subclasses bake one file format into a BakedAnimation"""
+
+    def __init__(self):
+        self.file_path = ""
+        self.is_loaded = False
+        self.display_color = (1.0, 1.0, 1.0)
+        self.display_offset = np.zeros(3, dtype=np.float32)  # world offset the clip is drawn at
+        self.baked = None  # type: BakedAnimation
+
+        # (joints,) bool mask, visibility_version goes up on every change so renderers know to rebuild
+        self.joint_visibility = np.zeros(0, dtype=bool)
+        self.visibility_version = 0
+
+    def load_scene(self, file_path, progress_callback=None, bake_cache=None):
+        """
+        progress_callback is called with the load progress as a 0-1 float,
+        raising from it aborts the load
+
+        clips found in the optional bake_cache are loaded without reading the file
+        """
+        if bake_cache:
+            baked = bake_cache.get(file_path)
+            if baked:
+                self.load_baked(file_path, baked)
+                return
+
+        self.file_path = file_path
+        self.load_baked(file_path, self.bake_file(file_path, progress_callback))
+
+        if bake_cache:
+            # the clip baked fine, a cache that can't be written to only costs the next load
+            try:
+                bake_cache.put(file_path, self.baked)
+            except OSError as e:
+                log.warning(f"Failed to write bake cache entry for {file_path}: {e}")
+
+    def bake_file(self, file_path, progress_callback=None):
+        """read file_path and return its BakedAnimation"""
+        raise NotImplementedError
+
+    def load_baked(self, file_path, baked):
+        """Use animation that was already baked elsewhere, without reading the file"""
+        if 0:
+            baked = BakedAnimation()
+
+        self.file_path = file_path
+        self.baked = baked
+        baked.get_bounds()  # computed here so loader threads take the cost, not the first paint
+        self.joint_visibility = np.ones(baked.joint_count, dtype=bool)
+        self.visibility_version += 1
+        self.is_loaded = True
+
+    def unload_scene(self):
+        self.is_loaded = False
+
+    def get_start_frame(self):
+        return self.baked.start_frame
+
+    def get_end_frame(self):
+        return self.baked.end_frame
+
+    def set_joints_visible(self, joint_names, state):
+        """only touches the named joints, names that aren't in this clip are ignored"""
+        name_to_index = self.baked.name_to_index
+        joint_indices = [name_to_index[name] for name in joint_names if name in name_to_index]
+        if not joint_indices:
+            return
+        self.joint_visibility[joint_indices] = state
+        self.visibility_version += 1
+
+    def get_visible_bone_indices(self):
+        """(bones, 2) [child, parent] joint indices of the bones whose child joint is visible"""
+        bone_indices = self.baked.bone_indices
+        return bone_indices[self.joint_visibility[bone_indices[:, 0]]]
+
+    def get_fps(self):
+        return self.baked.fps
+
+
+def get_supported_extensions():
+    return list(SOURCE_CLASSES.keys())
+
+
+def is_supported_file(file_path):
+    return os.path.splitext(file_path)[-1].lower() in SOURCE_CLASSES
+
+
+def get_source_cls(file_path):
+    module_name, cls_name = SOURCE_CLASSES[os.path.splitext(file_path)[-1].lower()]
+    module = importlib.import_module(f".{module_name}", __package__)
+    return getattr(module, cls_name)
+
+
+def get_progress_range(progress_callback, start, end):
+    """progress_callback for one step of a load, maps the step's 0-1 progress onto start-end of the whole load"""
+    if progress_callback is None:
+        return None
+    return lambda progress: progress_callback(start + (end - start) * progress)
+
+
+def create_source(file_path):
+    return get_source_cls(file_path)()
+
+
+def bake_file(file_path, bake_cache=None):
+    """
+    Load and bake a single file, returning only the compact baked data.
+    Used as the entry point for loading in worker processes.
+
+    the clip is only written to bake_cache, workers evicting at the same time would race each other
+    and rescan the cache folder per file, the parent process evicts once when the whole load is done
+    """
+    anim_source = create_source(file_path)
+    baked = anim_source.bake_file(file_path)
+    anim_source.unload_scene()
+
+    if bake_cache:
+        try:
+            bake_cache.write(file_path, baked)
+        except OSError as e:
+            log.warning(f"Failed to write bake cache entry for {file_path}: {e}")
+    return baked
@@ -0,0 +1,156 @@
+"""
+Headless batch bake, warms the browser's bake cache for a whole library
+
+python -m mocap_browser.bake <folder> [<folder> ...] [--workers 8] [--ext .fbx] [--ext .bvh]
+
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+import concurrent.futures
+
+from . import anim_source
+from .bake_cache import BakeCache
+from .mocap_browser_system import dcc
+from .file_crawler import iter_folder_files, CrawlStats
+
+
+def _bake_to_cache(file_path, bake_cache):
+    """
+    worker process entry point, the baked data stays in the cache instead of being sent back.
+    only writes the entry, the parent process tracks the cache size and evicts once at the end.
+    returns (file size, cache entry size)
+    """
+    source = anim_source.create_source(file_path)
+    baked = source.bake_file(file_path)
+    source.unload_scene()
+    return os.path.getsize(file_path), bake_cache.write(file_path, baked)
+
+
+def bake_folders(folders, bake_cache, file_extensions=None, max_workers=None):
+    """bake every file under folders into bake_cache, returns a dict of stats"""
+    if file_extensions is None:
+        file_extensions = anim_source.get_supported_extensions()
+
+    start_time = time.perf_counter()
+
+    file_paths = []
+    skipped_count = 0
+    for folder in folders:
+        if not os.path.exists(folder):
+            print(f"path not found: {folder}")
+            continue
+
+        crawl_stats = CrawlStats()
+        for file_path in iter_folder_files(folder, file_extensions, stats=crawl_stats):
+            if bake_cache.contains(file_path):
+                skipped_count += 1
+                continue
+            file_paths.append(file_path)
+        print(f"Crawled {folder}: {crawl_stats}")
+
+    print(f"Found {len(file_paths) + skipped_count} files, {skipped_count} already baked")
+
+    baked_count = 0
+    baked_bytes = 0
+    failed_paths = []
+    cache_size = bake_cache.get_size() if file_paths else 0
+    size_limit_warned = False
+    if file_paths:
+        max_workers = max_workers or os.cpu_count() or 1
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            future_paths = {executor.submit(_bake_to_cache, path, bake_cache): path for path in file_paths}
+
+            for i, future in enumerate(concurrent.futures.as_completed(future_paths)):
+                file_path = future_paths[future]
+                try:
+                    file_size, entry_size = future.result()
+                    baked_bytes += file_size
+                    cache_size += entry_size
+                    baked_count += 1
+                except Exception:
+                    failed_paths.append(file_path)
+                    print(f"Failed to bake: {file_path}")
+                    traceback.print_exc()
+
+                print(f"[{i + 1}/{len(file_paths)}] {file_path}")
+
+                if cache_size > bake_cache.size_limit and not size_limit_warned:
+                    size_limit_warned = True
+                    print(
+                        "WARNING: the bake cache is past its {:.1f} MB size limit, "
+                        "least recently used clips will be evicted when the batch is done. "
+                        "Raise the limit with --cache-size-mb to keep the whole batch".format(
+                            bake_cache.size_limit / 1024 ** 2,
+                        )
+                    )
+
+    evicted_bytes = 0
+    if cache_size > bake_cache.size_limit:
+        bake_cache.evict()
+        evicted_bytes = cache_size - bake_cache.get_size()
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "baked": baked_count,
+        "skipped": skipped_count,
+        "failed": failed_paths,
+        "baked_bytes": baked_bytes,
+        "evicted_bytes": evicted_bytes,
+        "elapsed": elapsed,
+    }
+
+
+def print_summary(stats):
+    elapsed = max(stats["elapsed"], 1e-6)
+    baked_mb = stats["baked_bytes"] / 1024 ** 2
+    print("")
+    print(f"Baked:    {stats['baked']} files ({baked_mb:.1f} MB)")
+    print(f"Skipped:  {stats['skipped']} files already in cache")
+    print(f"Failed:   {len(stats['failed'])} files")
+    if stats["evicted_bytes"]:
+        print(f"Evicted:  {stats['evicted_bytes'] / 1024 ** 2:.1f} MB to fit the cache size limit")
+    print(f"Elapsed:  {elapsed:.1f}s")
+    print(f"Throughput: {stats['baked'] / elapsed:.2f} files/s, {baked_mb / elapsed:.2f} MB/s")
+    for failed_path in stats["failed"]:
+        print(f"    failed: {failed_path}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mocap_browser.bake",
+        description="Bake every clip under the given folders into the mocap browser's bake cache",
+    )
+    parser.add_argument("folders", nargs="+", help="root folders to search for clips")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the cpu count")
+    parser.add_argument("--ext", dest="file_extensions", action="append", default=None,
+                        help="file extension to bake, can be given multiple times (default: every supported format)")
+    parser.add_argument("--cache-folder", default=None, help="defaults to the browser's bake cache folder")
+    parser.add_argument("--cache-size-mb", type=float, default=None,
+                        help="cache size limit, the least recently used clips are evicted past it")
+    parsed_args = parser.parse_args(args)
+
+    cache_folder = parsed_args.cache_folder or dcc.get_bake_cache_folder()
+    if not cache_folder:
+        print("No bake cache folder configured")
+        return 1
+
+    size_limit = dcc.get_bake_cache_size_limit()
+    if parsed_args.cache_size_mb is not None:
+        size_limit = int(parsed_args.cache_size_mb * 1024 ** 2)
+
+    print(f"Bake cache: {cache_folder}")
+    stats = bake_folders(
+        parsed_args.folders,
+        BakeCache(cache_folder, size_limit),
+        file_extensions=parsed_args.file_extensions,
+        max_workers=parsed_args.workers,
+    )
+    print_summary(stats)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import tempfile
+
+# Requires numpy
+import numpy as np
+
+from .anim_data import BakedAnimation
+from . import mocap_browser_logger
+
+log = mocap_browser_logger.get_logger()
+
+# bump when the stored data changes, so old entries are never read back
+CACHE_VERSION = 2
+
+
+class BakeCache(object):
+    """
+    Persistent cache of baked skeleton animation
+
+    every entry is a positions .npy (memory mapped on read) and a .json with the joint names, parent indices and frame range,
+    keyed by file path, size and mtime so a modified file never hits a stale entry.
+    least recently used entries are evicted once the folder grows past size_limit bytes.
+    """
+
+    def __init__(self, folder, size_limit=2 * 1024 ** 3):
+        self.folder = folder
+        self.size_limit = size_limit
+        self._total_size = None  # scanned on first write
+
+    def get_key(self, file_path):
+        """key of the current version of file_path, None if it doesn't exist"""
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        key_str = "{}|{}|{}|{}".format(
+            CACHE_VERSION,
+            os.path.normcase(os.path.abspath(file_path)),
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+        )
+        return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+    def _get_entry_paths(self, key):
+        entry_path = os.path.join(self.folder, key)
+        return entry_path + ".json", entry_path + ".npy"
+
+    def contains(self, file_path):
+        key = self.get_key(file_path)
+        if key is None:
+            return False
+        return all(os.path.exists(path) for path in self._get_entry_paths(key))
+
+    def get(self, file_path):
+        """BakedAnimation if file_path is cached, otherwise None"""
+        key = self.get_key(file_path)
+        if key is None:
+            return None
+
+        meta_path, positions_path = self._get_entry_paths(key)
+        try:
+            with open(meta_path, "r") as fp:
+                meta = json.load(fp)
+            baked = BakedAnimation(
+                joint_names=meta["joint_names"],
+                parent_indices=meta["parent_indices"],
+                positions=np.load(positions_path, mmap_mode="r"),
+                start_frame=meta["start_frame"],
+                fps=meta["fps"],
+            )
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            # unreadable, half removed or from an older format, same as not being cached
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+
+        return baked
+
+    def put(self, file_path, baked):
+        """write an entry and evict least recently used ones if the cache grew past its size limit"""
+        entry_size = self.write(file_path, baked)
+
+        if self._total_size is None:
+            self._total_size = self.get_size()
+        else:
+            self._total_size += entry_size
+
+        if self._total_size > self.size_limit:
+            self.evict()
+
+    def write(self, file_path, baked):
+        """
+        write an entry without any size bookkeeping, returns its size in bytes.
+        for batch writers that track the cache size themselves and evict once at the end
+        """
+        key = self.get_key(file_path)
+        if key is None:
+            return 0
+
+        os.makedirs(self.folder, exist_ok=True)
+        meta_path, positions_path = self._get_entry_paths(key)
+        meta = {
+            "file_path": file_path,
+            "joint_names": baked.joint_names,
+            "parent_indices": baked.parent_indices.tolist(),
+            "start_frame": baked.start_frame,
+            "fps": baked.fps,
+        }
+
+        # write to temp files first so readers never see a half written entry,
+        # the .json goes last since that's what marks the entry as complete
+        self._write_atomic(positions_path, lambda fp: np.save(fp, baked.positions), binary=True)
+        self._write_atomic(meta_path, lambda fp: json.dump(meta, fp))
+
+        return os.path.getsize(meta_path) + os.path.getsize(positions_path)
+
+    def _write_atomic(self, file_path, write_func, binary=False):
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb" if binary else "w") as fp:
+                write_func(fp)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _get_entries(self):
+        """[(last_used_time, size, [file_paths])] of every complete entry"""
+        if not os.path.isdir(self.folder):
+            return []
+
+        entries = []
+        for file_name in os.listdir(self.folder):
+            key, ext = os.path.splitext(file_name)
+            if ext != ".json":
+                continue
+
+            entry_paths = self._get_entry_paths(key)
+            try:
+                last_used_time = os.path.getmtime(entry_paths[0])
+                entry_size = sum(os.path.getsize(path) for path in entry_paths)
+            except OSError:
+                continue
+            entries.append((last_used_time, entry_size, entry_paths))
+        return entries
+
+    def get_size(self):
+        return sum(entry[1] for entry in self._get_entries())
+
+    def evict(self, size_limit=None):
+        """remove least recently used entries until the cache fits in size_limit"""
+        if size_limit is None:
+            size_limit = self.size_limit
+
+        entries = sorted(self._get_entries())
+        total_size = sum(entry[1] for entry in entries)
+        for _, entry_size, entry_paths in entries:
+            if total_size <= size_limit:
+                break
+
+            try:
+                for path in entry_paths:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by another process
+            except OSError:
+                continue  # still memory mapped somewhere
+
+            total_size -= entry_size
+
+        self._total_size = total_size
+        log.debug("Bake cache size: {:.1f} MB".format(total_size / 1024 ** 2))
+
+    def clear(self):
+        self.evict(size_limit=0)
@@ -0,0 +1,218 @@
+"""
+Pure python BVH reader, no SDK needed
+
+the MOTION section is streamed in chunks straight into NumPy and solved chunk by chunk,
+so memory stays bounded by the chunk size plus the baked positions no matter how large the file is
+"""
+import os
+
+# Requires numpy
+import numpy as np
+
+from .anim_data import BakedAnimation
+from .anim_source import AnimationSource
+from . import fk_utils
+
+# bytes of motion text parsed at a time
+MOTION_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class BvhFormatError(ValueError):
+    pass
+
+
+class BvhJoint(object):
+    def __init__(self, name, parent_index, offset):
+        self.name = name
+        self.parent_index = parent_index
+        self.offset = offset
+        self.channels = []  # channel names, e.g. Xposition
+        self.channel_start = 0  # column of the first channel in a motion frame
+
+
+class BvhMotionChannel(object):
+    """
+    Vector channel reading three columns of the motion chunk being solved,
+    frames are row indices into that chunk. columns of -1 keep the static value
+    """
+
+    def __init__(self, static_value, columns):
+        self.static_value = np.asarray(static_value, dtype=np.float64)
+        self.columns = columns
+        self.motion = None  # set to the current (frames, channels) chunk
+
+    def evaluate(self, frames):
+        values = np.tile(self.static_value, (len(frames), 1))
+        rows = np.asarray(frames, dtype=np.int64)
+        for axis_index, column in enumerate(self.columns):
+            if column >= 0:
+                values[:, axis_index] += self.motion[rows, column]
+        return values
+
+
+def parse_bvh_hierarchy(fp):
+    """
+    read the HIERARCHY section up to and including the MOTION header lines,
+    returns (joints, channel_count, frame_count, frame_time, line_count)
+    """
+    joints = []
+    joint_stack = []
+    pending_name = None
+    channel_count = 0
+    frame_count = 0
+    frame_time = 1.0 / 30.0
+    line_count = 0
+
+    while True:
+        line = fp.readline()
+        if not line:
+            break
+        line_count += 1
+        tokens = line.decode("ascii", errors="ignore").split()
+        if not tokens:
+            continue
+
+        keyword = tokens[0].upper()
+        if keyword in ("ROOT", "JOINT"):
+            pending_name = tokens[1] if len(tokens) > 1 else f"joint{len(joints)}"
+        elif keyword == "END":
+            # end sites mark where the last bone ends
+            pending_name = f"{joints[joint_stack[-1]].name}_End" if joint_stack else "End"
+        elif keyword == "{":
+            parent_index = joint_stack[-1] if joint_stack else -1
+            joints.append(BvhJoint(pending_name, parent_index, (0.0, 0.0, 0.0)))
+            joint_stack.append(len(joints) - 1)
+        elif keyword == "}":
+            joint_stack.pop()
+        elif keyword == "OFFSET":
+            joints[joint_stack[-1]].offset = tuple(float(value) for value in tokens[1:4])
+        elif keyword == "CHANNELS":
+            joint = joints[joint_stack[-1]]
+            joint.channels = tokens[2:2 + int(tokens[1])]
+            joint.channel_start = channel_count
+            channel_count += len(joint.channels)
+        elif keyword == "FRAMES:":
+            frame_count = int(tokens[1])
+        elif keyword == "FRAME" and len(tokens) > 2:
+            frame_time = float(tokens[2])
+            break  # motion data starts on the next line
+
+    return joints, channel_count, frame_count, frame_time, line_count
+
+
+def parse_motion_values(text, first_line_number, file_path=""):
+    """
+    float64 values of whole motion lines, root translations keep their precision through the FK.
+    raises a BvhFormatError naming the line of the first value that isn't a number
+    """
+    try:
+        return np.array(text.split(), dtype=np.float64)
+    except ValueError:
+        pass
+
+    # only a broken file pays for going through it line by line
+    for line_index, line in enumerate(text.split(b"\n")):
+        for token in line.split():
+            try:
+                float(token)
+            except ValueError:
+                value_text = token.decode("ascii", errors="replace")
+                raise BvhFormatError(
+                    f"{file_path}:{first_line_number + line_index}: motion value {value_text!r} is not a number"
+                ) from None
+    raise BvhFormatError(f"{file_path}:{first_line_number}: unreadable motion data")
+
+
+def get_fk_joints(bvh_joints):
+    fk_joints = []
+    motion_channels = []
+    for joint in bvh_joints:  # type: BvhJoint
+        translation_columns = [-1, -1, -1]
+        rotation_columns = [-1, -1, -1]
+        rotation_axes = []
+        for channel_index, channel in enumerate(joint.channels):
+            axis = channel[0].upper()
+            column = joint.channel_start + channel_index
+            if channel.lower().endswith("position"):
+                translation_columns["XYZ".index(axis)] = column
+            elif channel.lower().endswith("rotation"):
+                rotation_columns["XYZ".index(axis)] = column
+                rotation_axes.append(axis)
+
+        # channels are listed outermost rotation first, the FK rotation order is the order they're applied
+        rotation_order = "".join(reversed(rotation_axes))
+        rotation_order += "".join(axis for axis in "XYZ" if axis not in rotation_order)
+
+        translation = BvhMotionChannel(joint.offset, translation_columns)
+        rotation = BvhMotionChannel((0.0, 0.0, 0.0), rotation_columns)
+        motion_channels.extend((translation, rotation))
+
+        fk_joints.append(fk_utils.FkJoint(
+            joint.parent_index,
+            translation=translation,
+            rotation=rotation,
+            scale=fk_utils.ConstantChannel((1.0, 1.0, 1.0)),
+            rotation_order=rotation_order,
+        ))
+    return fk_joints, motion_channels
+
+
+def read_bvh_file(file_path, progress_callback=None, chunk_size=MOTION_CHUNK_SIZE):
+    file_size = max(os.path.getsize(file_path), 1)
+
+    with open(file_path, "rb") as fp:
+        bvh_joints, channel_count, frame_count, frame_time, line_count = parse_bvh_hierarchy(fp)
+        fk_joints, motion_channels = get_fk_joints(bvh_joints)
+
+        positions = np.zeros((frame_count, len(bvh_joints), 3), dtype=np.float32)
+        solved_frames = 0
+        pending_values = np.empty(0, dtype=np.float64)
+        remainder = b""
+        line_number = line_count + 1  # of the first line in the next parsed text
+
+        while solved_frames < frame_count:
+            if progress_callback:
+                progress_callback(fp.tell() / file_size)
+
+            chunk = fp.read(chunk_size)
+            if chunk:
+                # only parse up to the last full line, the rest goes with the next chunk
+                text = remainder + chunk
+                split_index = text.rfind(b"\n") + 1
+                text, remainder = text[:split_index], text[split_index:]
+            else:
+                text, remainder = remainder, b""
+
+            if text:
+                values = parse_motion_values(text, line_number, file_path)
+                line_number += text.count(b"\n")
+                pending_values = np.concatenate((pending_values, values)) if len(pending_values) else values
+
+            chunk_frame_count = min(len(pending_values) // max(channel_count, 1), frame_count - solved_frames)
+            if chunk_frame_count:
+                motion = pending_values[:chunk_frame_count * channel_count].reshape(chunk_frame_count, channel_count)
+                for motion_channel in motion_channels:
+                    motion_channel.motion = motion
+
+                positions[solved_frames:solved_frames + chunk_frame_count] = fk_utils.compute_global_positions(
+                    fk_joints,
+                    np.arange(chunk_frame_count),
+                )
+                solved_frames += chunk_frame_count
+                pending_values = pending_values[chunk_frame_count * channel_count:]
+
+            if not chunk:
+                break
+
+    return BakedAnimation(
+        joint_names=[joint.name for joint in bvh_joints],
+        parent_indices=[joint.parent_index for joint in bvh_joints],
+        positions=positions[:solved_frames],
+        start_frame=0,
+        fps=1.0 / frame_time if frame_time > 0 else 30.0,
+    )
+
+
+class BvhHandler(AnimationSource):
+    def bake_file(self, file_path, progress_callback=None):
+        return read_bvh_file(file_path, progress_callback)
@@ -1,26 +1,228 @@
-from .gl_utils.scene_utils import  draw_locator, draw_line
-import fbx
-
-try:
-    SKELETON_NODE_TYPE = fbx.FbxNodeAttribute.EType.eSkeleton
-except AttributeError:
-    SKELETON_NODE_TYPE = fbx.FbxNodeAttribute.eSkeleton
-
-def recursive_get_fbx_skeleton_positions(node, time, parent_pos=None, output_dict=None):
-    if output_dict is None:
-        output_dict = dict()
-    
-    node_pos = None
-    node_attribute = node.GetNodeAttribute()
-    if node_attribute:
-        if node_attribute.GetAttributeType() == SKELETON_NODE_TYPE:
-            node_pos = node.EvaluateGlobalTransform(time).GetT()
-            node_name = node.GetName()
-            if parent_pos is not None:
-                output_dict[node_name] = (node_pos, parent_pos)
-
-    for i in range(node.GetChildCount()):
-        recursive_get_fbx_skeleton_positions(node.GetChild(i), time, node_pos, output_dict)
-    
-    return output_dict
-        
\ No newline at end of file
+import ctypes
+
+import numpy as np
+from OpenGL import GL
+
+from . import anim_source
+
+
+class SkeletonRenderer(object):
+    """
+    Draws the baked skeleton of an animation source from GPU buffers
+
+    every baked frame is uploaded into one vertex buffer once per clip, the bones are an index buffer
+    into a single frame, so drawing a frame is one draw call at that frame's offset.
+    only uses OpenGL 1.5 buffer objects so it also runs on Mesa software GL.
+    needs a current GL context for every call
+    """
+
+    def __init__(self, source):
+        if 0:
+            source = anim_source.AnimationSource()
+
+        self.source = source
+        self.vertex_buffer = None
+        self.index_buffer = None
+        self.index_count = 0
+        self._visibility_version = None  # joint visibility the index buffer was built for
+        self.upload()
+
+    def upload(self):
+        positions = np.ascontiguousarray(self.source.baked.positions, dtype=np.float32)
+
+        self.vertex_buffer = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_buffer)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, positions.nbytes, positions, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+        self.index_buffer = GL.glGenBuffers(1)
+        self.update_bone_indices()
+
+    def update_bone_indices(self):
+        """rebuild the bone index buffer from the joint visibility mask"""
+        # (bones * 2) line segment points, child then parent
+        line_indices = np.ascontiguousarray(self.source.get_visible_bone_indices().ravel(), dtype=np.uint32)
+        self.index_count = len(line_indices)
+        self._visibility_version = self.source.visibility_version
+
+        if not self.index_count:
+            return
+
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, line_indices.nbytes, line_indices, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def draw(self, frame):
+        self.draw_frames([self.source.baked.get_frame_index(frame)], [(*self.source.display_color, 1.0)])
+
+    def draw_ghosts(self, frame, ghost_count, ghost_step=1):
+        """faded poses ghost_count * ghost_step frames around frame, drawn from the same vertex buffer"""
+        baked = self.source.baked
+        frame_index = baked.get_frame_index(frame)
+
+        frame_steps = np.arange(1, ghost_count + 1) * ghost_step
+        ghost_frame_indices = np.concatenate((frame_index - frame_steps[::-1], frame_index + frame_steps))
+        # ghosts further from the playhead fade out
+        ghost_alphas = 0.4 * (1.0 - np.abs(ghost_frame_indices - frame_index) / float((ghost_count + 1) * ghost_step))
+
+        in_range = (ghost_frame_indices >= 0) & (ghost_frame_indices < baked.frame_count)
+        colors = [(*self.source.display_color, alpha) for alpha in ghost_alphas[in_range]]
+        self.draw_frames(ghost_frame_indices[in_range], colors)
+
+    def draw_frames(self, frame_indices, colors):
+        """one offset draw call per frame index, colors are rgba"""
+        if self._visibility_version != self.source.visibility_version:
+            self.update_bone_indices()
+
+        if not self.index_count or not len(frame_indices):
+            return
+
+        frame_stride = self.source.baked.joint_count * 3 * 4  # float32 xyz per joint
+
+        GL.glPushMatrix()
+        GL.glTranslatef(*self.source.display_offset)
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_buffer)
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        for frame_index, color in zip(frame_indices, colors):
+            GL.glColor4f(*color)
+            GL.glVertexPointer(3, GL.GL_FLOAT, 0, ctypes.c_void_p(int(frame_index) * frame_stride))
+            GL.glDrawElements(GL.GL_LINES, self.index_count, GL.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glDisable(GL.GL_BLEND)
+        GL.glPopMatrix()
+
+    def draw_trails(self, frame, frame_window):
+        """motion paths of every visible joint over frame_window frames either side of frame, in one draw call"""
+        baked = self.source.baked
+        frame_index = baked.get_frame_index(frame)
+        first_frame = max(frame_index - frame_window, 0)
+        last_frame = min(frame_index + frame_window, baked.frame_count - 1)
+        joint_indices = np.flatnonzero(self.source.joint_visibility)
+        if last_frame <= first_frame or not len(joint_indices):
+            return
+
+        # vertex index of each joint on each frame is frame * joint_count + joint,
+        # every consecutive pair of frames is one line segment
+        segment_starts = (
+            np.arange(first_frame, last_frame, dtype=np.uint32)[:, np.newaxis] * baked.joint_count
+            + joint_indices.astype(np.uint32)
+        ).ravel()
+        line_indices = np.empty(len(segment_starts) * 2, dtype=np.uint32)
+        line_indices[0::2] = segment_starts
+        line_indices[1::2] = segment_starts + baked.joint_count
+
+        GL.glPushMatrix()
+        GL.glTranslatef(*self.source.display_offset)
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        GL.glColor4f(*self.source.display_color, 0.5)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_buffer)
+        GL.glVertexPointer(3, GL.GL_FLOAT, 0, ctypes.c_void_p(0))
+        # the indices change with the playhead, so they're sent from client memory
+        GL.glDrawElements(GL.GL_LINES, len(line_indices), GL.GL_UNSIGNED_INT, line_indices)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glDisable(GL.GL_BLEND)
+        GL.glPopMatrix()
+
+    def release(self):
+        buffers = [buffer for buffer in (self.vertex_buffer, self.index_buffer) if buffer]
+        if buffers:
+            GL.glDeleteBuffers(len(buffers), buffers)
+        self.vertex_buffer = None
+        self.index_buffer = None
+        self.index_count = 0
+
+
+def get_speed_colors(speeds):
+    """(n, 3) colors from blue when still to red at the clip's fast speeds"""
+    top_speed = np.percentile(speeds, 95) if len(speeds) else 0.0
+    speed_ratio = np.clip(speeds / top_speed, 0.0, 1.0) if top_speed > 0 else np.zeros(len(speeds))
+
+    colors = np.empty((len(speeds), 3), dtype=np.float32)
+    colors[:, 0] = np.clip(speed_ratio * 2.0 - 1.0, 0.0, 1.0)
+    colors[:, 1] = 1.0 - np.abs(speed_ratio * 2.0 - 1.0)
+    colors[:, 2] = np.clip(1.0 - speed_ratio * 2.0, 0.0, 1.0)
+    return colors
+
+
+class TrajectoryRenderer(object):
+    """
+    Root trajectory of an animation source on the ground plane, colored by speed, with distance markers
+
+    uploaded once per clip as one interleaved position/color buffer, drawing costs the same on any frame.
+    needs a current GL context for every call
+    """
+
+    def __init__(self, source):
+        if 0:
+            source = anim_source.AnimationSource()
+
+        self.source = source
+        self.vertex_buffer = None
+        self.path_vertex_count = 0
+        self.marker_vertex_count = 0
+        self.marker_interval = 0.0
+        self.upload()
+
+    def upload(self):
+        trajectory = self.source.baked.get_root_trajectory()
+        self.marker_interval = trajectory.get_marker_interval()
+
+        # markers are small crosses, a tenth of the marker interval across
+        marker_points = trajectory.get_marker_points(self.marker_interval)
+        cross_size = self.marker_interval * 0.1
+        cross_offsets = np.array(
+            ((-cross_size, 0, 0), (cross_size, 0, 0), (0, 0, -cross_size), (0, 0, cross_size)),
+            dtype=np.float32,
+        )
+        marker_vertices = (marker_points[:, np.newaxis] + cross_offsets).reshape(-1, 3)
+
+        # (path + marker vertices, 6) interleaved xyz rgb
+        self.path_vertex_count = len(trajectory.points)
+        self.marker_vertex_count = len(marker_vertices)
+        vertices = np.ones((self.path_vertex_count + self.marker_vertex_count, 6), dtype=np.float32)
+        vertices[:self.path_vertex_count, :3] = trajectory.points
+        vertices[:self.path_vertex_count, 3:] = get_speed_colors(trajectory.speeds)
+        vertices[self.path_vertex_count:, :3] = marker_vertices
+
+        self.vertex_buffer = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_buffer)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if self.path_vertex_count < 2:
+            return
+
+        vertex_stride = 6 * 4
+        GL.glPushMatrix()
+        GL.glTranslatef(*self.source.display_offset)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_buffer)
+        GL.glVertexPointer(3, GL.GL_FLOAT, vertex_stride, ctypes.c_void_p(0))
+        GL.glColorPointer(3, GL.GL_FLOAT, vertex_stride, ctypes.c_void_p(3 * 4))
+
+        GL.glLineWidth(2.0)
+        GL.glDrawArrays(GL.GL_LINE_STRIP, 0, self.path_vertex_count)
+        if self.marker_vertex_count:
+            GL.glDrawArrays(GL.GL_LINES, self.path_vertex_count, self.marker_vertex_count)
+
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glPopMatrix()
+
+    def release(self):
+        if self.vertex_buffer:
+            GL.glDeleteBuffers(1, [self.vertex_buffer])
+        self.vertex_buffer = None
+        self.path_vertex_count = 0
+        self.marker_vertex_count = 0
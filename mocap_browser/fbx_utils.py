@@ -1,6 +1,33 @@
 import sys
+import time
 import fbx
 
+# Requires numpy
+import numpy as np
+
+from .anim_data import BakedAnimation
+from .anim_source import AnimationSource, get_progress_range
+from . import fk_utils
+from . import anim_curves
+from . import mocap_browser_logger
+
+log = mocap_browser_logger.get_logger()
+
+try:
+    SKELETON_NODE_TYPE = fbx.FbxNodeAttribute.EType.eSkeleton
+except AttributeError:
+    SKELETON_NODE_TYPE = fbx.FbxNodeAttribute.eSkeleton
+
+# FbxTransform.EInheritType.eInheritRrs, maya's segment scale compensate
+INHERIT_TYPE_RRS = 2
+
+# FbxAnimCurveDef.EInterpolationType
+FBX_INTERPOLATIONS = {
+    0x02: anim_curves.INTERPOLATION_CONSTANT,
+    0x04: anim_curves.INTERPOLATION_LINEAR,
+    0x08: anim_curves.INTERPOLATION_CUBIC,
+}
+
 
 def InitializeSdkObjects():
     # The first thing to do is to create the FBX SDK manager which is the
@@ -39,45 +66,305 @@ def LoadScene(pSdkManager, pScene, pFileName):
     return result
 
 
-class FbxHandler():
+class FbxHandler(AnimationSource):
     def __init__(self):
-        self.file_path = ""
-        self.manager, self.scene = InitializeSdkObjects()
+        super(FbxHandler, self).__init__()
+        self.manager = None
+        self.scene = None
         self.anim_stack = None
         self.anim_layer = None
-        self.is_loaded = False
-        self.display_color = (1.0, 1.0, 1.0)
-        self.hidden_nodes = []
+        self.topology = None  # type: FbxSkeletonTopology
 
-    def load_scene(self, file_path):
-        LoadScene(self.manager, self.scene, file_path)
+    def bake_file(self, file_path, progress_callback=None):
         self.file_path = file_path
-        self.anim_stack = self.scene.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimStack.ClassId), 0)
-        self.anim_layer = self.anim_stack.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimLayer.ClassId), 0)
-        self.is_loaded = True
+        if progress_callback:
+            progress_callback(0.0)
+
+        self.manager, self.scene = InitializeSdkObjects()
+        try:
+            LoadScene(self.manager, self.scene, file_path)
+            self.anim_stack = self.scene.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimStack.ClassId), 0)
+            self.anim_layer = self.anim_stack.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimLayer.ClassId), 0)
+            self.topology = FbxSkeletonTopology(self.scene)
+            return self.bake_animation(progress_callback)
+        finally:
+            # everything is in the baked arrays now, free the scene on the loading thread
+            # instead of keeping it around until the UI thread unloads the clip
+            self.release_sdk_objects()
+
+    def bake_animation(self, progress_callback=None):
+        """Evaluate every skeleton joint over the anim stack time span once"""
+        time_mode = self.scene.GetGlobalSettings().GetTimeMode()
+        time_span = self.anim_stack.GetLocalTimeSpan()
+        start_frame = time_span.GetStart().GetFrameCount(time_mode)
+        end_frame = time_span.GetStop().GetFrameCount(time_mode)
+        frames = np.arange(start_frame, end_frame + 1)
+
+        # skeleton chains go through the curves + FK, the SDK only evaluates what FK doesn't model
+        unsupported_reason = get_fk_unsupported_reason(self.scene, self.anim_stack, self.topology)
+        if unsupported_reason:
+            log.info(f"Evaluating through the FBX SDK, {unsupported_reason}: {self.file_path}")
+            positions = evaluate_sdk_positions(self.topology.nodes, frames, time_mode, progress_callback)
+        else:
+            positions = self.bake_fk_positions(frames, time_mode, progress_callback)
+
+        return BakedAnimation(
+            joint_names=self.topology.joint_names,
+            parent_indices=self.topology.parent_indices,
+            positions=positions,
+            start_frame=start_frame,
+            fps=fbx.FbxTime.GetFrameRate(time_mode),
+            )
+
+    def bake_fk_positions(self, frames, time_mode, progress_callback=None):
+        """positions from batched forward kinematics over the keys of the local curves"""
+        # reading the keys is most of the SDK work, it gets the first part of the progress bar
+        fk_joints = get_fk_joints(
+            self.topology,
+            self.anim_layer,
+            time_mode,
+            progress_callback=get_progress_range(progress_callback, 0.0, 0.4),
+            )
+        positions = fk_utils.compute_global_positions(
+            fk_joints,
+            frames,
+            progress_callback=get_progress_range(progress_callback, 0.4, 1.0),
+            )
+
+        # anything else the FK engine doesn't model (unsupported inherit types, curve extrapolation)
+        # shows up as a mismatch against the SDK, in which case fall back to evaluating every node
+        sample_frames = sorted({0, len(frames) // 2, len(frames) - 1})
+        sdk_samples = evaluate_sdk_positions(self.topology.nodes, frames[sample_frames], time_mode)
+        max_error = np.abs(positions[sample_frames] - sdk_samples).max() if positions.size else 0.0
+        tolerance = max(1e-3, 1e-5 * np.abs(sdk_samples).max()) if sdk_samples.size else 1e-3
+        if max_error > tolerance:
+            log.warning(f"FK bake differs from the FBX SDK by {max_error}, evaluating through the SDK: {self.file_path}")
+            positions = evaluate_sdk_positions(self.topology.nodes, frames, time_mode, progress_callback)
+        return positions
+
+    def release_sdk_objects(self):
+        if self.manager:
+            self.manager.Destroy()
+            self.manager = None
+            self.scene = None
+            self.anim_stack = None
+            self.anim_layer = None
+            self.topology = None
 
     def unload_scene(self):
-        self.manager.Destroy()
+        self.release_sdk_objects()
         self.is_loaded = False
 
-    def get_start_frame(self):
-        return self.anim_stack.GetLocalTimeSpan().GetStart().GetFrameCount()
-
-    def get_end_frame(self):
-        return self.anim_stack.GetLocalTimeSpan().GetStop().GetFrameCount()
-
-    
-def recursive_get_fbx_skeleton_hierarchy(node, parent_name=None, output_dict=None):
-    if output_dict is None:
-        output_dict = dict()
-    
-    node_name = None
-    node_attribute = node.GetNodeAttribute()
-    if node_attribute:
-        node_name = node.GetName()
-        output_dict[node_name] = parent_name
-
-    for i in range(node.GetChildCount()):
-        recursive_get_fbx_skeleton_hierarchy(node.GetChild(i), node_name, output_dict)
-    
-    return output_dict
+
+def evaluate_sdk_positions(nodes, frames, time_mode, progress_callback=None):
+    """(frames, nodes, 3) global positions through EvaluateGlobalTransform, one call per node per frame"""
+    positions = np.zeros((len(frames), len(nodes), 3), dtype=np.float32)
+    fbx_time = fbx.FbxTime()
+    for frame_index, frame in enumerate(frames):
+        if progress_callback:
+            progress_callback(frame_index / len(frames))
+
+        fbx_time.SetFrame(int(frame), time_mode)
+        frame_positions = positions[frame_index]
+        for joint_index, node in enumerate(nodes):
+            node_pos = node.EvaluateGlobalTransform(fbx_time).GetT()
+            frame_positions[joint_index] = (node_pos[0], node_pos[1], node_pos[2])
+    return positions
+
+
+def _get_vector(fbx_property):
+    value = fbx_property.Get()
+    return value[0], value[1], value[2]
+
+
+def extract_anim_curve(fbx_curve, time_mode):
+    """Read the keys of an FbxAnimCurve into an AnimCurve, times in frames of time_mode"""
+    key_count = fbx_curve.KeyGetCount()
+    times = np.empty(key_count)
+    values = np.empty(key_count)
+    interpolations = np.empty(key_count, dtype=np.int8)
+    for i in range(key_count):
+        times[i] = fbx_curve.KeyGetTime(i).GetFrameCountPrecise(time_mode)
+        values[i] = fbx_curve.KeyGetValue(i)
+        interpolations[i] = FBX_INTERPOLATIONS.get(int(fbx_curve.KeyGetInterpolation(i)), anim_curves.INTERPOLATION_LINEAR)
+
+    anim_curve = anim_curves.AnimCurve(times, values, interpolations)
+
+    # the stored tangents only matter inside cubic segments longer than a frame,
+    # dense per-frame mocap keys keep the estimated slopes and skip two SDK calls per key
+    long_cubic_keys = np.flatnonzero(
+        (interpolations[:-1] == anim_curves.INTERPOLATION_CUBIC) & (np.diff(times) > 1.0)
+        )
+    if len(long_cubic_keys):
+        # derivatives are stored per second
+        fps = fbx.FbxTime.GetFrameRate(time_mode)
+        left_slopes = anim_curve.left_slopes.copy()
+        right_slopes = anim_curve.right_slopes.copy()
+        for i in long_cubic_keys:
+            right_slopes[i] = fbx_curve.KeyGetRightDerivative(int(i)) / fps
+            left_slopes[i + 1] = fbx_curve.KeyGetLeftDerivative(int(i) + 1) / fps
+        anim_curve.left_slopes = left_slopes
+        anim_curve.right_slopes = right_slopes
+
+    return anim_curve
+
+
+def get_property_channel(fbx_property, anim_layer, time_mode):
+    """CurveVectorChannel with the keys of the X/Y/Z curves of fbx_property on anim_layer"""
+    curves = [None, None, None]
+    if anim_layer:
+        for axis_index, axis in enumerate("XYZ"):
+            fbx_curve = fbx_property.GetCurve(anim_layer, axis)
+            if fbx_curve and fbx_curve.KeyGetCount():
+                curves[axis_index] = extract_anim_curve(fbx_curve, time_mode)
+    return anim_curves.CurveVectorChannel(_get_vector(fbx_property), curves)
+
+
+def get_fk_unsupported_reason(scene, anim_stack, topology):
+    """why the curves + FK path can't bake this scene, None when it can"""
+    if scene.GetSrcObjectCount(fbx.FbxCriteria().ObjectType(fbx.FbxConstraint.ClassId)):
+        return "the scene has constraints"
+    if anim_stack.GetSrcObjectCount(fbx.FbxCriteria().ObjectType(fbx.FbxAnimLayer.ClassId)) > 1:
+        return "the take has more than one anim layer"
+
+    # joints right under the scene root have an identity parent, any other non-skeleton parent moves them
+    for node, parent_index in zip(topology.nodes, topology.parent_indices):
+        parent_node = node.GetParent()
+        if parent_index < 0 and parent_node and parent_node.GetParent():
+            return f"{node.GetName()} is parented under {parent_node.GetName()}"
+    return None
+
+
+def get_fk_joints(topology, anim_layer, time_mode, progress_callback=None):
+    """
+    FkJoints for the skeleton joints, in topology order.
+    progress_callback is called once per node, raising from it stops the extraction
+    """
+    fk_joints = []
+    for node_index, node in enumerate(topology.nodes):
+        if progress_callback:
+            progress_callback(node_index / len(topology.nodes))
+
+        parent_index = int(topology.parent_indices[node_index])
+
+        # rotation order and pre/post rotations are only used while RotationActive is on
+        rotation_order = "XYZ"
+        pre_rotation = post_rotation = (0, 0, 0)
+        if node.RotationActive.Get():
+            rotation_order_index = int(node.RotationOrder.Get())
+            if rotation_order_index < len(fk_utils.ROTATION_ORDERS):
+                rotation_order = fk_utils.ROTATION_ORDERS[rotation_order_index]
+            pre_rotation = _get_vector(node.PreRotation)
+            post_rotation = _get_vector(node.PostRotation)
+
+        fk_joints.append(fk_utils.FkJoint(
+            parent_index,
+            translation=get_property_channel(node.LclTranslation, anim_layer, time_mode),
+            rotation=get_property_channel(node.LclRotation, anim_layer, time_mode),
+            scale=get_property_channel(node.LclScaling, anim_layer, time_mode),
+            rotation_order=rotation_order,
+            rotation_offset=_get_vector(node.RotationOffset),
+            rotation_pivot=_get_vector(node.RotationPivot),
+            pre_rotation=pre_rotation,
+            post_rotation=post_rotation,
+            scaling_offset=_get_vector(node.ScalingOffset),
+            scaling_pivot=_get_vector(node.ScalingPivot),
+            inherit_scale=int(node.InheritType.Get()) != INHERIT_TYPE_RRS,
+            ))
+    return fk_joints
+
+
+class FbxSkeletonTopology(object):
+    """
+    Skeleton nodes of a scene flattened once, parents before children.
+
+    Found through the scene's FbxSkeleton attributes so meshes, cameras and
+    other non-skeleton nodes are never visited. Joints parented under a
+    non-skeleton node get a parent index of -1.
+    """
+
+    def __init__(self, scene):
+        skeleton_criteria = fbx.FbxCriteria().ObjectType(fbx.FbxSkeleton.ClassId)
+
+        # skeleton nodes in scene order
+        scene_nodes = []
+        node_ids = {}
+        for i in range(scene.GetSrcObjectCount(skeleton_criteria)):
+            node = scene.GetSrcObject(skeleton_criteria, i).GetNode()
+            if node is None or node.GetUniqueID() in node_ids:
+                continue
+            node_ids[node.GetUniqueID()] = len(scene_nodes)
+            scene_nodes.append(node)
+
+        scene_parents = []
+        scene_children = [[] for _ in scene_nodes]
+        for i, node in enumerate(scene_nodes):
+            parent_node = node.GetParent()
+            parent_index = node_ids.get(parent_node.GetUniqueID(), -1) if parent_node else -1
+            scene_parents.append(parent_index)
+            if parent_index >= 0:
+                scene_children[parent_index].append(i)
+
+        # depth first order so every joint comes after its parent
+        order = []
+        stack = [i for i, parent_index in enumerate(scene_parents) if parent_index < 0][::-1]
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            stack.extend(reversed(scene_children[i]))
+
+        scene_to_ordered = np.full(len(scene_nodes), -1, dtype=np.int32)
+        scene_to_ordered[order] = np.arange(len(order), dtype=np.int32)
+
+        self.nodes = [scene_nodes[i] for i in order]
+        self.joint_names = [node.GetName() for node in self.nodes]
+        self.parent_indices = np.array(
+            [scene_to_ordered[scene_parents[i]] if scene_parents[i] >= 0 else -1 for i in order],
+            dtype=np.int32,
+            )
+        self.name_to_index = {name: i for i, name in enumerate(self.joint_names)}
+
+
+def compare_with_sdk(file_path):
+    """
+    bake file_path through the curves + FK path and through the SDK on every frame,
+    prints the time each took and the largest difference between them
+    """
+    handler = FbxHandler()
+    handler.manager, handler.scene = InitializeSdkObjects()
+    handler.file_path = file_path
+    LoadScene(handler.manager, handler.scene, file_path)
+    handler.anim_stack = handler.scene.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimStack.ClassId), 0)
+    handler.anim_layer = handler.anim_stack.GetSrcObject(fbx.FbxCriteria().ObjectType(fbx.FbxAnimLayer.ClassId), 0)
+    handler.topology = FbxSkeletonTopology(handler.scene)
+
+    time_mode = handler.scene.GetGlobalSettings().GetTimeMode()
+    time_span = handler.anim_stack.GetLocalTimeSpan()
+    frames = np.arange(time_span.GetStart().GetFrameCount(time_mode), time_span.GetStop().GetFrameCount(time_mode) + 1)
+    unsupported_reason = get_fk_unsupported_reason(handler.scene, handler.anim_stack, handler.topology)
+
+    start_time = time.perf_counter()
+    fk_positions = handler.bake_fk_positions(frames, time_mode)
+    fk_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    sdk_positions = evaluate_sdk_positions(handler.topology.nodes, frames, time_mode)
+    sdk_time = time.perf_counter() - start_time
+
+    joint_count = len(handler.topology.joint_names)
+    handler.release_sdk_objects()
+
+    max_error = np.abs(fk_positions - sdk_positions).max() if sdk_positions.size else 0.0
+    print(f"{file_path}: {len(frames)} frames, {joint_count} joints")
+    if unsupported_reason:
+        print(f"    loads through the SDK, {unsupported_reason}")
+    print(f"    curves + FK: {fk_time:.3f}s")
+    print(f"    SDK:         {sdk_time:.3f}s ({sdk_time / max(fk_time, 1e-6):.1f}x)")
+    print(f"    max difference: {max_error}")
+    return fk_time, sdk_time, max_error
+
+
+if __name__ == "__main__":
+    # python -m mocap_browser.fbx_utils <file.fbx> [<file.fbx> ...]
+    for arg_file_path in sys.argv[1:]:
+        compare_with_sdk(arg_file_path)
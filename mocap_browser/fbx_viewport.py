@@ -1,37 +1,208 @@
 import os
+import sys
+import math
+import traceback
+import functools
+import concurrent.futures
 
 from . import ui_utils
 from .ui_utils import QtCore, QtWidgets
+from .mocap_browser_system import dcc
 
-# Requires PyOpenGL
+# Requires PyOpenGL and NumPy
+import numpy as np
 from OpenGL import GL
+from .gl_utils import culling
+from .gl_utils import picking
+from .gl_utils import scene_utils
 
-# Requires FBX SDK
-import fbx
-from . import fbx_utils
+from . import anim_source
 from . import fbx_gl_utils
+from .bake_cache import BakeCache
 
 # Base Viewport Widget
 from .qt_viewport import AnimationViewportWidget
 
+# contact sheet cells are this much larger than the largest clip
+CONTACT_SHEET_CELL_PADDING = 1.25
+
+# how far from a joint in pixels a click still picks it
+PICK_DISTANCE = 12.0
+
 
 class ViewportSceneDescription(object):
     def __init__(self):
-        self.transform_hierarchy = {}
+        self.transform_hierarchy = {}  # {file_path: BakedAnimation}
+        self.joint_visibility = {}  # {file_path: (joint_count,) bool array}
+
+
+class LoadCancelledError(Exception):
+    pass
+
+
+class AnimLoadWorkerSignals(QtCore.QObject):
+    progress = QtCore.Signal(int, str, float)  # load id, file path, 0-1 progress
+    file_loaded = QtCore.Signal(int, object)  # load id, AnimationSource
+    finished = QtCore.Signal(int)
+    error = QtCore.Signal(tuple)
+
+
+class AnimLoadWorker(QtCore.QRunnable):
+    """Loads and bakes animation files off the UI thread, one file at a time"""
+    def __init__(self, load_id, file_paths, bake_cache=None):
+        super(AnimLoadWorker, self).__init__()
+
+        self.load_id = load_id
+        self.file_paths = file_paths
+        self.bake_cache = bake_cache
+        self.is_cancelled = False
+        self.signals = AnimLoadWorkerSignals()
+        self._reported_percent = -1
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def _report_progress(self, file_path, progress):
+        if self.is_cancelled:
+            raise LoadCancelledError()
+
+        # only emit when the displayed percentage changes
+        percent = int(progress * 100)
+        if percent != self._reported_percent:
+            self._reported_percent = percent
+            self.signals.progress.emit(self.load_id, file_path, progress)
+
+    @QtCore.Slot()
+    def run(self):
+        try:
+            for file_path in self.file_paths:
+                if self.is_cancelled:
+                    break
+
+                if not os.path.exists(file_path):
+                    print(f"Failed to find file: {file_path}")
+                    continue
+
+                self._reported_percent = -1
+                source = anim_source.create_source(file_path)
+                try:
+                    source.load_scene(
+                        file_path,
+                        progress_callback=functools.partial(self._report_progress, file_path),
+                        bake_cache=self.bake_cache,
+                        )
+                except LoadCancelledError:
+                    source.unload_scene()
+                    break
+
+                self.signals.file_loaded.emit(self.load_id, source)
+        except:
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        finally:
+            self.signals.finished.emit(self.load_id)
+
+
+class AnimProcessPoolLoadWorker(AnimLoadWorker):
+    """Loads and bakes each file in its own worker process, only the baked arrays are sent back"""
+    @QtCore.Slot()
+    def run(self):
+        try:
+            file_paths = [path for path in self.file_paths if os.path.exists(path)]
+            for missing_path in set(self.file_paths) - set(file_paths):
+                print(f"Failed to find file: {missing_path}")
+
+            # already baked clips don't need a process
+            for file_path in list(file_paths):
+                baked = self.bake_cache.get(file_path) if self.bake_cache else None
+                if baked:
+                    source = anim_source.create_source(file_path)
+                    source.load_baked(file_path, baked)
+                    self.signals.file_loaded.emit(self.load_id, source)
+                    file_paths.remove(file_path)
+
+            if not file_paths:
+                return
+
+            max_workers = min(len(file_paths), os.cpu_count() or 1)
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+            try:
+                future_paths = {}
+                for file_path in file_paths:
+                    future = executor.submit(anim_source.bake_file, file_path, self.bake_cache)
+                    future_paths[future] = file_path
+                    self.signals.progress.emit(self.load_id, file_path, 0.0)
+
+                for future in concurrent.futures.as_completed(future_paths):
+                    if self.is_cancelled:
+                        break
+
+                    file_path = future_paths[future]
+                    try:
+                        baked = future.result()
+                    except Exception:
+                        print(f"Failed to load file: {file_path}")
+                        traceback.print_exc()
+                        continue
+
+                    source = anim_source.create_source(file_path)
+                    source.load_baked(file_path, baked)
+                    self.signals.file_loaded.emit(self.load_id, source)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+            # the worker processes only wrote their entries, one eviction pass covers the whole load
+            if self.bake_cache:
+                self.bake_cache.evict()
+        except:
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        finally:
+            self.signals.finished.emit(self.load_id)
 
 
 class FBXViewportWidget(AnimationViewportWidget):
-    """3D OpenGL Viewport that knows how to display FBX files"""
+    """3D OpenGL Viewport that knows how to display animation files (FBX, BVH)"""
 
-    scene_content_updated = QtCore.Signal(ViewportSceneDescription)
+    scene_content_updated = QtCore.Signal(ViewportSceneDescription)  # every loaded clip, replaces the previous scene
+    scene_content_added = QtCore.Signal(ViewportSceneDescription)  # only clips added to the current scene
+    joint_picked = QtCore.Signal(str, str, object)  # file path, joint name, (3,) world position
 
     def __init__(self, parent):
         super().__init__(parent)
 
-        self.fbx_handlers = []
-        self.time = fbx.FbxTime()
-
-        self.hidden_nodes = []
+        self.anim_sources = []
+        self.skeleton_renderers = {}  # {file_path: SkeletonRenderer}, created in paintGL with the context current
+        self.trajectory_renderers = {}  # {file_path: TrajectoryRenderer}
+
+        # contact sheet lays every clip out in its own grid cell instead of overlaying them at the origin
+        self.contact_sheet_active = False
+        self.culled_clip_count = 0
+        ui_utils.add_hotkey(self, "T", self.toggle_contact_sheet)
+
+        self.picked_joint = None  # (AnimationSource, joint index)
+
+        # onion skinning and motion trails, 0 turns them off
+        self.ghost_count = 0  # ghost poses on either side of the playhead
+        self.ghost_step = 2  # frames between ghost poses
+        self.trail_window = 0  # frames of motion trail on either side of the playhead
+        self.show_root_trajectory = False
+
+        # background loading, a single thread since the FBX SDK isn't thread safe
+        self.load_threadpool = QtCore.QThreadPool()
+        self.load_threadpool.setMaxThreadCount(1)
+        self._load_id = 0
+        self._load_worker = None  # type: AnimLoadWorker
+        self._load_file_count = 0
+        self.load_progress = {}  # {file_path: 0-1 progress} of files currently loading
+
+        # baked clips persisted between sessions
+        self.bake_cache = None
+        bake_cache_folder = dcc.get_bake_cache_folder()
+        if bake_cache_folder:
+            self.bake_cache = BakeCache(bake_cache_folder, dcc.get_bake_cache_size_limit())
 
         self.setAcceptDrops(True)
 
@@ -45,107 +216,318 @@ class FBXViewportWidget(AnimationViewportWidget):
         if not event.mimeData().hasUrls():  # only if file or link is dropped
             return
         
-        fbx_paths = []
+        anim_paths = []
         for url in event.mimeData().urls():
             local_path = url.toLocalFile()
-            if local_path.lower().endswith(".fbx"):
-                fbx_paths.append(local_path)
+            if anim_source.is_supported_file(local_path):
+                anim_paths.append(local_path)
 
-        if not fbx_paths:
-            QtWidgets.QMessageBox.warning(self, "Invalid Paths", "Could not find any .fbx's in the dropped files")
+        if not anim_paths:
+            supported_extensions = ", ".join(anim_source.get_supported_extensions())
+            QtWidgets.QMessageBox.warning(
+                self, "Invalid Paths", f"Could not find any {supported_extensions} files in the dropped files"
+                )
             return
 
-        self.load_fbx_files(fbx_paths)
+        self.load_fbx_files(anim_paths)
 
     def paintGL(self):
         super().paintGL()
 
-        GL.glLineWidth(4.0)
-        GL.glBegin(GL.GL_LINES)
-        for fbx_handler in self.fbx_handlers: # type: fbx_utils.FbxHandler
-            if not fbx_handler.is_loaded:
-                continue
+        visible_sources = self.get_visible_sources()
+        for source in visible_sources: # type: anim_source.AnimationSource
+            # baked positions are uploaded once, then drawn from the GPU at the frame's offset
+            renderer = self.skeleton_renderers.get(source.file_path)
+            if renderer is None:
+                renderer = fbx_gl_utils.SkeletonRenderer(source)
+                self.skeleton_renderers[source.file_path] = renderer
+
+            if self.show_root_trajectory:
+                trajectory_renderer = self.trajectory_renderers.get(source.file_path)
+                if trajectory_renderer is None:
+                    trajectory_renderer = fbx_gl_utils.TrajectoryRenderer(source)
+                    self.trajectory_renderers[source.file_path] = trajectory_renderer
+                trajectory_renderer.draw()
+
+            # ghosts and trails are more offsets into the same buffer, nothing is evaluated again
+            GL.glLineWidth(1.0)
+            if self.trail_window:
+                renderer.draw_trails(self.active_frame, self.trail_window)
+            if self.ghost_count:
+                renderer.draw_ghosts(self.active_frame, self.ghost_count, self.ghost_step)
+
+            GL.glLineWidth(4.0)
+            renderer.draw(self.active_frame)
+
+        if self.contact_sheet_active:
+            self.draw_clip_labels(visible_sources)
+
+        self.draw_picked_joint()
+
+        self.draw_load_progress()
+
+    def get_visible_sources(self):
+        """loaded sources whose whole clip bounds intersect the view frustum"""
+        sources = [source for source in self.anim_sources if source.is_loaded]
+        if len(sources) < 2:
+            self.culled_clip_count = 0
+            return sources
+
+        box_mins = np.empty((len(sources), 3), dtype=np.float32)
+        box_maxs = np.empty((len(sources), 3), dtype=np.float32)
+        for i, source in enumerate(sources): # type: anim_source.AnimationSource
+            bounds_min, bounds_max = source.baked.get_bounds()
+            box_mins[i] = bounds_min + source.display_offset
+            box_maxs[i] = bounds_max + source.display_offset
+
+        planes = culling.get_frustum_planes(self.main_camera.get_view_projection_matrix())
+        in_view = culling.get_boxes_in_frustum(planes, box_mins, box_maxs)
+        self.culled_clip_count = len(sources) - int(np.count_nonzero(in_view))
+        return [source for source, visible in zip(sources, in_view) if visible]
+
+    def set_ghost_count(self, ghost_count, ghost_step=None):
+        self.ghost_count = max(int(ghost_count), 0)
+        if ghost_step is not None:
+            self.ghost_step = max(int(ghost_step), 1)
+        self.invalidate()
+
+    def set_show_root_trajectory(self, state):
+        self.show_root_trajectory = bool(state)
+        self.invalidate()
+
+    def set_trail_window(self, trail_window):
+        self.trail_window = max(int(trail_window), 0)
+        self.invalidate()
+
+    def get_scene_bounds(self, whole_clip=False):
+        """box around the current pose of every loaded clip, or around each clip's whole take"""
+        sources = [source for source in self.anim_sources if source.is_loaded]
+        if not sources:
+            return None
+
+        box_mins = np.empty((len(sources), 3), dtype=np.float32)
+        box_maxs = np.empty((len(sources), 3), dtype=np.float32)
+        for i, source in enumerate(sources): # type: anim_source.AnimationSource
+            if whole_clip:
+                bounds_min, bounds_max = source.baked.get_bounds()
+            else:
+                bounds_min, bounds_max = source.baked.get_pose_bounds(self.active_frame)
+            box_mins[i] = bounds_min + source.display_offset
+            box_maxs[i] = bounds_max + source.display_offset
+        return box_mins.min(axis=0), box_maxs.max(axis=0)
+
+    def pick(self, x, y):
+        """select the visible joint nearest to the click, across every visible clip at once"""
+        sources = self.get_visible_sources()
+        if not sources:
+            return
 
-            hidden_nodes = fbx_handler.hidden_nodes
+        # (all joints, 3) world positions of the current frame, with the source and joint index of each
+        joint_points = []
+        source_indices = []
+        joint_indices = []
+        for source_index, source in enumerate(sources): # type: anim_source.AnimationSource
+            visible_indices = np.flatnonzero(source.joint_visibility)
+            joint_points.append(source.baked.get_positions(self.active_frame)[visible_indices] + source.display_offset)
+            source_indices.append(np.full(len(visible_indices), source_index))
+            joint_indices.append(visible_indices)
+
+        screen_points, in_front = picking.project_points(
+            self.main_camera.get_view_projection_matrix(),
+            np.concatenate(joint_points),
+            self.width(),
+            self.height(),
+        )
+        nearest_index = picking.get_nearest_point_index(screen_points, in_front, x, y, PICK_DISTANCE)
+        if nearest_index < 0:
+            self.picked_joint = None
+            self.invalidate()
+            return
 
-            self.time.SetTime(0, 0, 0, int(self.active_frame))
+        source = sources[np.concatenate(source_indices)[nearest_index]]
+        joint_index = int(np.concatenate(joint_indices)[nearest_index])
+        self.picked_joint = (source, joint_index)
+        self.invalidate()
 
-            # get skeleton at current frame
-            skel_points = fbx_gl_utils.recursive_get_fbx_skeleton_positions(
-                fbx_handler.scene.GetRootNode(), 
-                self.time,
-                fbx_handler.display_color,
-                )
+        self.joint_picked.emit(
+            source.file_path,
+            source.baked.joint_names[joint_index],
+            self.get_picked_joint_position(),
+        )
 
-            # draw skeleton
-            GL.glColor(*fbx_handler.display_color)
-            for bone_name, pos_list in skel_points.items():
-                if bone_name in hidden_nodes:
-                    continue
+    def get_picked_joint_position(self):
+        """world position of the picked joint in its clip, without the contact sheet offset"""
+        source, joint_index = self.picked_joint
+        return source.baked.get_positions(self.active_frame)[joint_index]
 
-                node_pos = pos_list[0]
-                parent_pos = pos_list[1]
-                GL.glVertex(node_pos[0], node_pos[1], node_pos[2])
-                GL.glVertex(parent_pos[0], parent_pos[1], parent_pos[2])
-        GL.glEnd()
-    
-    def load_fbx_files(self, fbx_file_paths=None):
-        if not fbx_file_paths:
+    def draw_picked_joint(self):
+        if self.picked_joint is None:
             return
 
+        source, joint_index = self.picked_joint
+        if not source.is_loaded:
+            self.picked_joint = None
+            return
+
+        position = self.get_picked_joint_position()
+        bounds_min, bounds_max = source.baked.get_bounds()
+        locator_size = max(float(np.linalg.norm(bounds_max - bounds_min)) * 0.02, 0.01)
+        scene_utils.draw_locator(position + source.display_offset, size=locator_size)
+
+        GL.glColor(1.0, 1.0, 0.4)
+        joint_name = source.baked.joint_names[joint_index]
+        self.renderText(10, self.height() - 10,
+                        "{}  ({:.2f}, {:.2f}, {:.2f})".format(joint_name, *position))
+
+    def draw_clip_labels(self, sources):
+        GL.glColor(1.0, 1.0, 1.0)
+        for source in sources: # type: anim_source.AnimationSource
+            bounds_min, bounds_max = source.baked.get_bounds()
+            label_pos = source.display_offset + (bounds_min[0], 0.0, bounds_max[2])
+            self.renderText(float(label_pos[0]), float(label_pos[1]), float(label_pos[2]),
+                            os.path.basename(source.file_path))
+
+    def toggle_contact_sheet(self):
+        self.set_contact_sheet_active(not self.contact_sheet_active)
+
+    def set_contact_sheet_active(self, state):
+        self.contact_sheet_active = state
+        self.update_clip_layout()
+        self.frame_whole_scene()
+
+    def update_clip_layout(self):
+        """offset every clip into its own grid cell on the ground plane when the contact sheet is active"""
+        if not self.contact_sheet_active or not self.anim_sources:
+            for source in self.anim_sources: # type: anim_source.AnimationSource
+                source.display_offset = np.zeros(3, dtype=np.float32)
+            return
+
+        clip_bounds = [source.baked.get_bounds() for source in self.anim_sources]
+        cell_size = max(max(bounds_max[0] - bounds_min[0], bounds_max[2] - bounds_min[2])
+                        for bounds_min, bounds_max in clip_bounds)
+        cell_size = max(float(cell_size), 1.0) * CONTACT_SHEET_CELL_PADDING
+
+        column_count = int(math.ceil(math.sqrt(len(self.anim_sources))))
+        row_count = int(math.ceil(len(self.anim_sources) / column_count))
+        for i, (source, (bounds_min, bounds_max)) in enumerate(zip(self.anim_sources, clip_bounds)):
+            row, column = divmod(i, column_count)
+
+            # center the clip in its cell and the whole sheet on the origin
+            cell_center_x = (column - (column_count - 1) * 0.5) * cell_size
+            cell_center_z = (row - (row_count - 1) * 0.5) * cell_size
+            clip_center = (bounds_min + bounds_max) * 0.5
+            source.display_offset = np.array(
+                (cell_center_x - clip_center[0], 0.0, cell_center_z - clip_center[2]), dtype=np.float32
+            )
+
+    def draw_load_progress(self):
+        GL.glColor(1.0, 1.0, 1.0)
+        for i, (file_path, progress) in enumerate(self.load_progress.items()):
+            self.renderText(10, 20 + i * 15, f"Loading {os.path.basename(file_path)} {int(progress * 100)}%")
+
+    def load_fbx_files(self, file_paths=None, use_process_pool=False):
+        """
+        loads any file format supported by anim_source, not only fbx.
+        use_process_pool loads every file in its own process,
+        worth the process startup cost when loading several files at once
+        """
+        if not file_paths:
+            return
+
+        if not isinstance(file_paths, list):
+            file_paths = [file_paths]
+
+        # the previous load is stale now
+        self.cancel_load()
         self.remove_existing_handlers()
 
-        if not isinstance(fbx_file_paths, list):
-            fbx_file_paths = [fbx_file_paths]
+        self._load_id += 1
+        self._load_file_count = len(file_paths)
+
+        use_process_pool = use_process_pool and len(file_paths) > 1 and dcc.supports_process_pool_loading()
+        worker_cls = AnimProcessPoolLoadWorker if use_process_pool else AnimLoadWorker
+
+        self._load_worker = worker_cls(self._load_id, file_paths, bake_cache=self.bake_cache)
+        self._load_worker.signals.progress.connect(self._on_load_progress)
+        self._load_worker.signals.file_loaded.connect(self._on_file_loaded)
+        self._load_worker.signals.finished.connect(self._on_load_finished)
+        self.load_threadpool.start(self._load_worker)
+
+    def cancel_load(self):
+        if self._load_worker is not None:
+            self._load_worker.cancel()
+            self._load_worker = None
+        self.load_progress.clear()
+        self.invalidate()
+
+    def _on_load_progress(self, load_id, file_path, progress):
+        if load_id != self._load_id:
+            return
+        self.load_progress[file_path] = progress
+        self.invalidate()
+
+    def _on_file_loaded(self, load_id, source):
+        if 0:
+            source = anim_source.AnimationSource()
 
+        if load_id != self._load_id:
+            source.unload_scene()
+            return
+
+        self.load_progress.pop(source.file_path, None)
+
+        # assign random skeleton color to distinguish multiple clips
+        if self._load_file_count > 1:
+            source.display_color = ui_utils.get_random_color()
+
+        is_first_clip = not self.anim_sources
+        self.anim_sources.append(source)
+        self.update_clip_layout()
+
+        self.start_frame = min([source.get_start_frame() for source in self.anim_sources])
+        self.end_frame = max([source.get_end_frame() for source in self.anim_sources])
+        if is_first_clip:
+            self.active_frame = self.start_frame
+            self.frame_whole_scene()
+            # play back at the frame rate of the first clip's scene
+            self.set_fps(source.get_fps())
+
+        # send only the new clip to the tree widget, rebuilding every clip per loaded file adds up on big loads
         scene_desc = ViewportSceneDescription()
+        scene_desc.transform_hierarchy[source.file_path] = source.baked
+        scene_desc.joint_visibility[source.file_path] = source.joint_visibility
 
-        start_times = []
-        end_times = []
-        for fbx_file in fbx_file_paths:
-
-            if not os.path.exists(fbx_file):
-                print(f"Failed to find fbx file: {fbx_file}")
-                continue
-
-            fbx_handler = fbx_utils.FbxHandler()
-            fbx_handler.load_scene(fbx_file)
-            self.fbx_handlers.append(fbx_handler)
-            start_times.append(fbx_handler.get_start_frame())
-            end_times.append(fbx_handler.get_end_frame())
-
-            # assign random skeleton color to distinguish multiple clips
-            if len(fbx_file_paths) > 1:
-                fbx_handler.display_color = ui_utils.get_random_color()
-            
-            # send scene data to tree widget
-            scene_hiearchy = fbx_utils.recursive_get_fbx_skeleton_hierarchy(
-                fbx_handler.scene.GetRootNode(),
-                )
-            scene_desc.transform_hierarchy[fbx_file] = scene_hiearchy
+        if is_first_clip:
+            self.scene_content_updated.emit(scene_desc)
+        else:
+            self.scene_content_added.emit(scene_desc)
+        self.invalidate()
+
+    def _on_load_finished(self, load_id):
+        if load_id != self._load_id:
+            return
+        self._load_worker = None
+        self.load_progress.clear()
+        self.invalidate()
 
-        self.start_frame = min(start_times)
-        self.end_frame = max(end_times)
-        self.active_frame = self.start_frame
-        self.scene_content_updated.emit(scene_desc)
-        self.update()
-    
     def remove_existing_handlers(self):
-        for handler in self.fbx_handlers: # type: fbx_utils.FbxHandler
-            handler.unload_scene()
-        self.fbx_handlers.clear()
+        self.picked_joint = None
+        for source in self.anim_sources: # type: anim_source.AnimationSource
+            source.unload_scene()
+        self.anim_sources.clear()
+
+        renderers = list(self.skeleton_renderers.values()) + list(self.trajectory_renderers.values())
+        if renderers:
+            self.makeCurrent()
+            for renderer in renderers:
+                renderer.release()
+            self.doneCurrent()
+        self.skeleton_renderers.clear()
+        self.trajectory_renderers.clear()
     
     def set_node_visibility(self, fbx_path, node_names, state):
-        for fbx_handler in self.fbx_handlers: # type: fbx_utils.FbxHandler
-            if fbx_handler.file_path != fbx_path:
-                continue
-
-            if state:
-                for node in node_names:
-                    if node in fbx_handler.hidden_nodes:
-                        fbx_handler.hidden_nodes.remove(node)
-            else:
-                for node in node_names:
-                    fbx_handler.hidden_nodes.append(node)
+        for source in self.anim_sources: # type: anim_source.AnimationSource
+            if source.file_path == fbx_path:
+                source.set_joints_visible(node_names, state)
         
-        self.update()
+        self.invalidate()
@@ -0,0 +1,199 @@
+"""
+Parallel directory crawler built on os.scandir
+
+listing a directory on a network share mostly waits on the server,
+so directories are listed concurrently on a small thread pool and files are yielded as each listing arrives.
+scandir's DirEntry already knows whether it's a file or folder, so no extra stat call is made per file
+"""
+import os
+import time
+import concurrent.futures
+
+# directories listed at the same time
+CRAWL_THREAD_COUNT = 16
+
+# mount types that don't send file system change notifications for changes made by other machines,
+# 9p and drvfs are the windows drives under WSL
+NETWORK_FILE_SYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "afs", "fuse.sshfs", "9p", "drvfs"}
+WINDOWS_DRIVE_REMOTE = 4  # GetDriveTypeW
+
+
+class CrawlStats(object):
+    """running totals of a crawl, readable from the consuming thread while it's in progress"""
+
+    def __init__(self):
+        self.dir_count = 0
+        self.file_count = 0
+        self.error_count = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def get_elapsed(self):
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return max(end_time - self.start_time, 1e-6)
+
+    def get_dirs_per_second(self):
+        return self.dir_count / self.get_elapsed()
+
+    def get_files_per_second(self):
+        return self.file_count / self.get_elapsed()
+
+    def __str__(self):
+        return "{} files in {} dirs, {:.2f}s ({:.0f} dirs/s, {:.0f} files/s)".format(
+            self.file_count,
+            self.dir_count,
+            self.get_elapsed(),
+            self.get_dirs_per_second(),
+            self.get_files_per_second(),
+        )
+
+
+class DirListing(object):
+    """
+    Contents of a single directory
+
+    file_stats line up with file_entries and are only filled in when the crawl asked for them,
+    the stat calls then run on the crawler threads as well
+    """
+
+    def __init__(self, dir_path, mtime_ns, dir_paths, file_entries, file_stats=None):
+        self.dir_path = dir_path
+        self.mtime_ns = mtime_ns
+        self.dir_paths = dir_paths
+        self.file_entries = file_entries
+        self.file_stats = file_stats  # type: list[os.stat_result]
+
+
+def is_symlink_loop(link_path):
+    """True when the symlinked folder at link_path points back at one of the folders above it"""
+    target_path = os.path.realpath(link_path)
+    parent_path = os.path.dirname(link_path)
+    while True:
+        if os.path.realpath(parent_path) == target_path:
+            return True
+        next_parent_path = os.path.dirname(parent_path)
+        if next_parent_path == parent_path:
+            return False
+        parent_path = next_parent_path
+
+
+def list_dir(dir_path, stat_files=False, file_extensions=None):
+    """
+    DirListing of a single directory, optionally only the files matching file_extensions
+
+    symlinked folders are listed as folders unless they point back above themselves,
+    files are filtered before they're stat'ed so a folder full of other files costs no extra calls
+    """
+    # stat before listing, a change made while listing then shows up as a newer mtime next time
+    mtime_ns = os.stat(dir_path).st_mtime_ns
+
+    dir_paths = []
+    file_entries = []
+    file_stats = [] if stat_files else None
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    if not entry.is_symlink() or not is_symlink_loop(entry.path):
+                        dir_paths.append(entry.path)
+                    continue
+                if file_extensions and os.path.splitext(entry.name)[-1] not in file_extensions:
+                    continue
+                if stat_files:
+                    file_stats.append(entry.stat(follow_symlinks=True))
+                file_entries.append(entry)
+            except OSError:
+                continue
+    return DirListing(dir_path, mtime_ns, dir_paths, file_entries, file_stats)
+
+
+def iter_dir_listings(
+        dir_paths,
+        max_workers=CRAWL_THREAD_COUNT,
+        stats=None,
+        stat_files=False,
+        descend_filter=None,
+        file_extensions=None,
+):
+    """
+    yield a DirListing for every directory in dir_paths and every directory below them,
+    in whichever order the listings come back, only holding the files matching file_extensions if given
+
+    descend_filter(dir_path) can return False to skip a sub directory,
+    directories that can't be listed are skipped, same as os.walk
+    """
+    if 0:
+        stats = CrawlStats()
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="file_crawler")
+    pending = {executor.submit(list_dir, dir_path, stat_files, file_extensions) for dir_path in dir_paths}
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    dir_listing = future.result()  # type: DirListing
+                except OSError:
+                    if stats:
+                        stats.error_count += 1
+                    continue
+
+                # queue the next level before handing out the listing so the pool keeps busy while the caller works
+                for sub_dir_path in dir_listing.dir_paths:
+                    if descend_filter is None or descend_filter(sub_dir_path):
+                        pending.add(executor.submit(list_dir, sub_dir_path, stat_files, file_extensions))
+
+                if stats:
+                    stats.dir_count += 1
+                    stats.file_count += len(dir_listing.file_entries)
+
+                yield dir_listing
+    finally:
+        # the caller may stop early, don't list the rest of the share
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+        if stats:
+            stats.end_time = time.perf_counter()
+
+
+def iter_folder_entries(dir_path, file_extensions=None, max_workers=CRAWL_THREAD_COUNT, stats=None):
+    """yield a DirEntry for every file under dir_path, optionally only the ones matching file_extensions"""
+    for dir_listing in iter_dir_listings([dir_path], max_workers, stats, file_extensions=file_extensions):
+        for entry in dir_listing.file_entries:
+            yield entry
+
+
+def iter_folder_files(dir_path, file_extensions=None, max_workers=CRAWL_THREAD_COUNT, stats=None):
+    """yield every file path under dir_path, optionally only the ones matching file_extensions"""
+    for entry in iter_folder_entries(dir_path, file_extensions, max_workers, stats):
+        yield entry.path
+
+
+def is_network_path(path):
+    """True when path is on a network share, a mapped drive or an nfs/smb mount"""
+    path = os.path.abspath(path)
+    if os.name == "nt":
+        if path.startswith("\\\\"):
+            return True
+        import ctypes
+        drive = os.path.splitdrive(path)[0] + "\\"
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == WINDOWS_DRIVE_REMOTE
+
+    # the innermost mount containing path decides
+    try:
+        with open("/proc/mounts", "r") as fp:
+            mounts = [line.split()[1:3] for line in fp]
+    except OSError:
+        return False
+
+    path = os.path.realpath(path)
+    mount_type = None
+    mount_point_length = -1
+    for mount_point, file_system in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+            if len(mount_point) > mount_point_length:
+                mount_point_length = len(mount_point)
+                mount_type = file_system
+    return mount_type in NETWORK_FILE_SYSTEMS
@@ -0,0 +1,197 @@
+"""
+Batched forward kinematics over local TRS channels
+
+every matrix is column-vector style (point = M @ p), batched over frames as (frames, 4, 4) arrays.
+the local transform follows the FBX SDK definition
+
+    T * Roff * Rp * Rpre * R * Rpost^-1 * Rp^-1 * Soff * Sp * S * Sp^-1
+
+"""
+import numpy as np
+
+# index matches FBX's EFbxRotationOrder, letters are listed in the order the rotations are applied
+ROTATION_ORDERS = ("XYZ", "XZY", "YZX", "YXZ", "ZXY", "ZYX")
+
+
+def axis_rotation_matrices(axis, radians):
+    """(n, 3, 3) rotations around a single axis"""
+    cos = np.cos(radians)
+    sin = np.sin(radians)
+    matrices = np.zeros((len(radians), 3, 3))
+    if axis == "X":
+        matrices[:, 0, 0] = 1.0
+        matrices[:, 1, 1] = cos
+        matrices[:, 1, 2] = -sin
+        matrices[:, 2, 1] = sin
+        matrices[:, 2, 2] = cos
+    elif axis == "Y":
+        matrices[:, 0, 0] = cos
+        matrices[:, 0, 2] = sin
+        matrices[:, 1, 1] = 1.0
+        matrices[:, 2, 0] = -sin
+        matrices[:, 2, 2] = cos
+    else:
+        matrices[:, 0, 0] = cos
+        matrices[:, 0, 1] = -sin
+        matrices[:, 1, 0] = sin
+        matrices[:, 1, 1] = cos
+        matrices[:, 2, 2] = 1.0
+    return matrices
+
+
+def euler_to_matrices(degrees, rotation_order="XYZ"):
+    """(n, 3) euler angles in degrees to (n, 3, 3) rotation matrices, rotation_order is the order they're applied"""
+    radians = np.radians(np.asarray(degrees, dtype=np.float64).reshape(-1, 3))
+    matrices = None
+    for axis in rotation_order:
+        axis_matrices = axis_rotation_matrices(axis, radians[:, "XYZ".index(axis)])
+        matrices = axis_matrices if matrices is None else axis_matrices @ matrices
+    return matrices
+
+
+def translation_matrices(translations):
+    translations = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    matrices = np.tile(np.eye(4), (len(translations), 1, 1))
+    matrices[:, :3, 3] = translations
+    return matrices
+
+
+def rotation_matrices(degrees, rotation_order="XYZ"):
+    rotations = euler_to_matrices(degrees, rotation_order)
+    matrices = np.tile(np.eye(4), (len(rotations), 1, 1))
+    matrices[:, :3, :3] = rotations
+    return matrices
+
+
+def scale_matrices(scales):
+    scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+    matrices = np.zeros((len(scales), 4, 4))
+    matrices[:, 0, 0] = scales[:, 0]
+    matrices[:, 1, 1] = scales[:, 1]
+    matrices[:, 2, 2] = scales[:, 2]
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+class ConstantChannel(object):
+    """a vector channel without animation"""
+    def __init__(self, value):
+        self.value = np.asarray(value, dtype=np.float64).reshape(3)
+
+    def evaluate(self, frames):
+        return np.tile(self.value, (len(frames), 1))
+
+
+class FkJoint(object):
+    """
+    Local transform definition of a single node
+
+    translation, rotation and scale are channels with an evaluate(frames) -> (n, 3) method,
+    rotation in degrees applied in rotation_order.
+    nodes that don't inherit_scale undo their parent's local scale below their translation (maya's segment scale compensate)
+    """
+
+    def __init__(self,
+                 parent_index,
+                 translation,
+                 rotation,
+                 scale,
+                 rotation_order="XYZ",
+                 rotation_offset=(0, 0, 0),
+                 rotation_pivot=(0, 0, 0),
+                 pre_rotation=(0, 0, 0),
+                 post_rotation=(0, 0, 0),
+                 scaling_offset=(0, 0, 0),
+                 scaling_pivot=(0, 0, 0),
+                 inherit_scale=True,
+                 ):
+        self.parent_index = parent_index
+        self.translation = translation
+        self.rotation = rotation
+        self.scale = scale
+        self.rotation_order = rotation_order
+        self.inherit_scale = inherit_scale
+
+        # static parts of the local transform, folded once
+        rotation_pivot_matrix = translation_matrices(rotation_pivot)[0]
+        scaling_pivot_matrix = translation_matrices(scaling_pivot)[0]
+        self.pre_matrix = (
+            translation_matrices(rotation_offset)[0]
+            @ rotation_pivot_matrix
+            @ rotation_matrices(pre_rotation)[0]
+        )
+        self.post_matrix = (
+            np.linalg.inv(rotation_matrices(post_rotation)[0])
+            @ np.linalg.inv(rotation_pivot_matrix)
+            @ translation_matrices(scaling_offset)[0]
+            @ scaling_pivot_matrix
+        )
+        self.scaling_pivot_inverse = np.linalg.inv(scaling_pivot_matrix)
+
+    def get_local_matrices(self, frames, scales=None):
+        """(n, 4, 4) local matrices, scales can be passed in if already evaluated"""
+        if scales is None:
+            scales = self.scale.evaluate(frames)
+        return (
+            translation_matrices(self.translation.evaluate(frames))
+            @ self.pre_matrix
+            @ rotation_matrices(self.rotation.evaluate(frames), self.rotation_order)
+            @ self.post_matrix
+            @ scale_matrices(scales)
+            @ self.scaling_pivot_inverse
+        )
+
+
+def compute_global_positions(joints, frames, output_indices=None, chunk_size=1024, progress_callback=None):
+    """
+    (frames, outputs, 3) float32 global positions of joints[output_indices] at every frame
+
+    joints must be ordered parents first, frames are evaluated chunk_size at a time
+    so memory stays bounded on long takes.
+    progress_callback is called for every joint of every chunk, raising from it stops the evaluation
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    if output_indices is None:
+        output_indices = range(len(joints))
+    output_indices = list(output_indices)
+
+    positions = np.zeros((len(frames), len(output_indices), 3), dtype=np.float32)
+    for chunk_start in range(0, len(frames), chunk_size):
+        chunk_frames = frames[chunk_start:chunk_start + chunk_size]
+        global_matrices = []
+        local_scales = []
+        for i, joint in enumerate(joints):  # type: FkJoint
+            if progress_callback:
+                progress_callback((chunk_start + len(chunk_frames) * i / len(joints)) / len(frames))
+
+            scales = joint.scale.evaluate(chunk_frames)
+            local_matrices = joint.get_local_matrices(chunk_frames, scales)
+
+            if joint.parent_index < 0:
+                joint_global = local_matrices
+            elif joint.inherit_scale:
+                joint_global = global_matrices[joint.parent_index] @ local_matrices
+            else:
+                # the translation still moves through the parent's scaled space,
+                # only the rotation and scale below it skip the parent's scale
+                parent_scales = local_scales[joint.parent_index]
+                parent_scale_inverse = scale_matrices(
+                    np.divide(1.0, parent_scales, out=np.zeros_like(parent_scales), where=parent_scales != 0)
+                )
+                translations = joint.translation.evaluate(chunk_frames)
+                untranslated_matrices = local_matrices.copy()
+                untranslated_matrices[:, :3, 3] -= translations
+                joint_global = (
+                    global_matrices[joint.parent_index]
+                    @ translation_matrices(translations)
+                    @ parent_scale_inverse
+                    @ untranslated_matrices
+                )
+
+            global_matrices.append(joint_global)
+            local_scales.append(scales)
+
+        for output_index, joint_index in enumerate(output_indices):
+            positions[chunk_start:chunk_start + len(chunk_frames), output_index] = global_matrices[joint_index][:, :3, 3]
+
+    return positions
@@ -0,0 +1,201 @@
+import os
+import json
+import hashlib
+import concurrent.futures
+
+from . import file_crawler
+from . import mocap_browser_logger
+
+log = mocap_browser_logger.get_logger()
+
+# bump when the stored data changes, so old listings are never read back
+CACHE_VERSION = 1
+
+
+class CachedDir(object):
+    def __init__(self, mtime_ns, dir_names, files):
+        self.mtime_ns = mtime_ns
+        self.dir_names = dir_names  # names of the sub directories
+        self.files = files  # {file name: [size, mtime_ns]}, values are None for listings without file stats
+
+    def to_json(self):
+        return [self.mtime_ns, self.dir_names, self.files]
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(*data)
+
+
+def _get_mtime_ns(dir_path):
+    try:
+        return os.stat(dir_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class FolderListing(object):
+    """
+    Every directory under a root folder with its mtime, sub directories and files (with size and mtime)
+
+    a directory's mtime changes whenever an entry is added, removed or renamed in it,
+    so only directories with a new mtime need to be listed again to bring the whole listing up to date
+    """
+
+    def __init__(self, root_path, stat_files=True, file_extensions=None):
+        self.root_path = root_path
+        self.stat_files = stat_files  # file sizes and mtimes are needed to save the listing
+        self.file_extensions = sorted(file_extensions) if file_extensions else []  # empty keeps every file
+        self.dirs = {}  # type: dict[str, CachedDir]
+
+    def iter_file_paths(self):
+        for dir_path, cached_dir in self.dirs.items():
+            for file_name in cached_dir.files:
+                yield os.path.join(dir_path, file_name)
+
+    def iter_changes(self, max_workers=file_crawler.CRAWL_THREAD_COUNT, stats=None):
+        """
+        bring the listing up to date with the disk, yields (added file paths, removed file paths) per listed directory
+
+        an empty listing crawls the whole root, otherwise every known directory is checked
+        and only the ones whose mtime changed are listed again, along with any new directories below them
+        """
+        if not self.dirs:
+            changed_dir_paths = [self.root_path]
+        else:
+            cached_dir_paths = list(self.dirs)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                mtimes = dict(zip(cached_dir_paths, executor.map(_get_mtime_ns, cached_dir_paths)))
+
+            if mtimes.get(self.root_path) is None:
+                yield [], self.remove_dir(self.root_path)
+                return
+
+            # removed directories are dropped when their parent is listed again, since that changed the parent's mtime too
+            changed_dir_paths = [
+                dir_path for dir_path, mtime_ns in mtimes.items()
+                if mtime_ns is not None and mtime_ns != self.dirs[dir_path].mtime_ns
+            ]
+
+        for changes in self.iter_dir_changes(changed_dir_paths, max_workers, stats):
+            yield changes
+
+    def iter_dir_changes(self, dir_paths, max_workers=file_crawler.CRAWL_THREAD_COUNT, stats=None):
+        """
+        list dir_paths again whether their mtime changed or not, along with any new directories below them,
+        yields (added file paths, removed file paths) per listed directory
+        """
+        dir_listings = file_crawler.iter_dir_listings(
+            dir_paths,
+            max_workers=max_workers,
+            stats=stats,
+            stat_files=self.stat_files,
+            descend_filter=lambda dir_path: dir_path not in self.dirs,
+            file_extensions=self.file_extensions,
+        )
+        for dir_listing in dir_listings:
+            added_paths, removed_paths = self.update_dir(dir_listing)
+            if added_paths or removed_paths:
+                yield added_paths, removed_paths
+
+    def update_dir(self, dir_listing):
+        """store a new listing of a directory, returns the (added file paths, removed file paths)"""
+        if 0:
+            dir_listing = file_crawler.DirListing()
+
+        dir_path = dir_listing.dir_path
+        if dir_listing.file_stats is None:
+            files = dict.fromkeys(entry.name for entry in dir_listing.file_entries)
+        else:
+            files = {
+                entry.name: [file_stat.st_size, file_stat.st_mtime_ns]
+                for entry, file_stat in zip(dir_listing.file_entries, dir_listing.file_stats)
+            }
+        dir_names = [os.path.basename(sub_dir_path) for sub_dir_path in dir_listing.dir_paths]
+
+        removed_paths = []
+        cached_dir = self.dirs.get(dir_path)
+        if cached_dir is None:
+            added_names = list(files)
+        else:
+            added_names = [file_name for file_name in files if file_name not in cached_dir.files]
+            removed_paths.extend(
+                os.path.join(dir_path, file_name) for file_name in cached_dir.files if file_name not in files
+            )
+            for dir_name in set(cached_dir.dir_names).difference(dir_names):
+                removed_paths.extend(self.remove_dir(os.path.join(dir_path, dir_name)))
+
+        self.dirs[dir_path] = CachedDir(dir_listing.mtime_ns, dir_names, files)
+        return [os.path.join(dir_path, file_name) for file_name in added_names], removed_paths
+
+    def remove_dir(self, dir_path):
+        """forget a directory and everything below it, returns the file paths that were in it"""
+        removed_paths = []
+        cached_dir = self.dirs.pop(dir_path, None)
+        if cached_dir is None:
+            return removed_paths
+
+        removed_paths.extend(os.path.join(dir_path, file_name) for file_name in cached_dir.files)
+        for dir_name in cached_dir.dir_names:
+            removed_paths.extend(self.remove_dir(os.path.join(dir_path, dir_name)))
+        return removed_paths
+
+
+class FolderListingCache(object):
+    """
+    Persistent FolderListings, one json file per root folder and set of file extensions
+
+    lets the file tree show a folder as it was last seen before it's crawled again
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def get_cache_path(self, root_path, file_extensions=None):
+        key_str = "{}|{}|{}".format(
+            CACHE_VERSION,
+            os.path.normcase(os.path.abspath(root_path)),
+            ",".join(sorted(file_extensions or [])),
+        )
+        return os.path.join(self.folder, hashlib.sha1(key_str.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, root_path, file_extensions=None):
+        """the cached FolderListing of root_path, an empty one if it was never cached"""
+        folder_listing = FolderListing(root_path, file_extensions=file_extensions)
+        try:
+            with open(self.get_cache_path(root_path, file_extensions), "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return folder_listing
+
+        if data.get("version") != CACHE_VERSION or data.get("root_path") != root_path:
+            return folder_listing
+        # a listing of other file types would never pick up these files in unchanged directories
+        if data.get("file_extensions") != folder_listing.file_extensions:
+            return folder_listing
+
+        folder_listing.dirs = {
+            dir_path: CachedDir.from_json(cached_dir_data) for dir_path, cached_dir_data in data["dirs"].items()
+        }
+        return folder_listing
+
+    def save(self, folder_listing):
+        if 0:
+            folder_listing = FolderListing()
+
+        data = {
+            "version": CACHE_VERSION,
+            "root_path": folder_listing.root_path,
+            "file_extensions": folder_listing.file_extensions,
+            "dirs": {dir_path: cached_dir.to_json() for dir_path, cached_dir in folder_listing.dirs.items()},
+        }
+
+        cache_path = self.get_cache_path(folder_listing.root_path, folder_listing.file_extensions)
+        temp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            # written next to the old listing and swapped in, so a crash never leaves half a file
+            with open(temp_path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp, separators=(",", ":"))
+            os.replace(temp_path, cache_path)
+        except OSError:
+            log.warning(f"Failed to save folder listing cache: {cache_path}")
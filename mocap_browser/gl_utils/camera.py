@@ -3,6 +3,7 @@
 
 """
 yoinked from https://github.com/perelo/Cubical3DPath
+camera state and matrices ported to NumPy arrays
 """
 
 __authors__ = 'McGuffin, Eloi Perdereau'
@@ -11,10 +12,50 @@ __date__ = '17-06-2013'
 
 import math
 
-from OpenGL.GL import *
-from OpenGL.GLU import *
+import numpy as np
+from OpenGL import GL
 
-from .geom import *
+
+def normalized(vector):
+    length = np.linalg.norm(vector)
+    return vector / length if length > 0 else vector
+
+
+def rotation_around_origin(angle_in_radians, axis_vector):
+    """(3, 3) rotation of angle around a normalized axis"""
+    x, y, z = axis_vector
+    c = math.cos(angle_in_radians)
+    s = math.sin(angle_in_radians)
+    cross_matrix = np.array((
+        (0.0, -z, y),
+        (z, 0.0, -x),
+        (-y, x, 0.0),
+    ))
+    return c * np.eye(3) + s * cross_matrix + (1 - c) * np.outer(axis_vector, axis_vector)
+
+
+def frustum_matrix(left, right, bottom, top, near, far):
+    """(4, 4) row-major equivalent of glFrustum"""
+    return np.array((
+        (2 * near / (right - left), 0.0, (right + left) / (right - left), 0.0),
+        (0.0, 2 * near / (top - bottom), (top + bottom) / (top - bottom), 0.0),
+        (0.0, 0.0, -(far + near) / (far - near), -2 * far * near / (far - near)),
+        (0.0, 0.0, -1.0, 0.0),
+    ))
+
+
+def look_at_matrix(position, target, up):
+    """(4, 4) row-major equivalent of gluLookAt"""
+    forward = normalized(target - position)
+    side = normalized(np.cross(forward, up))
+    camera_up = np.cross(side, forward)
+
+    matrix = np.eye(4)
+    matrix[0, :3] = side
+    matrix[1, :3] = camera_up
+    matrix[2, :3] = -forward
+    matrix[:3, 3] = -matrix[:3, :3] @ position
+    return matrix
 
 
 class Camera(object):
@@ -24,8 +65,10 @@ class Camera(object):
         self.TRANSLATION_SPEED_FACTOR = 0.5 # the higher this, the faster
 
         # These are in world-space units.
-        self.nearPlane = 1.0
-        self.farPlane = 10000.0
+        self.DEFAULT_NEAR_PLANE = 1.0
+        self.DEFAULT_FAR_PLANE = 10000.0
+        self.nearPlane = self.DEFAULT_NEAR_PLANE
+        self.farPlane = self.DEFAULT_FAR_PLANE
 
         # During dollying (i.e. when the camera is translating into
         # the scene), if the camera gets too close to the target
@@ -45,27 +88,46 @@ class Camera(object):
         self.sceneRadius = 1
 
         # point of view, or center of camera; the ego-center; the eye-point
-        self.position = Point3D()
+        self.position = np.zeros(3)
 
         # point of interest; what the camera is looking at; the exo-center
-        self.target = Point3D()
+        self.target = np.zeros(3)
 
         # This is the up vector for the (local) camera space
-        self.up = Vector3D()
+        self.up = np.zeros(3)
 
         # This is the up vector for the (global) world space;
         # it is perpendicular to the horizontal (x,z)-plane
-        self.ground = Vector3D(0,1,0)
+        self.ground = np.array((0.0, 1.0, 0.0))
+
+        # matrices are rebuilt on the next request after any change
+        self._projection_matrix = None
+        self._view_matrix = None
+        self._view_projection_matrix = None
+
+    def _invalidate_view(self):
+        self._view_matrix = None
+        self._view_projection_matrix = None
+
+    def _invalidate_projection(self):
+        self._projection_matrix = None
+        self._view_projection_matrix = None
 
     def reset(self, x, y, z):
-        self.position = Point3D(x, y, z)
-        self.target = Point3D(0, 0, 0) # look at origin point
-        self.up = self.ground.returnCopy()
+        self.position = np.array((x, y, z), dtype=np.float64)
+        self.target = np.zeros(3) # look at origin point
+        self.up = self.ground.copy()
+        # frameBounds moves the planes to fit the framed clip
+        self.nearPlane = self.DEFAULT_NEAR_PLANE
+        self.farPlane = self.DEFAULT_FAR_PLANE
+        self._invalidate_projection()
+        self._invalidate_view()
 
     def setViewportDimensions(self, widthInPixels, heightInPixels):
         self.viewportWidthInPixels = widthInPixels
         self.viewportHeightInPixels = heightInPixels
         self.viewportRadiusInPixels = 0.5*widthInPixels if (widthInPixels < heightInPixels) else 0.5*heightInPixels
+        self._invalidate_projection()
 
     def getViewportWidth(self):
         return self.viewportWidthInPixels
@@ -74,26 +136,64 @@ class Camera(object):
     def setSceneRadius(self,radius):
         self.sceneRadius = radius
 
+    def get_projection_matrix(self):
+        if self._projection_matrix is None:
+            tangent = math.tan(self.FIELD_OF_VIEW_IN_DEGREES/2.0 / 180.0 * math.pi)
+            viewportRadius = self.nearPlane * tangent
+            if self.viewportWidthInPixels < self.viewportHeightInPixels:
+                viewportWidth = 2.0*viewportRadius
+                viewportHeight = viewportWidth * self.viewportHeightInPixels / float(self.viewportWidthInPixels)
+            else:
+                viewportHeight = 2.0*viewportRadius
+                viewportWidth = viewportHeight * self.viewportWidthInPixels / float(self.viewportHeightInPixels)
+
+            self._projection_matrix = frustum_matrix(
+                - 0.5 * viewportWidth,  0.5 * viewportWidth,    # left, right
+                - 0.5 * viewportHeight, 0.5 * viewportHeight,   # bottom, top
+                self.nearPlane, self.farPlane
+                )
+        return self._projection_matrix
+
+    def get_view_matrix(self):
+        if self._view_matrix is None:
+            self._view_matrix = look_at_matrix(self.position, self.target, self.up)
+        return self._view_matrix
+
+    def get_view_projection_matrix(self):
+        """(4, 4) row-major projection @ view"""
+        if self._view_projection_matrix is None:
+            self._view_projection_matrix = self.get_projection_matrix() @ self.get_view_matrix()
+        return self._view_projection_matrix
+
     def transform(self):
-        tangent = math.tan(self.FIELD_OF_VIEW_IN_DEGREES/2.0 / 180.0 * math.pi)
-        viewportRadius = self.nearPlane * tangent
-        if self.viewportWidthInPixels < self.viewportHeightInPixels:
-            viewportWidth = 2.0*viewportRadius
-            viewportHeight = viewportWidth * self.viewportHeightInPixels / float(self.viewportWidthInPixels)
-        else:
-            viewportHeight = 2.0*viewportRadius
-            viewportWidth = viewportHeight * self.viewportWidthInPixels / float(self.viewportHeightInPixels)
-            
-        glFrustum(
-            - 0.5 * viewportWidth,  0.5 * viewportWidth,    # left, right
-            - 0.5 * viewportHeight, 0.5 * viewportHeight,   # bottom, top
-            self.nearPlane, self.farPlane
-            )
-
-        px, py, pz = self.position.get()
-        tx, ty, tz = self.target.get()
-        gluLookAt(px, py, pz, tx, ty, tz, *self.up.get())
+        """replace the current GL matrix with the camera's projection @ view"""
+        # GL reads matrices column-major
+        GL.glLoadMatrixd(np.ascontiguousarray(self.get_view_projection_matrix().T))
+
+
+    # Moves the camera along its current view direction until the box
+    # from bounds_min to bounds_max fits in the viewport.
+    def frameBounds(self, bounds_min, bounds_max, margin=1.2):
+        bounds_min = np.asarray(bounds_min, dtype=np.float64)
+        bounds_max = np.asarray(bounds_max, dtype=np.float64)
+        center = (bounds_min + bounds_max) * 0.5
+        radius = max(np.linalg.norm(bounds_max - bounds_min) * 0.5, 1e-3)
+
+        # the bounding sphere has to fit the narrower field of view,
+        # the projection already puts FIELD_OF_VIEW_IN_DEGREES on the narrower axis
+        half_fov = self.FIELD_OF_VIEW_IN_DEGREES/2.0 / 180.0 * math.pi
+        distance = radius * margin / math.sin(half_fov)
+
+        direction = normalized(self.target - self.position)
+        self.target = center
+        self.position = center - direction * distance
+        self.sceneRadius = radius
 
+        # keep small (metre scale) clips from being clipped by the near plane
+        self.nearPlane = min(self.DEFAULT_NEAR_PLANE, radius * 0.01)
+        self.farPlane = max(self.DEFAULT_FAR_PLANE, (distance + radius) * 4)
+        self._invalidate_projection()
+        self._invalidate_view()
 
     # Causes the camera to "orbit" around the target point.
     # This is also called "tumbling" in some software packages.
@@ -103,14 +203,15 @@ class Camera(object):
 
         t2p = self.position - self.target
 
-        M = Matrix4x4.rotationAroundOrigin( (old_x_pixels - new_x_pixels) * radiansPerPixel, self.ground )
-        t2p = M * t2p
-        self.up = M * self.up
-        right = (self.up ^ t2p).normalized()
-        M = Matrix4x4.rotationAroundOrigin( (old_y_pixels - new_y_pixels) * radiansPerPixel, right )
-        t2p = M * t2p
-        self.up = M * self.up
+        M = rotation_around_origin( (old_x_pixels - new_x_pixels) * radiansPerPixel, self.ground )
+        t2p = M @ t2p
+        self.up = M @ self.up
+        right = normalized(np.cross(self.up, t2p))
+        M = rotation_around_origin( (old_y_pixels - new_y_pixels) * radiansPerPixel, right )
+        t2p = M @ t2p
+        self.up = M @ self.up
         self.position = self.target + t2p
+        self._invalidate_view()
 
     # This causes the scene to appear to translate right and up
     # (i.e., what really happens is the camera is translated left and down).
@@ -118,18 +219,19 @@ class Camera(object):
     # Passing in negative delta values causes the opposite motion.
     def translateSceneRightAndUp( self, delta_x_pixels, delta_y_pixels ):
         direction = self.target - self.position
-        distanceFromTarget = direction.length()
-        direction = direction.normalized()
+        distanceFromTarget = np.linalg.norm(direction)
+        direction = normalized(direction)
 
         translationSpeedInUnitsPerRadius = distanceFromTarget * math.tan( self.FIELD_OF_VIEW_IN_DEGREES/2.0 / 180.0 * math.pi )
         pixelsPerUnit = self.viewportRadiusInPixels / translationSpeedInUnitsPerRadius
 
-        right = direction ^ self.up
+        right = np.cross(direction, self.up)
 
         translation = right*(- delta_x_pixels / pixelsPerUnit) + self.up*(- delta_y_pixels / pixelsPerUnit)
 
         self.position = self.position + translation
         self.target = self.target + translation
+        self._invalidate_view()
 
     # This causes the camera to translate forward into the scene.
     # This is also called "dollying" or "tracking" in some software packages.
@@ -138,8 +240,8 @@ class Camera(object):
     # *with* the camera, i.e. it's "pushed" along with the camera; otherwise it remains stationary.
     def dollyCameraForward( self, delta_pixels, pushTarget ):
         direction = self.target - self.position
-        distanceFromTarget = direction.length()
-        direction = direction.normalized()
+        distanceFromTarget = np.linalg.norm(direction)
+        direction = normalized(direction)
 
         translationSpeed = distanceFromTarget * self.TRANSLATION_SPEED_FACTOR
         pixelsPerUnit = self.viewportRadiusInPixels / translationSpeed
@@ -151,6 +253,6 @@ class Camera(object):
             if distanceFromTarget < self.PUSH_THRESHOLD * self.nearPlane:
                 distanceFromTarget = self.PUSH_THRESHOLD * self.nearPlane
 
-        self.position += direction * dollyDistance
+        self.position = self.position + direction * dollyDistance
         self.target = self.position + direction * distanceFromTarget
-
+        self._invalidate_view()
@@ -0,0 +1,33 @@
+"""
+View frustum culling of axis aligned bounding boxes, vectorized over every box at once
+"""
+import numpy as np
+
+
+def get_frustum_planes(view_projection):
+    """(6, 4) planes as (nx, ny, nz, d), points inside the frustum have n.p + d >= 0"""
+    m = np.asarray(view_projection, dtype=np.float64)
+    return np.array([
+        m[3] + m[0],  # left
+        m[3] - m[0],  # right
+        m[3] + m[1],  # bottom
+        m[3] - m[1],  # top
+        m[3] + m[2],  # near
+        m[3] - m[2],  # far
+    ])
+
+
+def get_boxes_in_frustum(planes, box_mins, box_maxs):
+    """
+    (n,) bool mask of the boxes at least partially inside the frustum planes
+
+    conservative, boxes near frustum corners can be kept even when just outside
+    """
+    box_mins = np.asarray(box_mins, dtype=np.float64).reshape(-1, 3)
+    box_maxs = np.asarray(box_maxs, dtype=np.float64).reshape(-1, 3)
+    normals = planes[:, :3]
+
+    # the corner of each box furthest along each plane normal, (boxes, planes, 3)
+    positive_corners = np.where(normals[np.newaxis] >= 0, box_maxs[:, np.newaxis], box_mins[:, np.newaxis])
+    distances = np.einsum("bpk,pk->bp", positive_corners, normals) + planes[:, 3]
+    return np.all(distances >= 0, axis=1)
@@ -0,0 +1,36 @@
+"""
+Screen space picking, projects every candidate point in one vectorized step
+"""
+import numpy as np
+
+
+def project_points(view_projection, points, width, height):
+    """
+    (n, 2) widget pixel coordinates of (n, 3) world points, y pointing down,
+    and an (n,) mask of the points in front of the camera
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    clip_points = points @ view_projection[:3, :3].T + view_projection[:3, 3]
+    clip_w = points @ view_projection[3, :3] + view_projection[3, 3]
+
+    in_front = clip_w > 1e-6
+    safe_w = np.where(in_front, clip_w, 1.0)
+    ndc = clip_points[:, :2] / safe_w[:, np.newaxis]
+
+    screen_points = np.empty((len(points), 2))
+    screen_points[:, 0] = (ndc[:, 0] + 1.0) * 0.5 * width
+    screen_points[:, 1] = (1.0 - ndc[:, 1]) * 0.5 * height
+    return screen_points, in_front
+
+
+def get_nearest_point_index(screen_points, in_front, x, y, max_distance=10.0):
+    """index of the projected point closest to pixel x, y within max_distance, or -1"""
+    if not len(screen_points):
+        return -1
+
+    distances = np.hypot(screen_points[:, 0] - x, screen_points[:, 1] - y)
+    distances[~in_front] = np.inf
+    nearest_index = int(np.argmin(distances))
+    if distances[nearest_index] > max_distance:
+        return -1
+    return nearest_index
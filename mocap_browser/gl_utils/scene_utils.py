@@ -1,76 +1,107 @@
+import numpy as np
 from OpenGL import GL
+from OpenGL import contextdata
+
+AXIS_COLORS = np.array([
+    (1.0, 0.0, 0.0), (1.0, 0.0, 0.0),
+    (0.0, 1.0, 0.0), (0.0, 1.0, 0.0),
+    (0.0, 0.0, 1.0), (0.0, 0.0, 1.0),
+], dtype=np.float32)
+
+
+def draw_lines(points, color=None, colors=None, line_width=1.0):
+    """draw (n * 2, 3) line segment points as one vertex array, colors are optional per point"""
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    if not len(points):
+        return
+
+    GL.glLineWidth(line_width)
+    GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+    GL.glVertexPointer(3, GL.GL_FLOAT, 0, points)
+    if colors is not None:
+        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        GL.glColorPointer(3, GL.GL_FLOAT, 0, np.ascontiguousarray(colors, dtype=np.float32))
+    elif color is not None:
+        GL.glColor(*color)
+
+    GL.glDrawArrays(GL.GL_LINES, 0, len(points))
+
+    if colors is not None:
+        GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+    GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+
+
+def call_cached_geometry(name, key, build_func):
+    """
+    Draw static geometry from a display list of the current GL context
+
+    build_func(*key) issues the draw calls once, the list is only rebuilt when key changes
+    """
+    cache_name = f"mocap_browser.scene_utils.{name}"
+    cached = contextdata.getValue(cache_name)  # (key, display list)
+    if cached is None or cached[0] != key:
+        if cached is not None:
+            GL.glDeleteLists(cached[1], 1)
+
+        display_list = GL.glGenLists(1)
+        GL.glNewList(display_list, GL.GL_COMPILE)
+        build_func(*key)
+        GL.glEndList()
+
+        cached = (key, display_list)
+        contextdata.setValue(cache_name, cached)
+
+    GL.glCallList(cached[1])
+
+
+def get_axis_points(pos, size, centered=True):
+    """(6, 3) line points along X, Y and Z from pos, centered on it or starting at it"""
+    offsets = np.eye(3, dtype=np.float32) * size
+    start_points = np.asarray(pos, dtype=np.float32) - (offsets if centered else 0)
+    end_points = np.asarray(pos, dtype=np.float32) + offsets
+
+    points = np.empty((6, 3), dtype=np.float32)
+    points[0::2] = start_points
+    points[1::2] = end_points
+    return points
+
 
 def draw_locator(pos, size=10):
-    GL.glLineWidth(2.0)
-
-    # X
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(1.0, 0.0, 0.0)
-    GL.glVertex(pos[0]-size, pos[1], pos[2])
-    GL.glVertex(pos[0]+size, pos[1], pos[2])
-    GL.glEnd()
-
-    # Y
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(0.0, 1.0, 0.0)
-    GL.glVertex(pos[0], pos[1]-size, pos[2])
-    GL.glVertex(pos[0], pos[1]+size, pos[2])
-    GL.glEnd()
-
-    # Z
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(0.0, 0.0, 1.0)
-    GL.glVertex(pos[0], pos[1], pos[2]-size)
-    GL.glVertex(pos[0], pos[1], pos[2]+size)
-    GL.glEnd()
+    draw_lines(get_axis_points(pos, size), colors=AXIS_COLORS, line_width=2.0)
 
 
 def draw_line(start_pos, end_pos, color=(1.0, 1.0, 1.0)):
-    GL.glLineWidth(4.0)
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(*color)
-    GL.glVertex(start_pos[0], start_pos[1], start_pos[2])
-    GL.glVertex(end_pos[0], end_pos[1], end_pos[2])
-    GL.glEnd()
+    draw_lines((start_pos, end_pos), color=color, line_width=4.0)
+
+
+def get_origin_grid_points(grid_scale=50, grid_line_count=12):
+    """(lines * 2, 3) points of a grid on the XZ plane"""
+    steps = np.arange(-grid_line_count, grid_line_count + 1, dtype=np.float32) * grid_scale
+    extent = grid_line_count * grid_scale
+
+    points = np.zeros((len(steps), 4, 3), dtype=np.float32)
+    # lines along X
+    points[:, 0, 0] = extent
+    points[:, 1, 0] = -extent
+    points[:, 0:2, 2] = steps[:, np.newaxis]
+    # lines along Z
+    points[:, 2:4, 0] = steps[:, np.newaxis]
+    points[:, 2, 2] = extent
+    points[:, 3, 2] = -extent
+    return points.reshape(-1, 3)
+
+
+def _build_origin_grid(grid_scale, grid_line_count):
+    draw_lines(get_origin_grid_points(grid_scale, grid_line_count), color=(0.25, 0.25, 0.25), line_width=1.0)
 
 
 def draw_origin_grid(grid_scale=50, grid_line_count=12):
-    GL.glLineWidth(1.0)
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(0.25, 0.25, 0.25)
+    call_cached_geometry("origin_grid", (grid_scale, grid_line_count), _build_origin_grid)
 
-    for i in range(-grid_line_count, grid_line_count+1):
-        # lines along X
-        GL.glVertex3d(grid_line_count * grid_scale, 0, i * grid_scale)
-        GL.glVertex3d(-grid_line_count * grid_scale, 0, i * grid_scale)
 
-        # lines along Z
-        GL.glVertex3d(i * grid_scale, 0, grid_line_count * grid_scale)
-        GL.glVertex3d(i * grid_scale, 0, -grid_line_count * grid_scale)
-    
-    GL.glEnd()
+def _build_axis_helper(scale):
+    draw_lines(get_axis_points((0, 0, 0), scale, centered=False), colors=AXIS_COLORS, line_width=2.0)
 
 
 def draw_axis_helper(scale=10):
-    GL.glLineWidth(2.0)
-
-    # X
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(1.0, 0.0, 0.0)
-    GL.glVertex(0, 0, 0)
-    GL.glVertex(scale, 0, 0)
-    GL.glEnd()
-
-    # Y
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(0.0, 1.0, 0.0)
-    GL.glVertex(0, 0, 0)
-    GL.glVertex(0, scale, 0)
-    GL.glEnd()
-
-    # Z
-    GL.glBegin(GL.GL_LINES)
-    GL.glColor(0.0, 0.0, 1.0)
-    GL.glVertex(0, 0, 0)
-    GL.glVertex(0, 0, scale)
-    GL.glEnd()
+    call_cached_geometry("axis_helper", (scale,), _build_axis_helper)
@@ -1,3 +1,5 @@
+import os
+
 from . import mocap_browser_logger
 log = mocap_browser_logger.get_logger()
 
@@ -15,3 +17,19 @@ class MocapBrowserCoreInterface(object):
         ex: {"Import to Mocap Clipper": import_to_mocap_clipper}
         """
         return [{}]
+
+    def supports_process_pool_loading(self):
+        """can fbx files be loaded in separate python processes from this application"""
+        return True
+
+    def get_bake_cache_folder(self):
+        """where baked clips are cached between sessions, return None to disable the cache"""
+        return os.path.join(os.path.expanduser("~"), ".mocap_browser", "bake_cache")
+
+    def get_bake_cache_size_limit(self):
+        """in bytes, the least recently used clips are removed from the cache past this size"""
+        return 2 * 1024 ** 3
+
+    def get_folder_cache_folder(self):
+        """where the file listings of browsed folders are cached between sessions, return None to disable the cache"""
+        return os.path.join(os.path.expanduser("~"), ".mocap_browser", "folder_cache")
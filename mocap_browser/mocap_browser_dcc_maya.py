@@ -1,7 +1,9 @@
 from . import mocap_browser_dcc_core
 
 class MocapBrowserMaya(mocap_browser_dcc_core.MocapBrowserCoreInterface):
-    pass
+    def supports_process_pool_loading(self):
+        # multiprocessing would launch new maya.exe instances instead of python interpreters
+        return False
 
 
 
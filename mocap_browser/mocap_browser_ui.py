@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import subprocess
 import functools
@@ -7,10 +8,14 @@ from . import ui_utils
 from .ui_utils import QtCore, QtWidgets, QtGui, QtOpenGL
 from .resources import get_image_path
 from .mocap_browser_system import dcc
+from . import anim_source
+from .anim_data import JOINT_VISIBILITY_PRESETS, get_joint_names_matching
 
-# Requires PyOpenGL and the Python FBX SDK
+# Requires PyOpenGL, the Python FBX SDK is only needed for .fbx files
 from .qt_time_slider import TimeSliderWidget
 from .qt_file_tree import QtFileTree, FolderConfig
+from .folder_cache import FolderListingCache
+from .qt_viewport import PLAYBACK_SPEEDS
 from .fbx_viewport import FBXViewportWidget, ViewportSceneDescription
 
 standalone_app = None
@@ -32,12 +37,45 @@ class MocapBrowserViewportWidget(QtWidgets.QWidget):
         # time slider
         self.timeline = TimeSliderWidget(precision=0)
         self.timeline.setMaximumHeight(30)
-        self.main_layout.addWidget(self.timeline)
+
+        self.playback_speed_combo = QtWidgets.QComboBox()
+        self.playback_speed_combo.setToolTip("Playback speed")
+        for speed in PLAYBACK_SPEEDS:
+            self.playback_speed_combo.addItem(f"{speed:g}x", speed)
+        self.playback_speed_combo.setCurrentIndex(PLAYBACK_SPEEDS.index(1.0))
+        self.playback_speed_combo.currentIndexChanged.connect(self.set_playback_speed_index)
+
+        # onion skin ghosts and motion trails, 0 is off
+        self.ghost_count_spinbox = QtWidgets.QSpinBox()
+        self.ghost_count_spinbox.setRange(0, 20)
+        self.ghost_count_spinbox.setPrefix("Ghosts: ")
+        self.ghost_count_spinbox.setToolTip("Ghost poses on either side of the playhead")
+        self.ghost_count_spinbox.valueChanged.connect(self.fbx_viewport.set_ghost_count)
+
+        self.trail_window_spinbox = QtWidgets.QSpinBox()
+        self.trail_window_spinbox.setRange(0, 1000)
+        self.trail_window_spinbox.setSingleStep(10)
+        self.trail_window_spinbox.setPrefix("Trails: ")
+        self.trail_window_spinbox.setToolTip("Frames of joint motion trails on either side of the playhead")
+        self.trail_window_spinbox.valueChanged.connect(self.fbx_viewport.set_trail_window)
+
+        self.root_trajectory_checkbox = QtWidgets.QCheckBox("Trajectory")
+        self.root_trajectory_checkbox.setToolTip("Root path over the whole take, colored by speed")
+        self.root_trajectory_checkbox.toggled.connect(self.fbx_viewport.set_show_root_trajectory)
+
+        time_layout = QtWidgets.QHBoxLayout()
+        time_layout.addWidget(self.timeline)
+        time_layout.addWidget(self.root_trajectory_checkbox)
+        time_layout.addWidget(self.ghost_count_spinbox)
+        time_layout.addWidget(self.trail_window_spinbox)
+        time_layout.addWidget(self.playback_speed_combo)
+        self.main_layout.addLayout(time_layout)
         
         # connect signals
         self.timeline.value_changed.connect(self.fbx_viewport.set_frame)
         self.fbx_viewport.frame_changed.connect(self.timeline.set_value)
         self.fbx_viewport.scene_content_updated.connect(self.update_timeline_from_loaded_fbxs)
+        self.fbx_viewport.scene_content_added.connect(self.update_timeline_from_loaded_fbxs)
 
         # create hotkeys
         ui_utils.add_hotkey(self, "Left", lambda: self.fbx_viewport.increment_frame(-1))
@@ -47,9 +85,18 @@ class MocapBrowserViewportWidget(QtWidgets.QWidget):
         ui_utils.add_hotkey(self, "Home", self.fbx_viewport.go_to_start_frame)
         ui_utils.add_hotkey(self, "End", self.fbx_viewport.go_to_end_frame)
         ui_utils.add_hotkey(self, "Space", self.fbx_viewport.toggle_play)
+        ui_utils.add_hotkey(self, "[", lambda: self.step_playback_speed(-1))
+        ui_utils.add_hotkey(self, "]", lambda: self.step_playback_speed(1))
+
+    def set_playback_speed_index(self, index):
+        self.fbx_viewport.set_playback_speed(self.playback_speed_combo.itemData(index))
+
+    def step_playback_speed(self, step):
+        index = self.playback_speed_combo.currentIndex() + step
+        self.playback_speed_combo.setCurrentIndex(max(0, min(index, self.playback_speed_combo.count() - 1)))
 
-    def load_fbx_files(self, fbx_paths=None):
-        self.fbx_viewport.load_fbx_files(fbx_paths)
+    def load_fbx_files(self, fbx_paths=None, use_process_pool=False):
+        self.fbx_viewport.load_fbx_files(fbx_paths, use_process_pool=use_process_pool)
 
     def update_timeline_from_loaded_fbxs(self, _):
         self.timeline.set_minimum(self.fbx_viewport.start_frame)
@@ -73,32 +120,82 @@ class MocapSkeletonTree(QtWidgets.QWidget):
         self.tree_widget.setHeaderHidden(True)
         self.tree_widget.itemClicked.connect(self.tree_item_check_changed)
 
+        # {file_path: {joint_name: QTreeWidgetItem}}
+        self.joint_items = {}
+
+        # pattern based visibility
+        self.visibility_preset_combo = QtWidgets.QComboBox()
+        self.visibility_preset_combo.addItem("Visibility Presets...")
+        self.visibility_preset_combo.addItems(list(JOINT_VISIBILITY_PRESETS.keys()))
+        self.visibility_preset_combo.activated.connect(self.apply_visibility_preset_index)
+
+        self.joint_pattern_line_edit = QtWidgets.QLineEdit()
+        self.joint_pattern_line_edit.setFocusPolicy(QtCore.Qt.ClickFocus)
+        self.joint_pattern_line_edit.setPlaceholderText("Joint pattern, e.g. *Finger*")
+
+        self.show_pattern_button = QtWidgets.QPushButton("Show")
+        self.show_pattern_button.clicked.connect(lambda: self.set_pattern_visibility(True))
+        self.hide_pattern_button = QtWidgets.QPushButton("Hide")
+        self.hide_pattern_button.clicked.connect(lambda: self.set_pattern_visibility(False))
+
+        pattern_layout = QtWidgets.QHBoxLayout()
+        pattern_layout.addWidget(self.joint_pattern_line_edit)
+        pattern_layout.addWidget(self.show_pattern_button)
+        pattern_layout.addWidget(self.hide_pattern_button)
+
+        self.main_layout.addWidget(self.visibility_preset_combo)
+        self.main_layout.addLayout(pattern_layout)
+        self.picked_joint_label = QtWidgets.QLabel()
+        self.picked_joint_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+
         self.main_layout.addWidget(self.tree_widget)
+        self.main_layout.addWidget(self.picked_joint_label)
         self.main_layout.setContentsMargins(2, 2, 2, 2)
 
         self.setLayout(self.main_layout)
     
     def populate_skeleton_tree(self, viewport_scene):
+        """replace the tree with the clips in viewport_scene"""
+        self.tree_widget.clear()
+        self.joint_items.clear()
+        self.picked_joint_label.clear()
+        self.add_to_skeleton_tree(viewport_scene)
+
+    def add_to_skeleton_tree(self, viewport_scene):
+        """add the clips in viewport_scene, the items already in the tree and the picked joint are left alone"""
         if 0:
             viewport_scene = ViewportSceneDescription()
-        
-        self.tree_widget.clear()
+
         for fbx_file, scene_data in viewport_scene.transform_hierarchy.items():
+            joint_visibility = viewport_scene.joint_visibility.get(fbx_file)
+            if joint_visibility is None or len(joint_visibility) != scene_data.joint_count:
+                joint_visibility = [True] * scene_data.joint_count
+
             root_widget = QtWidgets.QTreeWidgetItem(self.tree_widget.invisibleRootItem())
             root_widget.setText(0, os.path.basename(fbx_file))
             root_widget.setText(1, fbx_file)
-            root_widget.setCheckState(0, QtCore.Qt.CheckState.Checked)
-
-            node_widgets = {}
-            for child_name, parent_name in scene_data.items():
-                parent_widget = node_widgets.get(parent_name, root_widget)
+            if all(joint_visibility):
+                root_widget.setCheckState(0, QtCore.Qt.CheckState.Checked)
+            elif any(joint_visibility):
+                root_widget.setCheckState(0, QtCore.Qt.CheckState.PartiallyChecked)
+            else:
+                root_widget.setCheckState(0, QtCore.Qt.CheckState.Unchecked)
+
+            # joints are ordered parents first, so the parent widget always exists already
+            node_widgets = []
+            self.joint_items[fbx_file] = {}
+            for joint_name, parent_index, visible in zip(
+                scene_data.joint_names, scene_data.parent_indices, joint_visibility
+            ):
+                parent_widget = node_widgets[parent_index] if parent_index >= 0 else root_widget
                 widget_item = QtWidgets.QTreeWidgetItem(parent_widget)
-                widget_item.setText(0, child_name)
+                widget_item.setText(0, joint_name)
                 widget_item.setText(1, fbx_file)
-                widget_item.setCheckState(0, QtCore.Qt.CheckState.Checked)
-                node_widgets[child_name] = widget_item
+                widget_item.setCheckState(0, QtCore.Qt.CheckState.Checked if visible else QtCore.Qt.CheckState.Unchecked)
+                node_widgets.append(widget_item)
+                self.joint_items[fbx_file][joint_name] = widget_item
 
-        if len(viewport_scene.transform_hierarchy.keys()) == 1:
+        if self.tree_widget.topLevelItemCount() == 1:
             self.tree_widget.expandAll()
 
     def tree_item_check_changed(self, widget):
@@ -110,6 +207,42 @@ class MocapSkeletonTree(QtWidgets.QWidget):
         node_names = ui_utils.recursive_set_checkstate(widget, state)
         self.set_node_visibility.emit(fbx_path, node_names, state is QtCore.Qt.CheckState.Checked)
 
+    def select_joint(self, fbx_path, joint_name, position):
+        widget_item = self.joint_items.get(fbx_path, {}).get(joint_name)
+        if widget_item is None:
+            return
+
+        self.tree_widget.setCurrentItem(widget_item)
+        self.tree_widget.scrollToItem(widget_item)
+        self.picked_joint_label.setText("{}  ({:.2f}, {:.2f}, {:.2f})".format(joint_name, *position))
+
+    def apply_visibility_preset_index(self, index):
+        preset_name = self.visibility_preset_combo.itemText(index)
+        if preset_name in JOINT_VISIBILITY_PRESETS:
+            pattern, visible = JOINT_VISIBILITY_PRESETS[preset_name]
+            self.set_joint_pattern_visibility(pattern, visible)
+        self.visibility_preset_combo.setCurrentIndex(0)
+
+    def set_pattern_visibility(self, state):
+        pattern = self.joint_pattern_line_edit.text()
+        if not pattern:
+            return
+        try:
+            self.set_joint_pattern_visibility(pattern, state)
+        except re.error as e:
+            QtWidgets.QMessageBox.warning(self, "Invalid Pattern", f"{pattern}\n{e}")
+
+    def set_joint_pattern_visibility(self, pattern, state):
+        """check or uncheck every joint matching pattern, only the matching joints are sent to the viewport"""
+        check_state = QtCore.Qt.CheckState.Checked if state else QtCore.Qt.CheckState.Unchecked
+        for fbx_file, file_joint_items in self.joint_items.items():
+            joint_names = get_joint_names_matching(file_joint_items.keys(), pattern)
+            for joint_name in joint_names:
+                file_joint_items[joint_name].setCheckState(0, check_state)
+
+            if joint_names:
+                self.set_node_visibility.emit(fbx_file, joint_names, state)
+
 
 class FBXFolderConfig(FolderConfig):
     def __init__(self, *args, **kwargs):
@@ -142,6 +275,9 @@ class MocapFileTree(QtWidgets.QWidget):
 
         # tree config
         self.tree_view.default_folder_config_cls = FBXFolderConfig
+        folder_cache_folder = dcc.get_folder_cache_folder()
+        if folder_cache_folder:
+            self.tree_view.listing_cache = FolderListingCache(folder_cache_folder)
         self.tree_view.file_double_clicked.connect(self.file_double_clicked)
 
         self.main_layout = QtWidgets.QVBoxLayout()
@@ -178,7 +314,7 @@ class MocapFileTree(QtWidgets.QWidget):
         return self.folder_path.text()
 
     def _set_folder(self, folder_path):
-        self.tree_view.set_folder(folder_path, file_exts=[".fbx"])
+        self.tree_view.set_folder(folder_path, file_exts=anim_source.get_supported_extensions())
         self.folder_path.setText(folder_path)
 
 
@@ -205,7 +341,9 @@ class MocapBrowserWindow(ui_utils.ToolWindow):
         self.file_tree.file_double_clicked.connect(self.viewport.load_fbx_files)
         self.file_tree.tree_view.customContextMenuRequested.connect(self.context_menu)
         self.viewport.fbx_viewport.scene_content_updated.connect(self.skeleton_tree.populate_skeleton_tree)
+        self.viewport.fbx_viewport.scene_content_added.connect(self.skeleton_tree.add_to_skeleton_tree)
         self.skeleton_tree.set_node_visibility.connect(self.viewport.fbx_viewport.set_node_visibility)
+        self.viewport.fbx_viewport.joint_picked.connect(self.skeleton_tree.select_joint)
 
         main_layout.addWidget(main_splitter)
         self.setCentralWidget(main_widget)
@@ -231,7 +369,7 @@ class MocapBrowserWindow(ui_utils.ToolWindow):
         return ui_utils.build_menu_from_action_list(self.context_menu_actions)
 
     def load_all_selected(self):
-        self.viewport.load_fbx_files(self.file_tree.get_selected_paths())
+        self.viewport.load_fbx_files(self.file_tree.get_selected_paths(), use_process_pool=True)
 
     def _trigger_right_click_action(self, func):
         return func(self.file_tree.get_selected_paths())
@@ -1,22 +1,54 @@
 import os
+import re
 import sys
+import time
+import array
+import functools
 import traceback
 
+# Requires numpy
+import numpy as np
+
 # Icons
 from . import resources
 from .ui_utils import create_qicon
+from .file_crawler import CrawlStats, is_network_path
+from .folder_cache import FolderListing
+from . import mocap_browser_logger
+
+from .ui_utils import QtCore, QtWidgets
 
-from .ui_utils import QtCore, QtGui, QtWidgets
+log = mocap_browser_logger.get_logger()
 
 # quicker access to properties
 _qt = QtCore.Qt
 
+# found files are sent to the UI thread in batches of this many files, or this often, whichever comes first
+FILE_BATCH_SIZE = 1000
+FILE_BATCH_INTERVAL = 0.1
+
+# rows a folder reveals per fetchMore
+FETCH_BATCH_SIZE = 1000
+# removed nodes are dropped from the model's arrays once there are at least this many, and more than live ones
+COMPACT_MIN_REMOVED_NODES = 10000
+
+# FileTreeModel data role telling folders from files without building a PathData
+FILE_TREE_IS_FOLDER_ROLE = QtCore.Qt.UserRole + 1
+
+# watched directory changes are collected for this long before the changed directories are listed again
+WATCH_COALESCE_INTERVAL_MS = 500
+# folders on network shares, or that can't be watched, are checked for changes this often instead
+WATCH_POLL_INTERVAL_MS = 10000
+
 
 class FolderConfig(object):
     def __init__(self, root_folder):
         self.dir_path = root_folder
         self.top_folder_name = os.path.basename(root_folder)
         self.file_extensions = [] # if left blank, will show all
+        self.listing_cache = None  # type: FolderListingCache
+        self.folder_listing = None  # type: FolderListing # what's on disk as of the last crawl, kept for live updates
+        self.on_network_share = False  # set when crawling, network shares don't report changes to the watcher
 
         # icons
         self.file_icon = create_qicon(resources.get_image_path("unknown_icon"))
@@ -33,18 +65,56 @@ class FolderConfig(object):
         # print(file_path)
         pass
     
-    def add_files_to_model(self, on_file_found):
+    def is_file_shown(self, file_path):
+        return not self.file_extensions or os.path.splitext(file_path)[-1] in self.file_extensions
+
+    def add_files_to_model(self, on_file_found, on_files_removed=None):
         if not os.path.exists(self.dir_path):
             print(f"path not found: {self.dir_path}")
             return
-        
-        for dir_path, _, file_names in os.walk(self.dir_path):
-            for file_name in file_names:
-                if self.file_extensions:
-                    if os.path.splitext(file_name)[-1] not in self.file_extensions:
-                        continue
-                file_path = os.path.join(dir_path, file_name)
-                on_file_found.emit(file_path, self)
+
+        self.on_network_share = is_network_path(self.dir_path)
+
+        if self.listing_cache:
+            # show the folder as it was last crawled right away, then only list the directories that changed since
+            self.folder_listing = self.listing_cache.load(self.dir_path, self.file_extensions)
+            for file_path in self.folder_listing.iter_file_paths():
+                if self.is_file_shown(file_path):
+                    on_file_found.emit(file_path, self)
+            on_file_found.flush()
+        else:
+            self.folder_listing = FolderListing(self.dir_path, stat_files=False, file_extensions=self.file_extensions)
+
+        crawl_stats = CrawlStats()
+        self._emit_listing_changes(self.folder_listing.iter_changes(stats=crawl_stats), on_file_found, on_files_removed)
+        log.info(f"Crawled {self.dir_path}: {crawl_stats}")
+
+    def update_files_in_model(self, dir_paths, on_file_found, on_files_removed=None):
+        """list dir_paths again and send what changed, None checks every directory of the folder for changes"""
+        if self.folder_listing is None:
+            return
+
+        if dir_paths is None:
+            listing_changes = self.folder_listing.iter_changes()
+        else:
+            listing_changes = self.folder_listing.iter_dir_changes(dir_paths)
+        self._emit_listing_changes(listing_changes, on_file_found, on_files_removed)
+
+    def _emit_listing_changes(self, listing_changes, on_file_found, on_files_removed=None):
+        """send the (added paths, removed paths) of a FolderListing update and save the listing once it's up to date"""
+        for added_paths, removed_paths in listing_changes:
+            for file_path in added_paths:
+                if self.is_file_shown(file_path):
+                    on_file_found.emit(file_path, self)
+
+            removed_paths = [file_path for file_path in removed_paths if self.is_file_shown(file_path)]
+            if removed_paths and on_files_removed:
+                # files found so far go first, so a file that's added and removed again ends up removed
+                on_file_found.flush()
+                on_files_removed.emit(removed_paths, self)
+
+        if self.listing_cache and self.folder_listing.stat_files:
+            self.listing_cache.save(self.folder_listing)
 
 
 class PerforceFolderConfig(FolderConfig):
@@ -54,7 +124,7 @@ class PerforceFolderConfig(FolderConfig):
         self.file_icon = create_qicon(resources.get_image_path("p4_icon"))
         self.folder_icon = create_qicon(resources.get_image_path("p4_folder_icon"))
 
-    def add_files_to_model(self, on_file_found):
+    def add_files_to_model(self, on_file_found, on_files_removed=None):
         import p4cmd
         client = p4cmd.P4Client(self.dir_path)
         for p4file in client.folder_to_p4files(self.dir_path): # type: p4cmd.P4File
@@ -74,10 +144,50 @@ class PerforceFolderConfig(FolderConfig):
 
 # QThread setup yoinked from https://www.pythonguis.com/tutorials/multithreading-pyside-applications-qthreadpool/
 
+class FileConfigCancelledError(Exception):
+    pass
+
+
 class FileConfigWorkerSignals(QtCore.QObject):
     finished = QtCore.Signal()
     error = QtCore.Signal(tuple)
-    file_found = QtCore.Signal(str, FolderConfig)
+    files_found = QtCore.Signal(list, FolderConfig)
+    files_removed = QtCore.Signal(list, FolderConfig)
+
+
+class FileBatcher(object):
+    """
+    Stands in for a file found signal, collects paths and emits them as lists
+    so the UI thread gets one queued call per batch instead of one per file
+    """
+
+    def __init__(self, files_found_signal, batch_size=FILE_BATCH_SIZE, batch_interval=FILE_BATCH_INTERVAL):
+        self.files_found_signal = files_found_signal
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._file_paths = []
+        self._folder_config = None
+        self._last_emit_time = time.perf_counter()
+        self.cancelled = False
+
+    def emit(self, file_path, folder_config):
+        # raising stops the crawl, the crawler cancels the directories it hasn't listed yet
+        if self.cancelled:
+            raise FileConfigCancelledError()
+
+        if folder_config is not self._folder_config:
+            self.flush()
+            self._folder_config = folder_config
+
+        self._file_paths.append(file_path)
+        if len(self._file_paths) >= self.batch_size or time.perf_counter() - self._last_emit_time >= self.batch_interval:
+            self.flush()
+
+    def flush(self):
+        if self._file_paths and not self.cancelled:
+            self.files_found_signal.emit(self._file_paths, self._folder_config)
+            self._file_paths = []
+        self._last_emit_time = time.perf_counter()
 
 
 class FileConfigWorker(QtCore.QRunnable):
@@ -89,18 +199,26 @@ class FileConfigWorker(QtCore.QRunnable):
         self.kwargs = kwargs
         self.signals = FileConfigWorkerSignals()
 
-        # Add the callback to our kwargs
-        self.kwargs['on_file_found'] = self.signals.file_found
+        # Add the callback to our kwargs, found files are batched before they're sent to the UI thread
+        self.file_batcher = FileBatcher(self.signals.files_found)
+        self.kwargs['on_file_found'] = self.file_batcher
+        self.kwargs['on_files_removed'] = self.signals.files_removed
+
+    def cancel(self):
+        self.file_batcher.cancelled = True
 
     @QtCore.Slot()
     def run(self):
         try:
             self.fn(*self.args, **self.kwargs)
+        except FileConfigCancelledError:
+            pass
         except:
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
             self.signals.error.emit((exctype, value, traceback.format_exc()))
         finally:
+            self.file_batcher.flush()
             self.signals.finished.emit()
 
 
@@ -115,14 +233,17 @@ class QtFileTree(QtWidgets.QTreeView):
         self.default_folder_config_cls = FolderConfig
 
         self.default_expand_depth = None
-        self.header_labels = ["Name"]
 
-        self.model = QtGui.QStandardItemModel()
+        # FolderListingCache given to folder configs that don't have one, None crawls every folder from scratch
+        self.listing_cache = None
+
+        # keep the tree up to date with files added, removed or renamed on disk
+        self.watch_folders = True
+
+        self.model = FileTreeModel(self)
         self.proxy = FileTreeSortProxyModel(self.model)
         self.setModel(self.proxy)
         self.setSortingEnabled(True)
-        self._model_folders = {}
-        self.model.setHorizontalHeaderLabels(self.header_labels)
 
         self.header().setSortIndicator(0, QtCore.Qt.SortOrder.AscendingOrder)
         self.setSelectionMode(QtWidgets.QListView.ExtendedSelection)
@@ -136,6 +257,28 @@ class QtFileTree(QtWidgets.QTreeView):
 
         # populate ui with threads
         self.threadpool = QtCore.QThreadPool()
+
+        # live updates, QFileSystemWatcher uses inotify on linux.
+        # only the root folders and the expanded folders are watched, each watched directory holds a handle open.
+        # network shares don't report changes made by other machines, those are polled on a worker instead.
+        # changes are collected per folder config and applied in one background update per coalesce interval
+        self.file_watcher = QtCore.QFileSystemWatcher(self)
+        self.file_watcher.directoryChanged.connect(self._on_directory_changed)
+        self.expanded.connect(self._on_folder_expanded)
+        self.collapsed.connect(self._on_folder_collapsed)
+        self._folder_configs = []  # type: list[FolderConfig]
+        self._watched_dir_configs = {}  # {dir path: FolderConfig}
+        self._polled_configs = []  # configs on network shares or with directories the watcher couldn't add
+        self._changed_dir_paths = {}  # {FolderConfig: changed dir paths}
+        self._updating_configs = []  # configs with an update worker running
+        self._workers = []  # type: list[FileConfigWorker] # running workers, cancelled when the tree is reset
+
+        self._change_timer = QtCore.QTimer(self)
+        self._change_timer.setSingleShot(True)
+        self._change_timer.timeout.connect(self._start_folder_updates)
+
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.timeout.connect(self._poll_folders)
     
     def set_folder(self, folder_path, file_exts=None, show_root_folder=False):
         """If you only need one root folder, call this function"""
@@ -154,11 +297,156 @@ class QtFileTree(QtWidgets.QTreeView):
         if 0:
             folder_config = FolderConfig()
 
+        if folder_config.listing_cache is None:
+            folder_config.listing_cache = self.listing_cache
+        self._folder_configs.append(folder_config)
+
         worker = FileConfigWorker(folder_config.add_files_to_model)
-        worker.signals.file_found.connect(self._add_path_to_model)
+        worker.signals.files_found.connect(self._add_paths_to_model)
+        worker.signals.files_removed.connect(self._remove_paths_from_model)
         worker.signals.finished.connect(self._expand_to_default_depth)
+        worker.signals.finished.connect(functools.partial(self._watch_folder_config, folder_config))
+        self._start_worker(worker)
+
+    def _start_worker(self, worker):
+        if 0:
+            worker = FileConfigWorker()
+
+        self._workers.append(worker)
+        worker.signals.finished.connect(functools.partial(self._on_worker_finished, worker))
         self.threadpool.start(worker)
 
+    def _on_worker_finished(self, worker):
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+    def _watch_folder_config(self, folder_config):
+        """watch the root and the expanded folders of a crawled folder config, network shares are polled"""
+        if not self.watch_folders or folder_config.folder_listing is None:
+            return
+        if folder_config not in self._folder_configs:
+            return  # the tree was reset while it was crawling
+
+        if folder_config.on_network_share:
+            log.info(f"{folder_config.dir_path} is on a network share, polling it for changes")
+            self._poll_folder_config(folder_config)
+            return
+
+        # folders expanded while it was crawling, or by default_expand_depth
+        dir_paths = [folder_config.dir_path]
+        for node in self.model.get_fetched_folder_nodes(folder_config):
+            if self.isExpanded(self.proxy.mapFromSource(self.model.get_node_index(node))):
+                dir_paths.append(self.model.get_full_path(node))
+        self._watch_dir_paths(dir_paths, folder_config)
+
+    def _watch_dir_paths(self, dir_paths, folder_config):
+        """returns the dir_paths that weren't watched before"""
+        new_dir_paths = [dir_path for dir_path in dir_paths if dir_path not in self._watched_dir_configs]
+        if not new_dir_paths:
+            return []
+
+        failed_dir_paths = set(self.file_watcher.addPaths(new_dir_paths))
+        for dir_path in new_dir_paths:
+            if dir_path not in failed_dir_paths:
+                self._watched_dir_configs[dir_path] = folder_config
+
+        if failed_dir_paths and folder_config not in self._polled_configs:
+            log.info(f"Couldn't watch {len(failed_dir_paths)} directories, polling {folder_config.dir_path} for changes")
+            self._poll_folder_config(folder_config)
+        return [dir_path for dir_path in new_dir_paths if dir_path not in failed_dir_paths]
+
+    def _unwatch_removed_dirs(self, folder_config):
+        """stop watching the directories of folder_config that are gone from its listing"""
+        listing_dirs = folder_config.folder_listing.dirs
+        removed_dir_paths = [
+            dir_path for dir_path, watched_config in self._watched_dir_configs.items()
+            if watched_config is folder_config and dir_path not in listing_dirs
+        ]
+        for dir_path in removed_dir_paths:
+            del self._watched_dir_configs[dir_path]
+        if removed_dir_paths:
+            self.file_watcher.removePaths(removed_dir_paths)
+
+    def _poll_folder_config(self, folder_config):
+        if folder_config not in self._polled_configs:
+            self._polled_configs.append(folder_config)
+        if not self._poll_timer.isActive():
+            self._poll_timer.start(WATCH_POLL_INTERVAL_MS)
+
+    def _get_watchable_folder(self, index):
+        """(FolderConfig, dir path) of an expanded or collapsed proxy index, (None, None) when it isn't watched"""
+        node = self.model.get_node(self.proxy.mapToSource(index))
+        if not self.watch_folders or node == 0 or not self.model.is_folder(node):
+            return None, None
+
+        # configs still crawling watch their expanded folders once the crawl is done
+        folder_config = self.model.get_folder_config(node)
+        if folder_config not in self._folder_configs or folder_config.folder_listing is None:
+            return None, None
+        if folder_config in self._polled_configs:
+            return None, None
+        return folder_config, self.model.get_full_path(node)
+
+    def _on_folder_expanded(self, index):
+        folder_config, dir_path = self._get_watchable_folder(index)
+        if folder_config is None:
+            return
+
+        # changes made while the folder was collapsed weren't seen, list it again once
+        for new_dir_path in self._watch_dir_paths([dir_path], folder_config):
+            self._add_changed_dir_path(folder_config, new_dir_path)
+
+    def _on_folder_collapsed(self, index):
+        folder_config, dir_path = self._get_watchable_folder(index)
+        if folder_config is None or dir_path == folder_config.dir_path:
+            return
+
+        if self._watched_dir_configs.pop(dir_path, None) is not None:
+            self.file_watcher.removePath(dir_path)
+
+    def _on_directory_changed(self, dir_path):
+        folder_config = self._watched_dir_configs.get(dir_path)
+        if folder_config is None:
+            return
+        self._add_changed_dir_path(folder_config, dir_path)
+
+    def _add_changed_dir_path(self, folder_config, dir_path):
+        self._changed_dir_paths.setdefault(folder_config, set()).add(dir_path)
+        # not restarted on every change, so a steady stream of new files still shows up every interval
+        if not self._change_timer.isActive():
+            self._change_timer.start(WATCH_COALESCE_INTERVAL_MS)
+
+    def _poll_folders(self):
+        for folder_config in self._polled_configs:
+            if folder_config not in self._updating_configs:
+                self._start_folder_update(folder_config, None)
+
+    def _start_folder_updates(self):
+        for folder_config in list(self._changed_dir_paths.keys()):
+            # picked up again when the running update finishes
+            if folder_config in self._updating_configs:
+                continue
+            self._start_folder_update(folder_config, list(self._changed_dir_paths.pop(folder_config)))
+
+    def _start_folder_update(self, folder_config, dir_paths):
+        """list dir_paths of folder_config again in the background, None checks the whole folder"""
+        self._updating_configs.append(folder_config)
+
+        worker = FileConfigWorker(folder_config.update_files_in_model, dir_paths)
+        worker.signals.files_found.connect(self._add_paths_to_model)
+        worker.signals.files_removed.connect(self._remove_paths_from_model)
+        worker.signals.finished.connect(functools.partial(self._on_folder_update_finished, folder_config))
+        self._start_worker(worker)
+
+    def _on_folder_update_finished(self, folder_config):
+        if folder_config not in self._folder_configs:
+            return  # the tree was reset while it was updating
+        self._updating_configs.remove(folder_config)
+        self._unwatch_removed_dirs(folder_config)
+
+        if self._changed_dir_paths and not self._change_timer.isActive():
+            self._change_timer.start(WATCH_COALESCE_INTERVAL_MS)
+
     def _expand_to_default_depth(self):
         if self.default_expand_depth is not None:
             self.expandToDepth(self.default_expand_depth)
@@ -166,111 +454,604 @@ class QtFileTree(QtWidgets.QTreeView):
     def get_selected_file_paths(self):
         file_paths = []
         for index in self.selectedIndexes():
-            model_index = self.proxy.mapToSource(index)
-            tree_item = self.proxy.sourceModel().itemFromIndex(model_index)  # type: FileTreeModelItem
-            if isinstance(tree_item, FileTreeModelItem):
-                file_paths.append(tree_item.file_path)
+            file_path = self.model.get_file_path(self.proxy.mapToSource(index))
+            if file_path:
+                file_paths.append(file_path)
         return file_paths
 
     def _reset_tree(self):
+        # results still queued from these workers are dropped, their folder configs are gone
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+        self._change_timer.stop()
+        self._poll_timer.stop()
+        watched_dir_paths = self.file_watcher.directories()
+        if watched_dir_paths:
+            self.file_watcher.removePaths(watched_dir_paths)
+        self._folder_configs = []
+        self._watched_dir_configs = {}
+        self._polled_configs = []
+        self._changed_dir_paths = {}
+        self._updating_configs = []
+
         self.model.clear()
-        self.model.setHorizontalHeaderLabels(self.header_labels)
-        self._model_folders = {}
 
-    def _add_path_to_model(self, file_path, folder_config):
-        if 0:
-            folder_config = FolderConfig()
+    def _add_paths_to_model(self, file_paths, folder_config):
+        if folder_config not in self._folder_configs:
+            return  # queued before the tree was reset
+        self.model.add_paths(file_paths, folder_config)
+
+    def _remove_paths_from_model(self, file_paths, folder_config):
+        if folder_config not in self._folder_configs:
+            return
+        self.model.remove_paths(file_paths, folder_config)
+
+    def _trigger_double_clicked(self, index):
+        model_index = self.proxy.mapToSource(index)
+        file_path = self.model.get_file_path(model_index)
+
+        if file_path:
+            folder_config = self.model.get_folder_config(self.model.get_node(model_index)) # type: FolderConfig
+            folder_config.file_double_clicked(file_path)
+            self.file_double_clicked.emit(file_path)
+
+    def set_filter(self, text=None):
+        self.proxy.set_filter_text(text)
+        if not text:
+            if self.default_expand_depth is None:
+                self.collapseAll()
+            else:
+                self.expandToDepth(self.default_expand_depth)
+        else:
+            self.expandAll()
+
+
+class FileTreeModel(QtCore.QAbstractItemModel):
+    """
+    Lazy file tree model backed by flat arrays instead of one Python item per row
+
+    every file and folder is a node index into the arrays, node 0 is the invisible root.
+    names are stored utf-8 encoded in one shared buffer, folder names are interned since they repeat a lot.
+    a folder's children only become rows once the view expands it (canFetchMore/fetchMore)
+    """
+
+    # after every add_paths and remove_paths, including files in folders that aren't rows yet
+    nodes_added = QtCore.Signal()
+    nodes_removed = QtCore.Signal(list)  # folder nodes that lost children
+    # the arrays were compacted, sent with the old node of every new node, before the layout change is finished
+    nodes_renumbered = QtCore.Signal(object)
 
+    def __init__(self, parent=None):
+        super(FileTreeModel, self).__init__(parent)
+        self.header_labels = ["Name"]
+        self.clear()
+
+    def clear(self):
+        self.beginResetModel()
+
+        self.folder_configs = []  # type: list[FolderConfig]
+
+        self._name_buffer = bytearray()
+        # name of segment i is buffer[offsets[i]:offsets[i + 1] - 1], every name ends in a newline
+        self._name_offsets = array.array("Q", [0])
+        self._folder_segment_ids = {}  # {folder name: segment id}
+
+        # per node arrays
+        self._parents = array.array("i", [-1])
+        self._name_ids = array.array("i", [self._add_segment("")])
+        self._rows = array.array("i", [0])  # row of the node under its parent
+        self._is_folder = array.array("b", [1])
+        self._config_ids = array.array("H", [0])
+        self._fetched_counts = array.array("i", [0])  # children exposed as rows so far
+
+        self._children = {0: array.array("i")}  # {folder node: child nodes}
+        self._folder_nodes = {}  # {normcased display path: folder node}
+        self._removed_nodes = set()  # unreachable until the next compaction
+
+        # relative path of every node for the filter, one per line like the names.
+        # only built once the tree is filtered, and after that only for nodes added since
+        self._path_buffer = bytearray()
+        self._path_offsets = array.array("q", [0])
+        self._folder_paths = {}  # {folder node: encoded relative path}
+
+        self.endResetModel()
+
+    # --- building
+
+    def _add_segment(self, name):
+        encoded_name = name.encode("utf-8")
+        self._name_buffer.extend(encoded_name)
+        self._name_buffer.extend(b"\n")
+        self._name_offsets.append(len(self._name_buffer))
+        return len(self._name_offsets) - 2
+
+    def _add_node(self, parent_node, name, is_folder, config_id):
+        if is_folder:
+            segment_id = self._folder_segment_ids.get(name)
+            if segment_id is None:
+                segment_id = self._add_segment(name)
+                self._folder_segment_ids[name] = segment_id
+        else:
+            segment_id = self._add_segment(name)
+
+        node = len(self._parents)
+        siblings = self._children[parent_node]
+        self._parents.append(parent_node)
+        self._name_ids.append(segment_id)
+        self._rows.append(len(siblings))
+        self._is_folder.append(1 if is_folder else 0)
+        self._config_ids.append(config_id)
+        self._fetched_counts.append(0)
+        siblings.append(node)
+        if is_folder:
+            self._children[node] = array.array("i")
+        return node
+
+    def _get_config_id(self, folder_config):
+        for config_id, existing_config in enumerate(self.folder_configs):
+            if existing_config is folder_config:
+                return config_id
+        self.folder_configs.append(folder_config)
+        return len(self.folder_configs) - 1
+
+    def _get_display_folder_names(self, dir_path, folder_config):
+        """folder names from the root of the tree down to the folder dir_path is displayed as"""
         root_dir_path = folder_config.dir_path
         top_folder_name = folder_config.top_folder_name
 
         # display path in tree view
-        file_rel_path = os.path.relpath(file_path, root_dir_path)
-        dir_rel_path = os.path.relpath(os.path.dirname(file_path), root_dir_path)
-        display_dir_rel_path = dir_rel_path
+        display_dir_rel_path = os.path.relpath(dir_path, root_dir_path)
         if top_folder_name:
             display_dir_rel_path = "{}\\{}".format(top_folder_name, display_dir_rel_path)
 
-        parent_item = self.model
+        return re.split(r"[\\/]", display_dir_rel_path)
+
+    def _find_folder_node(self, dir_path, folder_config):
+        """node of the folder dir_path is displayed under, None if there isn't one"""
+        folder_names = [token for token in self._get_display_folder_names(dir_path, folder_config) if token not in [".", ""]]
+        if not folder_names:
+            return 0
+        return self._folder_nodes.get(os.path.normcase("\\".join(folder_names)))
 
-        # build needed folders
-        folder_rel_split = display_dir_rel_path.split("\\")
+    def _get_folder_node(self, dir_path, folder_config, config_id):
+        """node of the folder dir_path is displayed under, creating any missing folder nodes"""
+        parent_node = 0
+        folder_rel_split = self._get_display_folder_names(dir_path, folder_config)
         for i, token in enumerate(folder_rel_split):
             if token in [".", ""]:
                 continue
 
-            # combine together the token into a relative_path
-            token_rel_display_path = "\\".join(folder_rel_split[:i + 1])
-            token_rel_real_path = "\\".join(folder_rel_split[1:i + 1]) if top_folder_name else token_rel_display_path
-            token_rel_real_path = token_rel_display_path
-            token_full_path = os.path.join(root_dir_path, token_rel_real_path)
-
-            # an Item for this folder has already been created
-            case_insensitive_folder = token_rel_display_path.lower()
-            existing_folder_item = self._model_folders.get(case_insensitive_folder)
-            if existing_folder_item is not None:
-                parent_item = existing_folder_item
+            # a node for this folder has already been created
+            folder_key = os.path.normcase("\\".join(folder_rel_split[:i + 1]))
+            existing_folder_node = self._folder_nodes.get(folder_key)
+            if existing_folder_node is not None:
+                parent_node = existing_folder_node
             else:
-                new_folder_item = QtGui.QStandardItem(str(token))
-
-                # set special icon if this is the root folder
-                # new_folder_item.setIcon(self._root_folder_icon) if i == 0 else new_folder_item.setIcon(self._folder_icon)
-                new_folder_item.setIcon(folder_config.get_folder_icon(token_full_path))
-
-                # mark as folder for sorting model
-                folder_path_data = PathData(
-                    relative_path=token_rel_real_path,
-                    full_path=token_full_path,
-                    is_folder=True,
-                    )
-                new_folder_item.setData(folder_path_data, QtCore.Qt.UserRole)
-
-                parent_item.appendRow(new_folder_item)
-                parent_item = new_folder_item
-                self._model_folders[case_insensitive_folder] = new_folder_item
-
-        item = FileTreeModelItem(file_path, folder_config)
-        path_data = PathData(
-            relative_path=file_rel_path,
-            full_path=file_path,
-            is_folder=False,
-            )
-        item.setData(path_data, QtCore.Qt.UserRole)
-
-        file_icon = folder_config.get_file_icon(file_path)
-        item.setIcon(file_icon)
-
-        parent_item.appendRow(item)
-
-    def _trigger_double_clicked(self, index):
-        model_index = self.proxy.mapToSource(index)
-        tree_item = self.proxy.sourceModel().itemFromIndex(model_index)  # type: FileTreeModelItem
-
-        if isinstance(tree_item, FileTreeModelItem):
-            folder_config = tree_item.folder_config # type: FolderConfig
-            folder_config.file_double_clicked(tree_item.file_path)
-            self.file_double_clicked.emit(tree_item.file_path)
+                parent_node = self._add_node(parent_node, token, True, config_id)
+                self._folder_nodes[folder_key] = parent_node
+
+        return parent_node
+
+    def add_paths(self, file_paths, folder_config):
+        """add a batch of files, expanded folders get all of their new rows in one insert"""
+        config_id = self._get_config_id(folder_config)
+
+        # child counts before the batch of every folder that gets new children
+        previous_child_counts = {}
+        folder_nodes = {}
+        for file_path in file_paths:
+            dir_path = os.path.dirname(file_path)
+            folder_node = folder_nodes.get(dir_path)
+            if folder_node is None:
+                previous_folder_count = len(self._parents)
+                folder_node = self._get_folder_node(dir_path, folder_config, config_id)
+                folder_nodes[dir_path] = folder_node
+                # new folders are children of their parent folders too
+                for new_node in range(previous_folder_count, len(self._parents)):
+                    parent_node = self._parents[new_node]
+                    previous_child_counts.setdefault(parent_node, self._rows[new_node])
+
+            previous_child_counts.setdefault(folder_node, len(self._children[folder_node]))
+            self._add_node(folder_node, os.path.basename(file_path), False, config_id)
+
+        # folders that show all their rows already (and the root) show the new ones right away,
+        # the others reveal them in fetchMore
+        for folder_node, previous_count in previous_child_counts.items():
+            shows_all_rows = self._fetched_counts[folder_node] == previous_count and (previous_count or folder_node == 0)
+            if not shows_all_rows:
+                continue
+            child_count = len(self._children[folder_node])
+            if child_count == previous_count:
+                continue
+            self.beginInsertRows(self.get_node_index(folder_node), previous_count, child_count - 1)
+            self._fetched_counts[folder_node] = child_count
+            self.endInsertRows()
+
+        self.nodes_added.emit()
+
+    def remove_paths(self, file_paths, folder_config):
+        """remove a batch of files, folders left empty are removed with them"""
+        # {folder node: file names}
+        removed_names = {}
+        for file_path in file_paths:
+            folder_node = self._find_folder_node(os.path.dirname(file_path), folder_config)
+            if folder_node is not None:
+                removed_names.setdefault(folder_node, set()).add(os.path.basename(file_path))
+
+        # {folder node: child nodes}
+        removed_nodes = {}
+        for folder_node, file_names in removed_names.items():
+            removed_nodes[folder_node] = {
+                node for node in self._children[folder_node]
+                if not self._is_folder[node] and self.get_node_name(node) in file_names
+            }
+
+        # deepest folders first so emptied folders can be queued for removal from their parents
+        changed_folder_nodes = []
+        while removed_nodes:
+            folder_node = max(removed_nodes, key=self._get_node_depth)
+            self._remove_child_nodes(folder_node, removed_nodes.pop(folder_node))
+            changed_folder_nodes.append(folder_node)
+            if folder_node != 0 and not self._children[folder_node]:
+                removed_nodes.setdefault(self._parents[folder_node], set()).add(folder_node)
+
+        # folders that were emptied and removed themselves are left out, their parents are in the list
+        changed_folder_nodes = [node for node in changed_folder_nodes if node not in self._removed_nodes]
+        if changed_folder_nodes:
+            self.nodes_removed.emit(changed_folder_nodes)
+
+        # a watched share with a lot of churn would otherwise grow the arrays, and the filter scans, without bound
+        removed_count = len(self._removed_nodes)
+        if removed_count >= COMPACT_MIN_REMOVED_NODES and removed_count * 2 > len(self._parents):
+            self._compact()
+
+    def _remove_child_nodes(self, parent_node, nodes):
+        if not nodes:
+            return
 
-    def set_filter(self, text=None):
-        search = QtCore.QRegExp(text, QtCore.Qt.CaseInsensitive, QtCore.QRegExp.RegExp)
-        self.proxy.setFilterRegExp(search)
-        if not text:
-            if self.default_expand_depth is None:
-                self.collapseAll()
+        siblings = self._children[parent_node]
+        removed_rows = sorted(self._rows[node] for node in nodes)
+        fetched_count = self._fetched_counts[parent_node]
+        parent_index = self.get_node_index(parent_node)
+
+        # contiguous runs of rows the view knows about, removed from the bottom up so the rows above stay valid
+        row_runs = []
+        for row in removed_rows:
+            if row >= fetched_count:
+                break
+            if row_runs and row_runs[-1][1] == row - 1:
+                row_runs[-1][1] = row
             else:
-                self.expandToDepth(self.default_expand_depth)
-        else:
-            self.expandAll()
+                row_runs.append([row, row])
+
+        for first_row, last_row in reversed(row_runs):
+            self.beginRemoveRows(parent_index, first_row, last_row)
+            del siblings[first_row:last_row + 1]
+            self._fetched_counts[parent_node] -= last_row - first_row + 1
+            for row in range(first_row, len(siblings)):
+                self._rows[siblings[row]] = row
+            self.endRemoveRows()
+
+        # rows past the fetched ones were never shown, they just go away
+        remaining = array.array("i", (node for node in siblings if node not in nodes))
+        self._children[parent_node] = remaining
+        for row, node in enumerate(remaining):
+            self._rows[node] = row
+
+        for node in nodes:
+            if self._is_folder[node]:
+                self._folder_nodes.pop(os.path.normcase(self.get_relative_path(node)), None)
+                self._children.pop(node, None)
+                self._folder_paths.pop(node, None)
+            # removed nodes stay in the arrays until the next _compact, parented to the root so the filter masks stay valid
+            self._parents[node] = 0
+            self._removed_nodes.add(node)
+
+    def _compact(self):
+        """
+        drop the removed nodes from the arrays and the names they left in the name buffer.
+        live nodes keep their order, so parents still come before their children,
+        the view's persistent indexes are moved over to the new node numbers
+        """
+        node_count = len(self._parents)
+        is_live = np.ones(node_count, dtype=bool)
+        is_live[np.fromiter(self._removed_nodes, dtype=np.int64, count=len(self._removed_nodes))] = False
+        old_nodes = np.flatnonzero(is_live)
+        new_nodes = np.full(node_count, -1, dtype=np.int64)
+        new_nodes[old_nodes] = np.arange(len(old_nodes))
+
+        self.layoutAboutToBeChanged.emit()
+
+        old_parents = np.frombuffer(self._parents, dtype=np.int32)[old_nodes]
+        new_parents = np.where(old_parents >= 0, new_nodes[old_parents], -1)
+        self._parents = array.array("i", new_parents.astype(np.int32).tobytes())
+        self._rows = array.array("i", np.frombuffer(self._rows, dtype=np.int32)[old_nodes].tobytes())
+        self._is_folder = array.array("b", np.frombuffer(self._is_folder, dtype=np.int8)[old_nodes].tobytes())
+        self._config_ids = array.array("H", np.frombuffer(self._config_ids, dtype=np.uint16)[old_nodes].tobytes())
+        self._fetched_counts = array.array(
+            "i", np.frombuffer(self._fetched_counts, dtype=np.int32)[old_nodes].tobytes()
+        )
+
+        # only the names still in use are copied, folder names stay interned
+        old_name_buffer = self._name_buffer
+        old_name_offsets = self._name_offsets
+        old_name_ids = self._name_ids
+        self._name_buffer = bytearray()
+        self._name_offsets = array.array("Q", [0])
+        self._folder_segment_ids = {}
+        self._name_ids = array.array("i")
+        for old_node in old_nodes:
+            old_segment_id = old_name_ids[old_node]
+            name = old_name_buffer[old_name_offsets[old_segment_id]:old_name_offsets[old_segment_id + 1] - 1].decode("utf-8")
+            if self._is_folder[len(self._name_ids)]:
+                segment_id = self._folder_segment_ids.get(name)
+                if segment_id is None:
+                    segment_id = self._add_segment(name)
+                    self._folder_segment_ids[name] = segment_id
+            else:
+                segment_id = self._add_segment(name)
+            self._name_ids.append(segment_id)
+
+        self._children = {
+            int(new_nodes[node]): array.array("i", new_nodes[np.frombuffer(children, dtype=np.int32)].astype(np.int32).tobytes())
+            for node, children in self._children.items()
+        }
+        self._folder_nodes = {key: int(new_nodes[node]) for key, node in self._folder_nodes.items()}
+        self._removed_nodes = set()
+
+        # rebuilt for the new node numbers the next time the tree is filtered
+        self._path_buffer = bytearray()
+        self._path_offsets = array.array("q", [0])
+        self._folder_paths = {}
+
+        old_indexes = self.persistentIndexList()
+        new_indexes = [
+            self.createIndex(index.row(), index.column(), int(new_nodes[index.internalId()])) for index in old_indexes
+        ]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+
+        self.nodes_renumbered.emit(old_nodes)
+        self.layoutChanged.emit()
+
+    def _get_node_depth(self, node):
+        depth = 0
+        while node > 0:
+            node = self._parents[node]
+            depth += 1
+        return depth
+
+    # --- node queries
+
+    def get_node(self, index):
+        return index.internalId() if index.isValid() else 0
+
+    def get_node_count(self):
+        return len(self._parents)
+
+    def get_parent_node(self, node):
+        return self._parents[node]
+
+    def get_child_nodes(self, node):
+        return np.array(self._children[node], dtype=np.int32)
+
+    def is_fetched(self, node):
+        """True when node and every folder above it are rows the view knows about"""
+        while node > 0:
+            parent_node = self._parents[node]
+            row = self._rows[node]
+            if row >= self._fetched_counts[parent_node] or self._children[parent_node][row] != node:
+                return False
+            node = parent_node
+        return True
 
+    def get_fetched_folder_nodes(self, folder_config):
+        """folder nodes of folder_config that are rows, only these can be expanded"""
+        config_ids = [config_id for config_id, config in enumerate(self.folder_configs) if config is folder_config]
+        if not config_ids:
+            return []
+        return [
+            node for node in self._folder_nodes.values()
+            if self._config_ids[node] == config_ids[0] and self.is_fetched(node)
+        ]
+
+    def emit_nodes_changed(self, nodes):
+        """dataChanged for the nodes that are rows, so a proxy model filters them again"""
+        for node in nodes:
+            if self.is_fetched(node):
+                index = self.get_node_index(node)
+                self.dataChanged.emit(index, index)
+
+    def get_node_index(self, node, column=0):
+        if node == 0:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._rows[node], column, node)
+
+    def get_node_name(self, node):
+        segment_id = self._name_ids[node]
+        return self._name_buffer[self._name_offsets[segment_id]:self._name_offsets[segment_id + 1] - 1].decode("utf-8")
+
+    def get_relative_path(self, node):
+        names = []
+        while node > 0:
+            names.append(self.get_node_name(node))
+            node = self._parents[node]
+        return "\\".join(reversed(names))
+
+    def get_full_path(self, node):
+        folder_config = self.get_folder_config(node)
+        relative_path = self.get_relative_path(node)
+        if folder_config.top_folder_name:
+            relative_path = relative_path.split("\\", 1)[-1] if "\\" in relative_path else ""
+        return os.path.join(folder_config.dir_path, *relative_path.split("\\")) if relative_path else folder_config.dir_path
+
+    def get_folder_config(self, node):
+        return self.folder_configs[self._config_ids[node]]
+
+    def is_folder(self, node):
+        return bool(self._is_folder[node])
+
+    def get_file_path(self, index):
+        """full path of the file at index, None for folders"""
+        node = self.get_node(index)
+        if node == 0 or self.is_folder(node):
+            return None
+        return self.get_full_path(node)
+
+    def _update_path_buffer(self):
+        """add the relative paths of the nodes added since the last update to the path buffer"""
+        for node in range(len(self._path_offsets) - 1, len(self._parents)):
+            segment_id = self._name_ids[node]
+            name = self._name_buffer[self._name_offsets[segment_id]:self._name_offsets[segment_id + 1] - 1]
+            parent_path = self._folder_paths.get(self._parents[node])
+            path = parent_path + b"/" + name if parent_path else bytes(name)
+            if self._is_folder[node]:
+                self._folder_paths[node] = path
+
+            self._path_buffer.extend(path)
+            self._path_buffer.extend(b"\n")
+            self._path_offsets.append(len(self._path_buffer))
+
+    def find_matching_nodes(self, pattern, first_node=0):
+        """
+        bool mask of the nodes from first_node on whose relative path matches pattern
 
-class FileTreeModelItem(QtGui.QStandardItem):
-    def __init__(self, file_path=None, folder_config=None):
-        super(FileTreeModelItem, self).__init__()
-        self.file_path = file_path
-        self.file_name = os.path.basename(file_path)
-        self.folder_config = folder_config
-        self.setData(self.file_name, QtCore.Qt.DisplayRole)
-        self.setFlags(self.flags() ^ QtCore.Qt.ItemIsDropEnabled)
+        paths are the display folder names down to the node joined by "/", e.g. "Take 01/walk/run_02.fbx",
+        so a pattern can match across folders ("walk/.*run") and a folder name matches every file below it
+        """
+        self._update_path_buffer()
+
+        # search every path at once in the newline separated path buffer, each path only needs its first match
+        regex = re.compile(pattern.encode("utf-8"), re.IGNORECASE | re.MULTILINE)
+        path_buffer = self._path_buffer
+        match_starts = []
+        search_start = self._path_offsets[first_node]
+        while True:
+            match = regex.search(path_buffer, search_start)
+            if match is None:
+                break
+
+            match_start = match.start()
+            line_end = path_buffer.find(b"\n", match_start)
+            if match.end() > line_end:
+                # ran on into the next path (\s, [^x], ...), only a match inside this path counts
+                line_start = path_buffer.rfind(b"\n", search_start, match_start) + 1 or search_start
+                match = regex.search(path_buffer, line_start, line_end)
+            if match is not None:
+                match_starts.append(match_start)
+            search_start = line_end + 1
+
+        path_offsets = np.frombuffer(self._path_offsets, dtype=np.int64)
+        matches = np.zeros(len(path_offsets) - 1 - first_node, dtype=bool)
+        matches[np.searchsorted(path_offsets, match_starts, side="right") - 1 - first_node] = True
+        if first_node == 0:
+            matches[0] = False
+        if self._removed_nodes:
+            removed_nodes = np.fromiter(self._removed_nodes, dtype=np.int64, count=len(self._removed_nodes))
+            matches[removed_nodes[removed_nodes >= first_node] - first_node] = False
+        return matches
+
+    def add_ancestor_nodes(self, node_mask):
+        """node_mask with the folders leading to every node in it set as well"""
+        parents = np.frombuffer(self._parents, dtype=np.int32)[:len(node_mask)].copy()
+        parents[0] = 0
+
+        # every step marks one more level of parents
+        node_mask = node_mask.copy()
+        for _ in range(self._get_max_depth()):
+            node_mask[parents[node_mask]] = True
+        node_mask[0] = False
+        return node_mask
+
+    def _get_max_depth(self):
+        return max([folder_path.count("\\") + 1 for folder_path in self._folder_nodes] or [0]) + 1
+
+    # --- QAbstractItemModel
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        parent_node = self.get_node(parent)
+        if row < 0 or row >= self._fetched_counts[parent_node] or column >= self.columnCount():
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self._children[parent_node][row])
+
+    def parent(self, index):
+        node = self.get_node(index)
+        if node == 0:
+            return QtCore.QModelIndex()
+        return self.get_node_index(self._parents[node])
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return self._fetched_counts[self.get_node(parent)]
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.header_labels)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self.get_node(parent)
+        return self.is_folder(node) and len(self._children[node]) > 0
+
+    def canFetchMore(self, parent):
+        node = self.get_node(parent)
+        return self.is_folder(node) and self._fetched_counts[node] < len(self._children[node])
+
+    def fetchMore(self, parent):
+        node = self.get_node(parent)
+        fetched_count = self._fetched_counts[node]
+        new_fetched_count = min(fetched_count + FETCH_BATCH_SIZE, len(self._children[node]))
+        if new_fetched_count <= fetched_count:
+            return
+        self.beginInsertRows(parent, fetched_count, new_fetched_count - 1)
+        self._fetched_counts[node] = new_fetched_count
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        node = self.get_node(index)
+        if node == 0:
+            return None
+
+        if role == _qt.DisplayRole:
+            return self.get_node_name(node)
+        elif role == _qt.DecorationRole:
+            folder_config = self.get_folder_config(node)
+            if self.is_folder(node):
+                return folder_config.get_folder_icon(self.get_full_path(node))
+            return folder_config.get_file_icon(self.get_full_path(node))
+        elif role == FILE_TREE_IS_FOLDER_ROLE:
+            return self.is_folder(node)
+        elif role == _qt.UserRole:
+            return PathData(
+                relative_path=self.get_relative_path(node),
+                full_path=self.get_full_path(node),
+                is_folder=self.is_folder(node),
+                )
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == _qt.Horizontal and role == _qt.DisplayRole and section < len(self.header_labels):
+            return self.header_labels[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return _qt.NoItemFlags
+        return _qt.ItemIsEnabled | _qt.ItemIsSelectable | _qt.ItemIsDragEnabled
+
+    def mimeTypes(self):
+        return ["text/uri-list"]
+
+    def mimeData(self, indexes):
+        file_paths = []
+        for index in indexes:
+            file_path = self.get_file_path(index)
+            if file_path and file_path not in file_paths:
+                file_paths.append(file_path)
+
+        mime_data = QtCore.QMimeData()
+        mime_data.setUrls([QtCore.QUrl.fromLocalFile(file_path) for file_path in file_paths])
+        return mime_data
 
 
 class FileTreeSortProxyModel(QtCore.QSortFilterProxyModel):
@@ -283,17 +1064,102 @@ class FileTreeSortProxyModel(QtCore.QSortFilterProxyModel):
     def __init__(self, model):
         super(FileTreeSortProxyModel, self).__init__(model)
         self.setSourceModel(model)
+        self._filter_text = None
+        # bool masks over the source nodes, None shows everything.
+        # nodes added after the filter was set are matched as they come in, not the whole tree again
+        self._matching_nodes = None
+        self._visible_nodes = None
+        self._changed_nodes = []  # nodes already in the masks whose visibility changed, sent as dataChanged
+
+        # the masks have to cover new rows before the proxy filters them,
+        # nodes_added also covers files added to folders that aren't rows yet
+        model.rowsAboutToBeInserted.connect(self._match_new_nodes)
+        model.nodes_added.connect(self._on_nodes_added)
+        model.nodes_removed.connect(self._on_nodes_removed)
+        model.nodes_renumbered.connect(self._on_nodes_renumbered)
+
+    def set_filter_text(self, text):
+        """the whole tree is matched up front, so rows in folders that were never expanded are found too"""
+        self._filter_text = text
+        self._matching_nodes = None
+        self._visible_nodes = None
+        self._changed_nodes = []
+        if text:
+            source_model = self.sourceModel()  # type: FileTreeModel
+            try:
+                self._matching_nodes = source_model.find_matching_nodes(text)
+            except re.error:
+                pass
+            else:
+                self._visible_nodes = source_model.add_ancestor_nodes(self._matching_nodes)
+        self.invalidateFilter()
+
+    def _match_new_nodes(self, *args):
+        """add the nodes added since the last match to the masks, hidden folders above new matches are shown"""
+        if self._visible_nodes is None:
+            return
+
+        source_model = self.sourceModel()  # type: FileTreeModel
+        first_node = len(self._visible_nodes)
+        if first_node >= source_model.get_node_count():
+            return
+
+        new_matches = source_model.find_matching_nodes(self._filter_text, first_node)
+        self._matching_nodes = np.concatenate((self._matching_nodes, new_matches))
+        visible_nodes = np.concatenate((self._visible_nodes, new_matches))
+        for node in np.flatnonzero(new_matches) + first_node:
+            parent_node = source_model.get_parent_node(node)
+            while parent_node > 0 and not visible_nodes[parent_node]:
+                visible_nodes[parent_node] = True
+                if parent_node < first_node:
+                    self._changed_nodes.append(parent_node)
+                parent_node = source_model.get_parent_node(parent_node)
+        self._visible_nodes = visible_nodes
+
+    def _on_nodes_added(self):
+        self._match_new_nodes()
+        self._emit_changed_nodes()
+
+    def _on_nodes_removed(self, folder_nodes):
+        """hide the folders that lost children and have nothing left to show, and the folders above them"""
+        if self._visible_nodes is None:
+            return
+
+        self._match_new_nodes()
+        source_model = self.sourceModel()  # type: FileTreeModel
+        for node in folder_nodes:
+            while node > 0 and self._visible_nodes[node] and not self._matching_nodes[node]:
+                if self._visible_nodes[source_model.get_child_nodes(node)].any():
+                    break
+                self._visible_nodes[node] = False
+                self._changed_nodes.append(node)
+                node = source_model.get_parent_node(node)
+        self._emit_changed_nodes()
+
+    def _on_nodes_renumbered(self, old_nodes):
+        """keep the masks of the nodes that are left, in their new order"""
+        if self._visible_nodes is None:
+            return
+        # old_nodes is sorted, the nodes the masks covered come first and newer ones are matched as usual
+        old_nodes = old_nodes[:np.searchsorted(old_nodes, len(self._visible_nodes))]
+        self._matching_nodes = self._matching_nodes[old_nodes]
+        self._visible_nodes = self._visible_nodes[old_nodes]
+        self._changed_nodes = []
+
+    def _emit_changed_nodes(self):
+        if self._changed_nodes:
+            changed_nodes = self._changed_nodes
+            self._changed_nodes = []
+            self.sourceModel().emit_nodes_changed(changed_nodes)
 
     def lessThan(self, left, right):
         """
         Perform sorting comparison.
         Since we know the sort order, we can ensure that folders always come first.
         """
-        left_path_data = left.data(_qt.UserRole)  # type: PathData
-        right_path_data = right.data(_qt.UserRole)  # type: PathData
-        left_is_folder = left_path_data.is_folder if left_path_data else False
+        left_is_folder = bool(left.data(FILE_TREE_IS_FOLDER_ROLE))
         left_data = left.data(_qt.DisplayRole) or ""
-        right_is_folder = right_path_data.is_folder if right_path_data else False
+        right_is_folder = bool(right.data(FILE_TREE_IS_FOLDER_ROLE))
         right_data = right.data(_qt.DisplayRole) or ""
         sort_order = self.sortOrder()
 
@@ -306,24 +1172,11 @@ class FileTreeSortProxyModel(QtCore.QSortFilterProxyModel):
         return result
 
     def filterAcceptsRow(self, source_row, source_parent):
-        filter_regex = self.filterRegExp()
-        if filter_regex.isEmpty():
+        if self._visible_nodes is None:
             return True
 
-        r = source_row  # type: int
-        p = source_parent  # type: QtCore.QModelIndex
-        model_index = self.sourceModel().index(r, 0, p)
-        path_data = self.sourceModel().data(model_index, _qt.UserRole)  # type: PathData
-
-        # check children
-        for i in range(self.sourceModel().rowCount(model_index)):
-            if self.filterAcceptsRow(i, model_index):
-                return True
-
-        result = filter_regex.indexIn(path_data.relative_path)
-        if result == -1:
-            return False
-        return True
+        node = self.sourceModel().index(source_row, 0, source_parent).internalId()
+        return node >= len(self._visible_nodes) or bool(self._visible_nodes[node])
 
 
 class PathData(object):
@@ -1,5 +1,8 @@
 
+import time
+
 from . import ui_utils
+from . import mocap_browser_logger
 from .ui_utils import QtCore, QtWidgets, QtGui, QtOpenGL
 
 # Requires PyOpenGL
@@ -7,6 +10,14 @@ from OpenGL import GL
 from .gl_utils import camera
 from .gl_utils import scene_utils
 
+log = mocap_browser_logger.get_logger()
+
+PLAYBACK_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0)
+PLAYBACK_MIN_TICK_MS = 8
+
+# mouse movement in pixels between press and release that still counts as a click
+CLICK_DRAG_THRESHOLD = 3
+
 
 class BaseViewportWidget(QtOpenGL.QGLWidget):
     """Super Basic 3D Viewport with navigation controls"""
@@ -17,24 +28,75 @@ class BaseViewportWidget(QtOpenGL.QGLWidget):
         self.background_color = QtGui.QColor.fromRgb(80, 120, 150, 0.0)
         self.prev_mouse_x = 0
         self.prev_mouse_y = 0
+        self.press_mouse_x = 0
+        self.press_mouse_y = 0
         self.main_camera = camera.Camera()
         self.main_camera.setSceneRadius(100.0)
+
+        # render scheduling, the viewport only repaints after invalidate()
+        self._redraw_pending = False
+        self.rendered_frame_count = 0
+        self.skipped_frame_count = 0
+
         self.reset_camera()
 
         ui_utils.add_hotkey(self, "R", self.reset_camera)
-        ui_utils.add_hotkey(self, "F", self.reset_camera)
+        ui_utils.add_hotkey(self, "F", self.frame_current_pose)
+        ui_utils.add_hotkey(self, "Shift+F", self.frame_whole_scene)
     
     def reset_camera(self):
         self.main_camera.reset(800, 500, 800)
+        self.invalidate()
+
+    def get_scene_bounds(self, whole_clip=False):
+        """(min, max) corners of the content to frame, None when there's nothing to frame"""
+        return None
+
+    def frame_scene(self, whole_clip=False):
+        scene_bounds = self.get_scene_bounds(whole_clip)
+        if scene_bounds is None:
+            self.reset_camera()
+            return
+        self.main_camera.frameBounds(*scene_bounds)
+        self.invalidate()
+
+    def frame_current_pose(self):
+        self.frame_scene(whole_clip=False)
+
+    def frame_whole_scene(self):
+        self.frame_scene(whole_clip=True)
+
+    def invalidate(self):
+        """Request a repaint, requests made before the next paint are merged into it"""
+        if self._redraw_pending:
+            self.skipped_frame_count += 1
+            return
+        self._redraw_pending = True
         self.update()
 
+    def skip_frame(self):
+        """Record a redraw that wasn't needed since nothing visible changed"""
+        self.skipped_frame_count += 1
+
+    def get_render_stats(self):
+        return {
+            "rendered": self.rendered_frame_count,
+            "skipped": self.skipped_frame_count,
+        }
+
+    def reset_render_stats(self):
+        self.rendered_frame_count = 0
+        self.skipped_frame_count = 0
+
     def initializeGL(self):
         self.qglClearColor(self.background_color)
 
     def paintGL(self):
+        self._redraw_pending = False
+        self.rendered_frame_count += 1
+
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
         GL.glMatrixMode(GL.GL_MODELVIEW)
-        GL.glLoadIdentity()
         self.main_camera.transform()
         scene_utils.draw_origin_grid()
         scene_utils.draw_axis_helper()
@@ -46,6 +108,20 @@ class BaseViewportWidget(QtOpenGL.QGLWidget):
     def mousePressEvent(self, event):
         self.prev_mouse_x = event.x()
         self.prev_mouse_y = event.y()
+        self.press_mouse_x = event.x()
+        self.press_mouse_y = event.y()
+
+    def mouseReleaseEvent(self, event):
+        # a left click that didn't orbit picks
+        if event.button() != QtCore.Qt.LeftButton:
+            return
+        drag_distance = abs(event.x() - self.press_mouse_x) + abs(event.y() - self.press_mouse_y)
+        if drag_distance <= CLICK_DRAG_THRESHOLD:
+            self.pick(event.x(), event.y())
+
+    def pick(self, x, y):
+        """called on a left click at widget pixel x, y"""
+        pass
 
     def mouseMoveEvent(self, event):
         """Viewport controls"""
@@ -53,6 +129,9 @@ class BaseViewportWidget(QtOpenGL.QGLWidget):
         delta_y = event.y() - self.prev_mouse_y
         mouse_zoom_speed = 3
 
+        if event.buttons() == QtCore.Qt.NoButton:
+            return
+
         # Orbit
         if event.buttons() == QtCore.Qt.LeftButton:
             self.main_camera.orbit(self.prev_mouse_x, self.prev_mouse_y, event.x(), event.y())
@@ -67,12 +146,12 @@ class BaseViewportWidget(QtOpenGL.QGLWidget):
 
         self.prev_mouse_x = event.x()
         self.prev_mouse_y = event.y()
-        self.update()
+        self.invalidate()
 
     def wheelEvent(self, event):
         zoom_multiplier = 0.5
         self.main_camera.dollyCameraForward(event.delta() * zoom_multiplier, False)
-        self.update()
+        self.invalidate()
 
 
 class AnimationViewportWidget(BaseViewportWidget):
@@ -88,47 +167,108 @@ class AnimationViewportWidget(BaseViewportWidget):
         self.start_frame = 0
         self.end_frame = 0
 
-        # frame timer
+        # playback follows a monotonic clock, the timer only polls it
+        self.fps = 30.0
+        self.playback_speed = 1.0
+        self.dropped_frame_count = 0
+        self._play_start_time = 0.0
+        self._play_start_frame = 0
+
         self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
         self.timer.timeout.connect(self.play_next_frame)
-        self.timer.start(30)
-
-    def timerEvent(self, event):
-        self.update()
 
     def toggle_play(self):
         self.play_active = not self.play_active
 
         if self.play_active:
-            self.startTimer(1)
+            self.reset_render_stats()
+            self._restart_play_clock()
+        else:
+            self.timer.stop()
+            log.debug("Playback frames rendered: {rendered}, skipped: {skipped}, dropped: {dropped}".format(
+                **self.get_render_stats()
+            ))
+
+    def set_fps(self, fps):
+        self.fps = fps if fps > 0 else 30.0
+        self._sync_play_clock()
+
+    def set_playback_speed(self, speed):
+        self.playback_speed = max(PLAYBACK_SPEEDS[0], min(speed, PLAYBACK_SPEEDS[-1]))
+        self._sync_play_clock()
+
+    def get_render_stats(self):
+        stats = super().get_render_stats()
+        stats["dropped"] = self.dropped_frame_count
+        return stats
+
+    def reset_render_stats(self):
+        super().reset_render_stats()
+        self.dropped_frame_count = 0
+
+    def _restart_play_clock(self):
+        self._play_start_time = time.perf_counter()
+        self._play_start_frame = int(self.active_frame)
+
+        # poll at about twice the frame rate, there's no point going faster than the display
+        interval = int(500.0 / (self.fps * self.playback_speed))
+        self.timer.start(max(PLAYBACK_MIN_TICK_MS, interval))
+
+    def _sync_play_clock(self):
+        """continue playback from the current frame after a seek or a speed change"""
+        if self.play_active:
+            self._restart_play_clock()
 
     def set_frame(self, frame):
         if self.play_active:
             return
+        if frame == self.active_frame:
+            self.skip_frame()
+            return
         self.active_frame = frame
-        self.update()
+        self.invalidate()
 
     def play_next_frame(self):
         if not self.play_active:
             return
-        
-        if self.active_frame >= self.end_frame:
-            self.set_active_frame(self.start_frame)
-        else:
-            self.set_active_frame(self.active_frame + 1)
-    
+
+        frame_count = int(self.end_frame) - int(self.start_frame) + 1
+        if frame_count <= 0:
+            return
+
+        # the frame the clock is at, looping over the timeline
+        elapsed = time.perf_counter() - self._play_start_time
+        elapsed_frames = int(elapsed * self.fps * self.playback_speed)
+        target_frame = self.start_frame + (self._play_start_frame - self.start_frame + elapsed_frames) % frame_count
+
+        advanced = (target_frame - int(self.active_frame)) % frame_count
+        if advanced == 0:
+            self.skip_frame()
+            return
+
+        # painting couldn't keep up, frames in between are never shown
+        self.dropped_frame_count += advanced - 1
+        self.set_active_frame(target_frame)
+
     def increment_frame(self, value=1):
         target_frame = self.active_frame + value
         target_frame = max(self.start_frame, min(target_frame, self.end_frame)) # clamp within timeline
         self.set_active_frame(target_frame)
+        self._sync_play_clock()
     
     def go_to_start_frame(self):
         self.set_active_frame(self.start_frame)
+        self._sync_play_clock()
     
     def go_to_end_frame(self):
         self.set_active_frame(self.end_frame)
+        self._sync_play_clock()
     
     def set_active_frame(self, value):
+        if value == self.active_frame:
+            self.skip_frame()
+            return
         self.active_frame = value
-        self.update()
+        self.invalidate()
         self.frame_changed.emit(self.active_frame)
@@ -0,0 +1,65 @@
+"""
+Headless tests, only need numpy
+"""
+import unittest
+
+import numpy as np
+
+from mocap_browser import anim_curves
+
+
+class TestAnimCurve(unittest.TestCase):
+
+    def test_linear(self):
+        curve = anim_curves.AnimCurve([0, 10], [0.0, 5.0])
+        np.testing.assert_allclose(curve.evaluate([0, 2.5, 5, 10]), [0.0, 1.25, 2.5, 5.0])
+
+    def test_constant(self):
+        curve = anim_curves.AnimCurve([0, 10, 20], [1.0, 2.0, 3.0], [anim_curves.INTERPOLATION_CONSTANT] * 3)
+        np.testing.assert_allclose(curve.evaluate([0, 9.9, 10, 15]), [1.0, 1.0, 2.0, 2.0])
+
+    def test_holds_outside_keys(self):
+        curve = anim_curves.AnimCurve([5, 10], [1.0, 2.0])
+        np.testing.assert_allclose(curve.evaluate([-100, 5, 10, 100]), [1.0, 1.0, 2.0, 2.0])
+
+    def test_single_and_no_keys(self):
+        np.testing.assert_allclose(anim_curves.AnimCurve([3], [7.0]).evaluate([0, 3, 9]), [7.0, 7.0, 7.0])
+        np.testing.assert_allclose(anim_curves.AnimCurve([], []).evaluate([0, 1]), [0.0, 0.0])
+
+    def test_cubic_matches_hermite(self):
+        times = [0.0, 4.0]
+        values = [1.0, 3.0]
+        left_slopes = [0.0, -0.5]
+        right_slopes = [2.0, 0.0]
+        curve = anim_curves.AnimCurve(
+            times, values, [anim_curves.INTERPOLATION_CUBIC] * 2, left_slopes=left_slopes, right_slopes=right_slopes,
+        )
+
+        frames = np.linspace(0, 4, 9)
+        u = frames / 4.0
+        expected = (
+            (2 * u ** 3 - 3 * u ** 2 + 1) * 1.0
+            + (u ** 3 - 2 * u ** 2 + u) * 4.0 * 2.0
+            + (-2 * u ** 3 + 3 * u ** 2) * 3.0
+            + (u ** 3 - u ** 2) * 4.0 * -0.5
+        )
+        np.testing.assert_allclose(curve.evaluate(frames), expected, atol=1e-9)
+
+    def test_cubic_keys_on_every_frame_pass_through_keys(self):
+        times = np.arange(20, dtype=float)
+        values = np.sin(times * 0.3)
+        curve = anim_curves.AnimCurve(times, values, [anim_curves.INTERPOLATION_CUBIC] * 20)
+        np.testing.assert_allclose(curve.evaluate(times), values, atol=1e-12)
+
+
+class TestCurveVectorChannel(unittest.TestCase):
+
+    def test_static_axes_keep_value(self):
+        channel = anim_curves.CurveVectorChannel((1.0, 2.0, 3.0), [None, anim_curves.AnimCurve([0, 10], [0, 10]), None])
+        values = channel.evaluate([0, 5])
+        np.testing.assert_allclose(values, [[1.0, 0.0, 3.0], [1.0, 5.0, 3.0]])
+        self.assertEqual(channel.key_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
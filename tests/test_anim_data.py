@@ -0,0 +1,57 @@
+"""
+Headless tests, only need numpy
+"""
+import unittest
+
+import numpy as np
+
+from mocap_browser import anim_data
+
+
+def get_root_joint_name(joint_names):
+    positions = np.zeros((2, len(joint_names), 3), dtype=np.float32)
+    baked = anim_data.BakedAnimation(joint_names, [-1] * len(joint_names), positions)
+    return baked.joint_names[baked.get_root_joint_index()]
+
+
+class TestBakedAnimation(unittest.TestCase):
+
+    def setUp(self):
+        # 4 frames of a 3 joint chain, every value is its own flat index
+        positions = np.arange(4 * 3 * 3, dtype=np.float64).reshape(4, 3, 3)
+        self.baked = anim_data.BakedAnimation(["hips", "spine", "head"], [-1, 0, 1], positions, start_frame=10)
+
+    def test_arrays(self):
+        self.assertEqual(self.baked.positions.dtype, np.float32)
+        self.assertTrue(self.baked.positions.flags.c_contiguous)
+        self.assertEqual(self.baked.parent_indices.dtype, np.int32)
+        self.assertEqual(self.baked.frame_count, 4)
+        self.assertEqual(self.baked.joint_count, 3)
+        self.assertEqual(self.baked.end_frame, 13)
+
+    def test_bones(self):
+        self.assertEqual(self.baked.bone_indices.tolist(), [[1, 0], [2, 1]])
+
+    def test_frames_are_clamped_to_the_baked_range(self):
+        self.assertEqual(self.baked.get_frame_index(12), 2)
+        self.assertEqual(self.baked.get_frame_index(0), 0)
+        self.assertEqual(self.baked.get_frame_index(100), 3)
+        np.testing.assert_array_equal(self.baked.get_positions(11), self.baked.positions[1])
+
+
+class TestRootJoint(unittest.TestCase):
+
+    def test_named_root(self):
+        self.assertEqual(get_root_joint_name(["Reference", "Hips", "Spine"]), "Hips")
+        self.assertEqual(get_root_joint_name(["Reference", "mixamorig:Hips"]), "mixamorig:Hips")
+        self.assertEqual(get_root_joint_name(["Bip01", "Bip01 Pelvis"]), "Bip01 Pelvis")
+        self.assertEqual(get_root_joint_name(["root", "c_hip"]), "c_hip")
+        self.assertEqual(get_root_joint_name(["root", "PELVIS"]), "PELVIS")
+
+    def test_side_joints_are_not_the_root(self):
+        self.assertEqual(get_root_joint_name(["Reference", "LeftHip", "Hips"]), "Hips")
+        self.assertEqual(get_root_joint_name(["root", "LeftHip", "RightHip", "pelvis_twist"]), "root")
+
+
+if __name__ == "__main__":
+    unittest.main()
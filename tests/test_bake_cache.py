@@ -0,0 +1,147 @@
+"""
+Headless tests, only need numpy
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from mocap_browser import bake_cache
+from mocap_browser import anim_source
+from mocap_browser.anim_data import BakedAnimation
+
+
+def create_baked(frame_count=10, joint_count=3):
+    positions = np.arange(frame_count * joint_count * 3, dtype=np.float32).reshape(frame_count, joint_count, 3)
+    return BakedAnimation(
+        joint_names=[f"joint{i}" for i in range(joint_count)],
+        parent_indices=[-1] + list(range(joint_count - 1)),
+        positions=positions,
+        start_frame=5,
+        fps=24.0,
+    )
+
+
+class TestBakeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_folder, True)
+        self.cache = bake_cache.BakeCache(os.path.join(self.temp_folder, "cache"))
+
+    def create_source_file(self, name="take.fbx"):
+        file_path = os.path.join(self.temp_folder, name)
+        with open(file_path, "w") as fp:
+            fp.write(name)
+        return file_path
+
+    def test_round_trip(self):
+        file_path = self.create_source_file()
+        baked = create_baked()
+        self.cache.put(file_path, baked)
+        self.assertTrue(self.cache.contains(file_path))
+
+        cached = self.cache.get(file_path)
+        self.assertEqual(cached.joint_names, baked.joint_names)
+        self.assertEqual(cached.parent_indices.tolist(), baked.parent_indices.tolist())
+        np.testing.assert_array_equal(cached.positions, baked.positions)
+        self.assertEqual(cached.start_frame, 5)
+        self.assertEqual(cached.fps, 24.0)
+
+    def test_missing_entries(self):
+        self.assertIsNone(self.cache.get(self.create_source_file()))
+        self.assertIsNone(self.cache.get(os.path.join(self.temp_folder, "missing.fbx")))
+
+    def test_modified_file_misses(self):
+        file_path = self.create_source_file()
+        self.cache.put(file_path, create_baked())
+        file_stat = os.stat(file_path)
+        os.utime(file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(self.cache.get(file_path))
+
+    def test_unreadable_entry_misses(self):
+        file_path = self.create_source_file()
+        self.cache.put(file_path, create_baked())
+        meta_path, positions_path = self.cache._get_entry_paths(self.cache.get_key(file_path))
+        with open(positions_path, "wb") as fp:
+            fp.write(b"not an npy file")
+        self.assertIsNone(self.cache.get(file_path))
+
+        with open(meta_path, "w") as fp:
+            fp.write("{")
+        self.assertIsNone(self.cache.get(file_path))
+
+    def test_write_returns_entry_size(self):
+        file_path = self.create_source_file()
+        self.assertEqual(self.cache.write(file_path, create_baked()), self.cache.get_size())
+
+    def test_evicts_least_recently_used(self):
+        file_paths = [self.create_source_file(f"take{i}.fbx") for i in range(3)]
+        for i, file_path in enumerate(file_paths):
+            entry_size = self.cache.write(file_path, create_baked())
+            # entries are ordered by the mtime of their .json
+            meta_path = self.cache._get_entry_paths(self.cache.get_key(file_path))[0]
+            os.utime(meta_path, (1000 + i, 1000 + i))
+
+        # reading the oldest entry makes it the most recently used one
+        self.cache.get(file_paths[0])
+        self.cache.evict(size_limit=entry_size * 2)
+        self.assertTrue(self.cache.contains(file_paths[0]))
+        self.assertFalse(self.cache.contains(file_paths[1]))
+        self.assertTrue(self.cache.contains(file_paths[2]))
+
+    def test_put_evicts_past_size_limit(self):
+        file_paths = [self.create_source_file(f"take{i}.fbx") for i in range(3)]
+        entry_size = self.cache.write(file_paths[0], create_baked())
+        self.cache.evict(size_limit=0)
+
+        self.cache.size_limit = entry_size * 2
+        for file_path in file_paths:
+            self.cache.put(file_path, create_baked())
+        self.assertLessEqual(self.cache.get_size(), self.cache.size_limit)
+
+    def test_clear(self):
+        file_path = self.create_source_file()
+        self.cache.put(file_path, create_baked())
+        self.cache.clear()
+        self.assertEqual(self.cache.get_size(), 0)
+        self.assertFalse(self.cache.contains(file_path))
+
+
+class BakedSource(anim_source.AnimationSource):
+    def bake_file(self, file_path, progress_callback=None):
+        return create_baked()
+
+
+class TestWorkerBake(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_folder, True)
+        self.file_path = os.path.join(self.temp_folder, "take.fbx")
+        with open(self.file_path, "w") as fp:
+            fp.write("take")
+
+        patcher = mock.patch.object(anim_source, "create_source", return_value=BakedSource())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_worker_only_writes(self):
+        cache = bake_cache.BakeCache(os.path.join(self.temp_folder, "cache"), size_limit=0)
+        with mock.patch.object(cache, "evict") as evict_mock:
+            baked = anim_source.bake_file(self.file_path, cache)
+        evict_mock.assert_not_called()
+        self.assertEqual(baked.joint_count, 3)
+        self.assertTrue(cache.contains(self.file_path))
+
+    def test_unwritable_cache_still_bakes(self):
+        cache = bake_cache.BakeCache(os.path.join(self.temp_folder, "cache"))
+        with mock.patch.object(cache, "write", side_effect=OSError("disk full")):
+            self.assertIsNotNone(anim_source.bake_file(self.file_path, cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
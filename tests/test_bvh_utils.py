@@ -0,0 +1,91 @@
+"""
+Headless tests, only need numpy
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from mocap_browser import bvh_utils
+
+BVH_TEXT = """HIERARCHY
+ROOT Hips
+{
+    OFFSET 0.0 0.0 0.0
+    CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation
+    JOINT Spine
+    {
+        OFFSET 0.0 10.0 0.0
+        CHANNELS 3 Zrotation Xrotation Yrotation
+        End Site
+        {
+            OFFSET 0.0 5.0 0.0
+        }
+    }
+}
+MOTION
+Frames: 3
+Frame Time: 0.04
+0.0 0.0 0.0 0.0 0.0 0.0 0.0 0.0 0.0
+1.0 2.0 3.0 0.0 0.0 0.0 0.0 0.0 0.0
+0.0 0.0 0.0 90.0 0.0 0.0 0.0 0.0 0.0
+"""
+
+
+class TestReadBvhFile(unittest.TestCase):
+
+    def setUp(self):
+        temp_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_folder, True)
+        self.file_path = os.path.join(temp_folder, "take.bvh")
+        with open(self.file_path, "w") as fp:
+            fp.write(BVH_TEXT)
+
+    def test_hierarchy(self):
+        baked = bvh_utils.read_bvh_file(self.file_path)
+        self.assertEqual(baked.joint_names, ["Hips", "Spine", "Spine_End"])
+        self.assertEqual(baked.parent_indices.tolist(), [-1, 0, 1])
+        self.assertEqual(baked.frame_count, 3)
+        self.assertAlmostEqual(baked.fps, 25.0)
+
+    def test_positions(self):
+        positions = bvh_utils.read_bvh_file(self.file_path).positions
+        np.testing.assert_allclose(positions[0], [[0, 0, 0], [0, 10, 0], [0, 15, 0]], atol=1e-5)
+        # root translation moves the whole chain
+        np.testing.assert_allclose(positions[1], [[1, 2, 3], [1, 12, 3], [1, 17, 3]], atol=1e-5)
+        # 90 degrees around Z on the root swings the chain over to -X
+        np.testing.assert_allclose(positions[2], [[0, 0, 0], [-10, 0, 0], [-15, 0, 0]], atol=1e-5)
+
+    def test_small_chunks_match(self):
+        whole = bvh_utils.read_bvh_file(self.file_path)
+        chunked = bvh_utils.read_bvh_file(self.file_path, chunk_size=7)
+        np.testing.assert_array_equal(whole.positions, chunked.positions)
+
+    def test_progress_callback(self):
+        progress = []
+        bvh_utils.read_bvh_file(self.file_path, progress_callback=progress.append, chunk_size=16)
+        self.assertTrue(progress)
+        self.assertEqual(progress, sorted(progress))
+        self.assertTrue(all(0.0 <= value <= 1.0 for value in progress))
+
+    def test_truncated_motion_keeps_full_frames(self):
+        with open(self.file_path, "w") as fp:
+            fp.write(BVH_TEXT.rsplit("\n", 2)[0] + "\n0.0 0.0")
+        baked = bvh_utils.read_bvh_file(self.file_path)
+        self.assertEqual(baked.frame_count, 2)
+
+    def test_malformed_value_names_its_line(self):
+        with open(self.file_path, "w") as fp:
+            fp.write(BVH_TEXT.replace("1.0 2.0 3.0", "1.0 2.O 3.0"))
+        with self.assertRaisesRegex(bvh_utils.BvhFormatError, r"take\.bvh:20: motion value '2\.O'"):
+            bvh_utils.read_bvh_file(self.file_path)
+
+        # the bad line is found in whichever chunk it lands in
+        with self.assertRaisesRegex(bvh_utils.BvhFormatError, r":20:"):
+            bvh_utils.read_bvh_file(self.file_path, chunk_size=7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+Needs PyOpenGL and Mesa, runs without a display on llvmpipe through an EGL surfaceless pbuffer.
+skipped when no EGL context can be made
+
+the platform has to be picked before anything imports OpenGL, so this skips when another test module got there first
+"""
+import os
+import ctypes
+import unittest
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+
+import numpy as np
+from OpenGL import GL
+
+from mocap_browser import fbx_gl_utils
+from mocap_browser.anim_source import AnimationSource
+from mocap_browser.anim_data import BakedAnimation
+
+IMAGE_SIZE = 64
+# world units across the image, centered on the origin
+VIEW_SIZE = 20.0
+
+
+def create_context():
+    """(display, surface, context) of a current compatibility profile context, None when there's no EGL"""
+    try:
+        from OpenGL import EGL, platform
+        # PyOpenGL keeps the platform of whatever imported it first
+        if "EGL" not in type(platform.PLATFORM).__name__:
+            return None
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not display or not EGL.eglInitialize(display, None, None):
+            return None
+
+        config_attribs = (EGL.EGLint * 13)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_ALPHA_SIZE, 8,
+            EGL.EGL_NONE,
+        )
+        config = EGL.EGLConfig()
+        config_count = EGL.EGLint()
+        if not EGL.eglChooseConfig(display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(config_count)):
+            return None
+        if not config_count.value:
+            return None
+
+        surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, IMAGE_SIZE, EGL.EGL_HEIGHT, IMAGE_SIZE, EGL.EGL_NONE)
+        surface = EGL.eglCreatePbufferSurface(display, config, surface_attribs)
+        # the renderers use the fixed function pipeline, so it has to be desktop GL and not GLES
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+        if not surface or not context or not EGL.eglMakeCurrent(display, surface, surface, context):
+            return None
+    except Exception:
+        return None
+    return display, surface, context
+
+
+def create_source(positions, start_frame=1):
+    """AnimationSource with a loaded chain of joints, positions are (frames, joints, 3)"""
+    positions = np.array(positions, dtype=np.float32)
+    joint_count = positions.shape[1]
+    baked = BakedAnimation(
+        joint_names=[f"joint{i}" for i in range(joint_count)],
+        parent_indices=[-1] + list(range(joint_count - 1)),
+        positions=positions,
+        start_frame=start_frame,
+        fps=30.0,
+    )
+    source = AnimationSource()
+    source.load_baked("take.fbx", baked)
+    return source
+
+
+def get_buffer_size(buffer):
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer)
+    size = GL.glGetBufferParameteriv(GL.GL_ARRAY_BUFFER, GL.GL_BUFFER_SIZE)
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    return int(size)
+
+
+class GlTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gl_context = create_context()
+        if cls.gl_context is None:
+            raise unittest.SkipTest("needs an EGL surfaceless context, e.g. Mesa llvmpipe")
+
+    @classmethod
+    def tearDownClass(cls):
+        from OpenGL import EGL
+        display, surface, context = cls.gl_context
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(display, context)
+        EGL.eglDestroySurface(display, surface)
+
+    def setUp(self):
+        GL.glViewport(0, 0, IMAGE_SIZE, IMAGE_SIZE)
+        GL.glMatrixMode(GL.GL_PROJECTION)
+        GL.glLoadIdentity()
+        GL.glOrtho(-VIEW_SIZE / 2, VIEW_SIZE / 2, -VIEW_SIZE / 2, VIEW_SIZE / 2, -100.0, 100.0)
+        GL.glMatrixMode(GL.GL_MODELVIEW)
+        GL.glLoadIdentity()
+        self.clear()
+
+    def tearDown(self):
+        # every call a test made has to have left the context without errors
+        self.assertEqual(GL.glGetError(), GL.GL_NO_ERROR)
+
+    def clear(self):
+        GL.glClearColor(0.0, 0.0, 0.0, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+    def read_image(self):
+        """(rows, columns, rgba) uint8 image, row 0 is the bottom of the view"""
+        GL.glFinish()
+        pixels = GL.glReadPixels(0, 0, IMAGE_SIZE, IMAGE_SIZE, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(IMAGE_SIZE, IMAGE_SIZE, 4)
+
+    def is_lit(self, image, x, y):
+        """anything drawn within a pixel of the world position x, y"""
+        column = int((x / VIEW_SIZE + 0.5) * IMAGE_SIZE)
+        row = int((y / VIEW_SIZE + 0.5) * IMAGE_SIZE)
+        return bool(image[row - 1:row + 2, column - 1:column + 2, :3].any())
+
+
+class TestSkeletonRenderer(GlTestCase):
+
+    def setUp(self):
+        super(TestSkeletonRenderer, self).setUp()
+        # one bone, lying along x on the first frame and standing along y on the second
+        self.source = create_source([
+            [(-5.0, 0.1, 0.0), (5.0, 0.1, 0.0)],
+            [(0.1, -5.0, 0.0), (0.1, 5.0, 0.0)],
+        ])
+        self.renderer = fbx_gl_utils.SkeletonRenderer(self.source)
+        self.addCleanup(self.renderer.release)
+
+    def test_upload(self):
+        self.assertTrue(GL.glIsBuffer(self.renderer.vertex_buffer))
+        self.assertTrue(GL.glIsBuffer(self.renderer.index_buffer))
+        self.assertEqual(get_buffer_size(self.renderer.vertex_buffer), self.source.baked.positions.nbytes)
+        self.assertEqual(self.renderer.index_count, 2)
+
+    def test_draw_each_frame(self):
+        self.renderer.draw(1)
+        image = self.read_image()
+        self.assertTrue(self.is_lit(image, -3.0, 0.1))
+        self.assertFalse(self.is_lit(image, 0.1, -3.0))
+
+        self.clear()
+        self.renderer.draw(2)
+        image = self.read_image()
+        self.assertFalse(self.is_lit(image, -3.0, 0.1))
+        self.assertTrue(self.is_lit(image, 0.1, -3.0))
+
+    def test_hidden_joints_rebuild_the_bones(self):
+        self.source.set_joints_visible(["joint1"], False)
+        self.renderer.draw(1)
+        self.assertEqual(self.renderer.index_count, 0)
+        self.assertFalse(self.read_image()[:, :, :3].any())
+
+        self.source.set_joints_visible(["joint1"], True)
+        self.renderer.draw(1)
+        self.assertEqual(self.renderer.index_count, 2)
+        self.assertTrue(self.is_lit(self.read_image(), -3.0, 0.1))
+
+    def test_ghosts_and_trails(self):
+        self.renderer.draw_ghosts(1, ghost_count=2)
+        self.renderer.draw_trails(1, frame_window=1)
+        self.assertTrue(self.read_image()[:, :, :3].any())
+
+    def test_release(self):
+        vertex_buffer = self.renderer.vertex_buffer
+        index_buffer = self.renderer.index_buffer
+        self.renderer.release()
+        self.assertFalse(GL.glIsBuffer(vertex_buffer))
+        self.assertFalse(GL.glIsBuffer(index_buffer))
+        self.assertIsNone(self.renderer.vertex_buffer)
+        self.assertEqual(self.renderer.index_count, 0)
+
+        # released renderers draw nothing
+        self.renderer.draw(1)
+        self.renderer.release()
+        self.assertFalse(self.read_image()[:, :, :3].any())
+
+
+class TestTrajectoryRenderer(GlTestCase):
+
+    def setUp(self):
+        super(TestTrajectoryRenderer, self).setUp()
+        # the root walks along x at a steady speed
+        root_x = np.linspace(-8.0, 8.0, 33)
+        self.source = create_source([[(x, 1.0, 0.0)] for x in root_x])
+        self.renderer = fbx_gl_utils.TrajectoryRenderer(self.source)
+        self.addCleanup(self.renderer.release)
+
+    def test_upload(self):
+        self.assertEqual(self.renderer.path_vertex_count, 33)
+        self.assertGreater(self.renderer.marker_vertex_count, 0)
+        vertex_count = self.renderer.path_vertex_count + self.renderer.marker_vertex_count
+        self.assertEqual(get_buffer_size(self.renderer.vertex_buffer), vertex_count * 6 * 4)
+
+    def test_draw(self):
+        self.renderer.draw()
+        image = self.read_image()
+        # flattened onto the ground, y is 0
+        self.assertTrue(self.is_lit(image, -6.0, 0.0))
+        self.assertTrue(self.is_lit(image, 6.0, 0.0))
+        self.assertFalse(self.is_lit(image, 0.0, 5.0))
+        # a steady walk is the clip's top speed all the way, red
+        row = IMAGE_SIZE // 2
+        colors = image[row - 1:row + 2].reshape(-1, 4)[:, :3]
+        self.assertTrue(((colors[:, 0] > 200) & (colors[:, 2] < 50)).any())
+
+    def test_release(self):
+        vertex_buffer = self.renderer.vertex_buffer
+        self.renderer.release()
+        self.assertFalse(GL.glIsBuffer(vertex_buffer))
+        self.renderer.draw()
+        self.assertFalse(self.read_image()[:, :, :3].any())
+
+
+if __name__ == "__main__":
+    unittest.main()
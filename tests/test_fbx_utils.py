@@ -0,0 +1,108 @@
+"""
+Needs the FBX Python SDK, skipped without it
+
+writes a dense per-frame mocap take through the SDK and bakes it both ways with compare_with_sdk
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    import fbx
+    from mocap_browser import fbx_utils
+except ImportError:
+    fbx = None
+
+# a full body skeleton keyed on every frame
+JOINT_COUNT = 70
+FRAME_COUNT = 2000
+
+
+def get_enum(owner, enum_name, value_name):
+    """SDK enum values moved into nested classes between SDK versions"""
+    enum = getattr(owner, enum_name, None)
+    return getattr(enum, value_name) if enum is not None and hasattr(enum, value_name) else getattr(owner, value_name)
+
+
+def add_keys(fbx_property, anim_layer, axis, values):
+    fbx_curve = fbx_property.GetCurve(anim_layer, axis, True)
+    interpolation = get_enum(fbx.FbxAnimCurveDef, "EInterpolationType", "eInterpolationLinear")
+    fbx_time = fbx.FbxTime()
+    fbx_curve.KeyModifyBegin()
+    for frame, value in enumerate(values):
+        fbx_time.SetFrame(frame)
+        key_index = fbx_curve.KeyAdd(fbx_time)[0]
+        fbx_curve.KeySetValue(key_index, float(value))
+        fbx_curve.KeySetInterpolation(key_index, interpolation)
+    fbx_curve.KeyModifyEnd()
+
+
+def write_mocap_take(file_path, joint_count=JOINT_COUNT, frame_count=FRAME_COUNT):
+    """a chain of joints with rotation keys on every frame, the root also translates"""
+    manager, scene = fbx_utils.InitializeSdkObjects()
+    anim_stack = fbx.FbxAnimStack.Create(scene, "Take 001")
+    anim_layer = fbx.FbxAnimLayer.Create(scene, "Base Layer")
+    anim_stack.AddMember(anim_layer)
+    stop_time = fbx.FbxTime()
+    stop_time.SetFrame(frame_count - 1)
+    anim_stack.SetLocalTimeSpan(fbx.FbxTimeSpan(fbx.FbxTime(0), stop_time))
+
+    rng = np.random.default_rng(0)
+    parent_node = scene.GetRootNode()
+    for joint_index in range(joint_count):
+        skeleton = fbx.FbxSkeleton.Create(scene, f"joint{joint_index}")
+        skeleton_type = "eRoot" if joint_index == 0 else "eLimbNode"
+        skeleton.SetSkeletonType(get_enum(fbx.FbxSkeleton, "EType", skeleton_type))
+        node = fbx.FbxNode.Create(scene, f"joint{joint_index}")
+        node.SetNodeAttribute(skeleton)
+        node.LclTranslation.Set(fbx.FbxDouble3(0.0, 0.0 if joint_index == 0 else 5.0, 0.0))
+        parent_node.AddChild(node)
+
+        # smooth random motion, like a capture
+        for axis in "XYZ":
+            add_keys(node.LclRotation, anim_layer, axis, np.cumsum(rng.normal(0.0, 0.5, frame_count)))
+        if joint_index == 0:
+            for axis in "XYZ":
+                add_keys(node.LclTranslation, anim_layer, axis, np.cumsum(rng.normal(0.0, 1.0, frame_count)))
+        parent_node = node
+
+    exporter = fbx.FbxExporter.Create(manager, "")
+    exporter.Initialize(file_path, -1, manager.GetIOSettings())
+    exporter.Export(scene)
+    exporter.Destroy()
+    manager.Destroy()
+
+
+@unittest.skipIf(fbx is None, "needs the FBX Python SDK")
+class TestCompareWithSdk(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_folder = tempfile.mkdtemp()
+        cls.file_path = os.path.join(cls.temp_folder, "take.fbx")
+        write_mocap_take(cls.file_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_folder, True)
+
+    def test_fk_matches_the_sdk_and_is_faster(self):
+        fk_time, sdk_time, max_error = fbx_utils.compare_with_sdk(self.file_path)
+        self.assertLess(max_error, 1e-2)
+        # every frame of every joint is keyed, the worst case for reading the curves
+        self.assertLess(fk_time * 2, sdk_time)
+
+    def test_dense_skeleton_bakes_through_fk(self):
+        handler = fbx_utils.FbxHandler()
+        handler.bake_fk_positions = mock.Mock(wraps=handler.bake_fk_positions)
+        baked = handler.bake_file(self.file_path)
+        handler.bake_fk_positions.assert_called_once()
+        self.assertEqual(baked.positions.shape, (FRAME_COUNT, JOINT_COUNT, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Headless tests, only need the standard library
+
+the throttled tests stand in for a network share, where listing a directory mostly waits on the server
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mocap_browser import file_crawler
+
+# seconds every directory listing takes in the throttled tests
+LIST_DIR_DELAY = 0.02
+
+
+def write_file(file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as fp:
+        fp.write("")
+
+
+def create_tree(root, dir_count=4, files_per_dir=3):
+    """root/dirN/subN/takeN.fbx plus a .txt file per directory, returns the .fbx paths"""
+    file_paths = []
+    for i in range(dir_count):
+        for dir_path in (os.path.join(root, f"dir{i}"), os.path.join(root, f"dir{i}", f"sub{i}")):
+            for j in range(files_per_dir):
+                file_paths.append(os.path.join(dir_path, f"take{j}.fbx"))
+                write_file(file_paths[-1])
+            write_file(os.path.join(dir_path, "notes.txt"))
+    return sorted(file_paths)
+
+
+original_list_dir = file_crawler.list_dir
+
+
+def throttled_list_dir(*args, **kwargs):
+    time.sleep(LIST_DIR_DELAY)
+    return original_list_dir(*args, **kwargs)
+
+
+class TestCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.fbx_paths = create_tree(self.root)
+
+    def test_finds_every_file(self):
+        stats = file_crawler.CrawlStats()
+        file_paths = sorted(file_crawler.iter_folder_files(self.root, [".fbx"], stats=stats))
+        self.assertEqual(file_paths, self.fbx_paths)
+        self.assertEqual(stats.dir_count, 9)
+        # the .txt files are left out while listing
+        self.assertEqual(stats.file_count, len(self.fbx_paths))
+        self.assertIsNotNone(stats.end_time)
+
+    def test_list_dir(self):
+        dir_listing = file_crawler.list_dir(os.path.join(self.root, "dir0"), stat_files=True)
+        self.assertEqual(dir_listing.dir_paths, [os.path.join(self.root, "dir0", "sub0")])
+        file_names = sorted(entry.name for entry in dir_listing.file_entries)
+        self.assertEqual(file_names, ["notes.txt", "take0.fbx", "take1.fbx", "take2.fbx"])
+        self.assertEqual(len(dir_listing.file_stats), len(dir_listing.file_entries))
+        self.assertEqual(dir_listing.mtime_ns, os.stat(os.path.join(self.root, "dir0")).st_mtime_ns)
+
+    def test_extensions_are_filtered_before_stat(self):
+        dir_path = os.path.join(self.root, "dir0")
+        dir_listing = file_crawler.list_dir(dir_path, stat_files=True, file_extensions=[".fbx"])
+        file_names = sorted(entry.name for entry in dir_listing.file_entries)
+        self.assertEqual(file_names, ["take0.fbx", "take1.fbx", "take2.fbx"])
+        self.assertEqual(len(dir_listing.file_stats), 3)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_symlinked_folders_are_followed(self):
+        try:
+            os.symlink(os.path.join(self.root, "dir0"), os.path.join(self.root, "linked"), target_is_directory=True)
+            # pointing back up would crawl forever
+            os.symlink(self.root, os.path.join(self.root, "dir1", "loop"), target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest("can't create symlinks")
+
+        file_paths = sorted(file_crawler.iter_folder_files(self.root, [".fbx"]))
+        linked_paths = [os.path.join(self.root, "linked", os.path.relpath(path, os.path.join(self.root, "dir0")))
+                        for path in self.fbx_paths if path.startswith(os.path.join(self.root, "dir0", ""))]
+        self.assertEqual(file_paths, sorted(self.fbx_paths + linked_paths))
+
+    def test_descend_filter(self):
+        dir_listings = file_crawler.iter_dir_listings([self.root], descend_filter=lambda dir_path: "dir0" in dir_path)
+        listed_dir_paths = sorted(dir_listing.dir_path for dir_listing in dir_listings)
+        self.assertEqual(listed_dir_paths, [self.root, os.path.join(self.root, "dir0"), os.path.join(self.root, "dir0", "sub0")])
+
+    def test_unreadable_directories_are_skipped(self):
+        stats = file_crawler.CrawlStats()
+        missing_path = os.path.join(self.root, "missing")
+        self.assertEqual(list(file_crawler.iter_dir_listings([missing_path], stats=stats)), [])
+        self.assertEqual(stats.error_count, 1)
+
+
+class TestThrottledCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.fbx_paths = create_tree(self.root, dir_count=16, files_per_dir=1)
+
+        patcher = mock.patch.object(file_crawler, "list_dir", throttled_list_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def crawl(self, max_workers):
+        stats = file_crawler.CrawlStats()
+        file_paths = sorted(file_crawler.iter_folder_files(self.root, [".fbx"], max_workers=max_workers, stats=stats))
+        self.assertEqual(file_paths, self.fbx_paths)
+        return stats
+
+    def test_parallel_listing_is_faster(self):
+        serial_stats = self.crawl(max_workers=1)
+        parallel_stats = self.crawl(max_workers=file_crawler.CRAWL_THREAD_COUNT)
+        # 33 directories, 3 levels deep, so at best about 3 listing delays in parallel against 33 in a row
+        self.assertGreater(serial_stats.get_elapsed(), parallel_stats.get_elapsed() * 3)
+        self.assertGreater(parallel_stats.get_dirs_per_second(), serial_stats.get_dirs_per_second() * 3)
+
+    def test_stopping_early_skips_the_rest(self):
+        stats = file_crawler.CrawlStats()
+        dir_listings = file_crawler.iter_dir_listings([self.root], max_workers=1, stats=stats)
+        next(dir_listings)
+        dir_listings.close()
+        self.assertLess(stats.dir_count, 33)
+        self.assertLess(stats.get_elapsed(), LIST_DIR_DELAY * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
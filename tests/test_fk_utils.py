@@ -0,0 +1,109 @@
+"""
+Headless tests, only need numpy
+
+positions are compared against hand solved chains within float32 tolerance
+"""
+import unittest
+
+import numpy as np
+
+from mocap_browser import fk_utils
+from mocap_browser import anim_curves
+
+
+def constant(value):
+    return fk_utils.ConstantChannel(value)
+
+
+def rotation_z_channel(frames, degrees_per_frame):
+    """CurveVectorChannel rotating around Z by degrees_per_frame"""
+    frames = np.asarray(frames, dtype=float)
+    curve = anim_curves.AnimCurve(frames, frames * degrees_per_frame)
+    return anim_curves.CurveVectorChannel((0, 0, 0), [None, None, curve])
+
+
+class TestRotations(unittest.TestCase):
+
+    def test_rotation_order(self):
+        # X 90 then Y 90, applied in that order to the point (0, 1, 0)
+        matrix = fk_utils.euler_to_matrices([(90, 90, 0)], "XYZ")[0]
+        np.testing.assert_allclose(matrix @ (0, 1, 0), (1, 0, 0), atol=1e-12)
+
+        # Y first leaves (0, 1, 0) alone, X then takes it to +Z
+        matrix = fk_utils.euler_to_matrices([(90, 90, 0)], "YXZ")[0]
+        np.testing.assert_allclose(matrix @ (0, 1, 0), (0, 0, 1), atol=1e-12)
+
+
+class TestComputeGlobalPositions(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = np.arange(0, 91)
+        self.joints = [
+            fk_utils.FkJoint(-1, constant((0, 0, 0)), rotation_z_channel(self.frames, 1.0), constant((1, 1, 1))),
+            fk_utils.FkJoint(0, constant((2, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1))),
+        ]
+
+    def test_rotating_chain(self):
+        positions = fk_utils.compute_global_positions(self.joints, self.frames)
+        radians = np.radians(self.frames)
+        expected = np.stack((2 * np.cos(radians), 2 * np.sin(radians), np.zeros(len(radians))), axis=1)
+        np.testing.assert_allclose(positions[:, 0], 0.0, atol=1e-6)
+        np.testing.assert_allclose(positions[:, 1], expected, atol=1e-5)
+
+    def test_chunks_match(self):
+        whole = fk_utils.compute_global_positions(self.joints, self.frames, chunk_size=4096)
+        chunked = fk_utils.compute_global_positions(self.joints, self.frames, chunk_size=7)
+        np.testing.assert_array_equal(whole, chunked)
+
+    def test_output_indices(self):
+        positions = fk_utils.compute_global_positions(self.joints, self.frames, output_indices=[1])
+        self.assertEqual(positions.shape, (len(self.frames), 1, 3))
+
+    def test_progress_callback(self):
+        progress = []
+        fk_utils.compute_global_positions(self.joints, self.frames, chunk_size=10, progress_callback=progress.append)
+        self.assertTrue(progress)
+        self.assertEqual(progress, sorted(progress))
+        self.assertTrue(all(0.0 <= value <= 1.0 for value in progress))
+
+    def test_raising_from_progress_callback_stops(self):
+        progress = []
+
+        def cancel_after_first_chunk(value):
+            progress.append(value)
+            if value >= 0.5:
+                raise RuntimeError("cancelled")
+
+        with self.assertRaises(RuntimeError):
+            fk_utils.compute_global_positions(self.joints, self.frames, chunk_size=50, progress_callback=cancel_after_first_chunk)
+        self.assertLess(progress[-1], 0.6)
+
+    def test_pre_rotation(self):
+        joints = [
+            fk_utils.FkJoint(-1, constant((0, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1)), pre_rotation=(0, 0, 90)),
+            fk_utils.FkJoint(0, constant((1, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1))),
+        ]
+        positions = fk_utils.compute_global_positions(joints, [0])
+        np.testing.assert_allclose(positions[0, 1], (0, 1, 0), atol=1e-6)
+
+    def test_inherit_scale(self):
+        parent = fk_utils.FkJoint(-1, constant((0, 0, 0)), constant((0, 0, 0)), constant((2, 2, 2)))
+        child = fk_utils.FkJoint(0, constant((1, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1)))
+        grandchild = fk_utils.FkJoint(1, constant((1, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1)))
+        positions = fk_utils.compute_global_positions([parent, child, grandchild], [0])
+        np.testing.assert_allclose(positions[0, 1], (2, 0, 0), atol=1e-6)
+        np.testing.assert_allclose(positions[0, 2], (4, 0, 0), atol=1e-6)
+
+    def test_segment_scale_compensate(self):
+        # the child is still placed in the parent's scaled space,
+        # but the parent's scale isn't inherited by the child's children
+        parent = fk_utils.FkJoint(-1, constant((0, 0, 0)), constant((0, 0, 0)), constant((2, 2, 2)))
+        child = fk_utils.FkJoint(0, constant((1, 0, 0)), constant((0, 0, 90)), constant((1, 1, 1)), inherit_scale=False)
+        grandchild = fk_utils.FkJoint(1, constant((1, 0, 0)), constant((0, 0, 0)), constant((1, 1, 1)))
+        positions = fk_utils.compute_global_positions([parent, child, grandchild], [0])
+        np.testing.assert_allclose(positions[0, 1], (2, 0, 0), atol=1e-6)
+        np.testing.assert_allclose(positions[0, 2], (2, 1, 0), atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
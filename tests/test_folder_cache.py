@@ -0,0 +1,141 @@
+"""
+Headless tests, only need the standard library
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from mocap_browser import folder_cache
+
+
+def write_file(file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as fp:
+        fp.write("")
+
+
+def bump_mtime(dir_path):
+    """file systems with coarse timestamps can leave a changed directory with the same mtime"""
+    dir_stat = os.stat(dir_path)
+    os.utime(dir_path, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns + 10 ** 9))
+
+
+def get_all_changes(folder_listing):
+    added_paths = []
+    removed_paths = []
+    for added, removed in folder_listing.iter_changes():
+        added_paths.extend(added)
+        removed_paths.extend(removed)
+    return sorted(added_paths), sorted(removed_paths)
+
+
+class TestFolderListing(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.file_paths = [
+            os.path.join(self.root, "idle.fbx"),
+            os.path.join(self.root, "walk", "run_01.fbx"),
+            os.path.join(self.root, "walk", "slow", "run_02.fbx"),
+        ]
+        for file_path in self.file_paths:
+            write_file(file_path)
+
+        self.folder_listing = folder_cache.FolderListing(self.root)
+        get_all_changes(self.folder_listing)
+
+    def test_first_crawl_adds_everything(self):
+        folder_listing = folder_cache.FolderListing(self.root)
+        self.assertEqual(get_all_changes(folder_listing), (sorted(self.file_paths), []))
+        self.assertEqual(sorted(folder_listing.iter_file_paths()), sorted(self.file_paths))
+        self.assertEqual(len(folder_listing.dirs), 3)
+
+    def test_unchanged_folder_has_no_changes(self):
+        self.assertEqual(get_all_changes(self.folder_listing), ([], []))
+
+    def test_added_and_removed_files(self):
+        added_path = os.path.join(self.root, "walk", "slow", "run_03.fbx")
+        write_file(added_path)
+        os.remove(self.file_paths[1])
+        bump_mtime(os.path.join(self.root, "walk"))
+        bump_mtime(os.path.join(self.root, "walk", "slow"))
+
+        self.assertEqual(get_all_changes(self.folder_listing), ([added_path], [self.file_paths[1]]))
+
+    def test_new_directory_is_crawled(self):
+        added_path = os.path.join(self.root, "jog", "deep", "jog_01.fbx")
+        write_file(added_path)
+        bump_mtime(self.root)
+
+        self.assertEqual(get_all_changes(self.folder_listing), ([added_path], []))
+
+    def test_removed_directory_removes_its_files(self):
+        shutil.rmtree(os.path.join(self.root, "walk"))
+        bump_mtime(self.root)
+
+        self.assertEqual(get_all_changes(self.folder_listing), ([], sorted(self.file_paths[1:])))
+        self.assertEqual(list(self.folder_listing.dirs), [self.root])
+
+    def test_removed_root_removes_everything(self):
+        shutil.rmtree(self.root)
+        self.assertEqual(get_all_changes(self.folder_listing), ([], sorted(self.file_paths)))
+        self.assertEqual(self.folder_listing.dirs, {})
+
+    def test_file_stats(self):
+        cached_dir = self.folder_listing.dirs[self.root]
+        file_stat = os.stat(self.file_paths[0])
+        self.assertEqual(cached_dir.files["idle.fbx"], [file_stat.st_size, file_stat.st_mtime_ns])
+
+        folder_listing = folder_cache.FolderListing(self.root, stat_files=False)
+        get_all_changes(folder_listing)
+        self.assertIsNone(folder_listing.dirs[self.root].files["idle.fbx"])
+
+
+class TestFolderListingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_folder, True)
+        self.root = os.path.join(self.temp_folder, "capture")
+        write_file(os.path.join(self.root, "walk", "run_01.fbx"))
+        self.listing_cache = folder_cache.FolderListingCache(os.path.join(self.temp_folder, "cache"))
+
+    def test_round_trip(self):
+        folder_listing = folder_cache.FolderListing(self.root)
+        get_all_changes(folder_listing)
+        self.listing_cache.save(folder_listing)
+
+        loaded_listing = self.listing_cache.load(self.root)
+        self.assertEqual(sorted(loaded_listing.iter_file_paths()), sorted(folder_listing.iter_file_paths()))
+        self.assertEqual(get_all_changes(loaded_listing), ([], []))
+
+    def test_listings_of_other_file_types_are_kept_apart(self):
+        write_file(os.path.join(self.root, "walk", "run_02.bvh"))
+        folder_listing = folder_cache.FolderListing(self.root, file_extensions=[".fbx"])
+        get_all_changes(folder_listing)
+        self.listing_cache.save(folder_listing)
+
+        self.assertEqual(self.listing_cache.load(self.root, [".bvh"]).dirs, {})
+        loaded_listing = self.listing_cache.load(self.root, [".fbx"])
+        self.assertEqual(list(loaded_listing.iter_file_paths()), [os.path.join(self.root, "walk", "run_01.fbx")])
+
+    def test_never_cached(self):
+        self.assertEqual(self.listing_cache.load(self.root).dirs, {})
+
+    def test_unreadable_or_old_listing_is_empty(self):
+        cache_path = self.listing_cache.get_cache_path(self.root)
+        os.makedirs(os.path.dirname(cache_path))
+        with open(cache_path, "w") as fp:
+            fp.write("{")
+        self.assertEqual(self.listing_cache.load(self.root).dirs, {})
+
+        with open(cache_path, "w") as fp:
+            json.dump({"version": folder_cache.CACHE_VERSION - 1, "root_path": self.root, "dirs": {}}, fp)
+        self.assertEqual(self.listing_cache.load(self.root).dirs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
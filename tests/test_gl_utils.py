@@ -0,0 +1,117 @@
+"""
+Headless tests for the numpy parts of gl_utils, need PyOpenGL installed but no GL context
+"""
+import math
+import unittest
+
+import numpy as np
+
+from mocap_browser.gl_utils import camera
+from mocap_browser.gl_utils import culling
+from mocap_browser.gl_utils import picking
+
+
+def get_perspective(fov_degrees=90.0, aspect=1.0, near=1.0, far=100.0):
+    """gluPerspective style projection, the camera at the origin looking down -Z"""
+    f = 1.0 / math.tan(math.radians(fov_degrees) / 2.0)
+    return np.array((
+        (f / aspect, 0.0, 0.0, 0.0),
+        (0.0, f, 0.0, 0.0),
+        (0.0, 0.0, (far + near) / (near - far), 2.0 * far * near / (near - far)),
+        (0.0, 0.0, -1.0, 0.0),
+    ))
+
+
+class TestCulling(unittest.TestCase):
+
+    def setUp(self):
+        self.planes = culling.get_frustum_planes(get_perspective())
+
+    def get_visible(self, centers, half_size=0.5):
+        centers = np.asarray(centers, dtype=np.float64)
+        return culling.get_boxes_in_frustum(self.planes, centers - half_size, centers + half_size).tolist()
+
+    def test_boxes_in_front(self):
+        self.assertEqual(self.get_visible([(0, 0, -10), (5, 5, -10), (-9, 0, -10)]), [True, True, True])
+
+    def test_boxes_outside(self):
+        self.assertEqual(self.get_visible([
+            (0, 0, 10),  # behind
+            (20, 0, -10),  # right
+            (0, -20, -10),  # below
+            (0, 0, -0.2),  # before the near plane
+            (0, 0, -200),  # past the far plane
+        ]), [False] * 5)
+
+    def test_box_straddling_a_plane(self):
+        self.assertEqual(self.get_visible([(10.2, 0, -10)]), [True])
+        self.assertEqual(self.get_visible([(0, 0, -100.3)]), [True])
+
+    def test_no_boxes(self):
+        self.assertEqual(culling.get_boxes_in_frustum(self.planes, np.empty((0, 3)), np.empty((0, 3))).shape, (0,))
+
+
+class TestPicking(unittest.TestCase):
+
+    def setUp(self):
+        self.view_projection = get_perspective()
+
+    def test_project_points(self):
+        points = [(0, 0, -10), (10, 10, -10), (-5, 0, -10), (0, 0, 10)]
+        screen_points, in_front = picking.project_points(self.view_projection, points, 200, 100)
+        np.testing.assert_allclose(screen_points[:3], [(100, 50), (200, 0), (50, 50)], atol=1e-9)
+        self.assertEqual(in_front.tolist(), [True, True, True, False])
+
+    def test_nearest_point(self):
+        screen_points = np.array([(10.0, 10.0), (50.0, 50.0), (53.0, 50.0)])
+        in_front = np.array([True, True, True])
+        self.assertEqual(picking.get_nearest_point_index(screen_points, in_front, 52, 50), 2)
+        self.assertEqual(picking.get_nearest_point_index(screen_points, in_front, 12, 10), 0)
+        self.assertEqual(picking.get_nearest_point_index(screen_points, in_front, 100, 100), -1)
+
+    def test_points_behind_are_ignored(self):
+        screen_points, in_front = picking.project_points(self.view_projection, [(0, 0, 10), (1, 0, -10)], 100, 100)
+        self.assertEqual(picking.get_nearest_point_index(screen_points, in_front, 50, 50), 1)
+
+    def test_no_points(self):
+        self.assertEqual(picking.get_nearest_point_index(np.empty((0, 2)), np.empty(0, dtype=bool), 0, 0), -1)
+
+
+class TestFrameBounds(unittest.TestCase):
+
+    def get_framed_points(self, width, height):
+        view_camera = camera.Camera()
+        view_camera.reset(0.0, 0.0, 10.0)
+        view_camera.setViewportDimensions(width, height)
+        view_camera.frameBounds((-1, -1, -1), (1, 1, 1), margin=1.0)
+        # the bounding sphere, seen side on
+        radius = math.sqrt(3.0)
+        points = [(radius, 0, 0), (-radius, 0, 0), (0, radius, 0), (0, -radius, 0)]
+        screen_points, in_front = picking.project_points(view_camera.get_view_projection_matrix(), points, width, height)
+        self.assertTrue(in_front.all())
+        return screen_points
+
+    def test_landscape_fits_the_height(self):
+        screen_points = self.get_framed_points(200, 100)
+        self.assertTrue(np.all((screen_points >= 0) & (screen_points <= (200, 100))))
+        self.assertGreater(np.ptp(screen_points[:, 1]), 80)
+
+    def test_portrait_fits_the_width(self):
+        screen_points = self.get_framed_points(100, 200)
+        self.assertTrue(np.all((screen_points >= 0) & (screen_points <= (100, 200))))
+        self.assertGreater(np.ptp(screen_points[:, 0]), 80)
+
+    def test_reset_restores_the_clip_planes(self):
+        view_camera = camera.Camera()
+        view_camera.reset(0.0, 0.0, 10.0)
+        view_camera.frameBounds((-0.1, -0.1, -0.1), (0.1, 0.1, 0.1))
+        self.assertLess(view_camera.nearPlane, 1.0)
+
+        projection = view_camera.get_projection_matrix()
+        view_camera.reset(0.0, 0.0, 10.0)
+        self.assertEqual((view_camera.nearPlane, view_camera.farPlane), (1.0, 10000.0))
+        self.assertFalse(np.array_equal(view_camera.get_projection_matrix(), projection))
+
+
+if __name__ == "__main__":
+    unittest.main()
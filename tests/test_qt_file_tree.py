@@ -0,0 +1,261 @@
+"""
+Needs PySide2, runs without a display through the offscreen platform
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from mocap_browser import qt_file_tree
+from mocap_browser.ui_utils import QtCore, QtWidgets
+
+
+class PlainFolderConfig(object):
+    """the parts of a FolderConfig the model reads, without the icons"""
+
+    def __init__(self, dir_path, top_folder_name=""):
+        self.dir_path = dir_path
+        self.top_folder_name = top_folder_name
+
+
+def get_shown_paths(model, node_mask):
+    return sorted(model.get_relative_path(node).replace("\\", "/") for node in range(len(node_mask)) if node_mask[node])
+
+
+def get_file_paths(model, node=0):
+    """every file path in the model, fetched or not"""
+    file_paths = []
+    for child_node in model.get_child_nodes(node):
+        if model.is_folder(child_node):
+            file_paths.extend(get_file_paths(model, child_node))
+        else:
+            file_paths.append(model.get_full_path(child_node))
+    return sorted(file_paths)
+
+
+def get_row_names(proxy, parent=None):
+    parent = parent or QtCore.QModelIndex()
+    return sorted(proxy.index(row, 0, parent).data() for row in range(proxy.rowCount(parent)))
+
+
+def wait_until(condition, timeout=5.0):
+    """run the event loop until condition() is true, so worker signals and watcher events are delivered"""
+    end_time = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > end_time:
+            return False
+        QtWidgets.QApplication.processEvents()
+        time.sleep(0.01)
+    return True
+
+
+def write_file(file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as fp:
+        fp.write("")
+
+
+class TestFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.abspath("capture")
+        self.folder_config = PlainFolderConfig(self.root)
+        self.model = qt_file_tree.FileTreeModel()
+        self.model.add_paths([
+            os.path.join(self.root, "walk", "run_01.fbx"),
+            os.path.join(self.root, "walk", "idle.fbx"),
+            os.path.join(self.root, "jog", "run_02.fbx"),
+            os.path.join(self.root, "jog", "stop.fbx"),
+        ], self.folder_config)
+
+    def filter(self, pattern):
+        return get_shown_paths(self.model, self.model.add_ancestor_nodes(self.model.find_matching_nodes(pattern)))
+
+    def test_matches_relative_paths(self):
+        self.assertEqual(self.filter("walk/.*run"), ["walk", "walk/run_01.fbx"])
+
+    def test_folder_name_shows_its_files(self):
+        self.assertEqual(self.filter("jog"), ["jog", "jog/run_02.fbx", "jog/stop.fbx"])
+
+    def test_anchored_to_each_path(self):
+        self.assertEqual(self.filter("^run"), [])
+        self.assertEqual(self.filter(r"run_\d+\.fbx$"), ["jog", "jog/run_02.fbx", "walk", "walk/run_01.fbx"])
+
+    def test_matches_dont_run_into_the_next_path(self):
+        self.assertEqual(self.filter(r"fbx\s"), [])
+        self.assertEqual(self.filter(r"idle[^x]*stop"), [])
+
+    def test_new_nodes_only(self):
+        first_node = len(self.model.find_matching_nodes("run"))
+        self.model.add_paths([os.path.join(self.root, "walk", "run_03.fbx")], self.folder_config)
+        self.assertEqual(list(self.model.find_matching_nodes("run", first_node)), [True])
+
+
+class TestFilterUpdates(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.abspath("capture")
+        self.folder_config = PlainFolderConfig(self.root)
+        # the proxy is parented to the model, the model needs a parent to go away cleanly
+        self.owner = QtCore.QObject()
+        self.model = qt_file_tree.FileTreeModel(self.owner)
+        self.proxy = qt_file_tree.FileTreeSortProxyModel(self.model)
+        self.add_paths("walk/run_01.fbx", "jog/stop.fbx")
+        self.proxy.set_filter_text("run")
+
+    def add_paths(self, *relative_paths):
+        self.model.add_paths([os.path.join(self.root, *path.split("/")) for path in relative_paths], self.folder_config)
+
+    def remove_paths(self, *relative_paths):
+        self.model.remove_paths([os.path.join(self.root, *path.split("/")) for path in relative_paths], self.folder_config)
+
+    def test_new_match_shows_hidden_folder(self):
+        self.assertEqual(get_row_names(self.proxy), ["walk"])
+        self.add_paths("jog/run_02.fbx")
+        self.assertEqual(get_row_names(self.proxy), ["jog", "walk"])
+
+    def test_new_rows_are_filtered(self):
+        self.add_paths("idle.fbx", "run_03.fbx", "sprint/run_04.fbx", "sprint/stop.fbx")
+        self.assertEqual(get_row_names(self.proxy), ["run_03.fbx", "sprint", "walk"])
+
+    def test_folder_without_matches_is_hidden(self):
+        self.add_paths("walk/idle.fbx")
+        self.remove_paths("walk/run_01.fbx")
+        self.assertEqual(get_row_names(self.proxy), [])
+
+    @mock.patch.object(qt_file_tree, "COMPACT_MIN_REMOVED_NODES", 4)
+    def test_removed_nodes_are_compacted(self):
+        self.add_paths("walk/idle.fbx", "sprint/run_03.fbx", "sprint/run_04.fbx", "sprint/stop.fbx")
+        walk_index = self.model.match(self.model.index(0, 0), QtCore.Qt.DisplayRole, "walk")[0]
+        walk_index = QtCore.QPersistentModelIndex(walk_index)
+        self.model.fetchMore(walk_index)
+
+        self.remove_paths("jog/stop.fbx", "sprint/run_03.fbx", "sprint/run_04.fbx", "sprint/stop.fbx")
+        # the root, walk and its two files are left
+        self.assertEqual(self.model.get_node_count(), 4)
+        self.assertEqual(get_file_paths(self.model), sorted([
+            os.path.join(self.root, "walk", "idle.fbx"),
+            os.path.join(self.root, "walk", "run_01.fbx"),
+        ]))
+        self.assertEqual(walk_index.data(), "walk")
+        self.assertEqual(get_row_names(self.proxy), ["walk"])
+        self.assertEqual(get_row_names(self.proxy, self.proxy.mapFromSource(walk_index)), ["run_01.fbx"])
+
+        self.add_paths("jog/run_02.fbx", "jog/stop.fbx")
+        self.assertEqual(get_row_names(self.proxy), ["jog", "walk"])
+        self.proxy.set_filter_text("stop")
+        self.assertEqual(get_row_names(self.proxy), ["jog"])
+
+
+class TestLiveUpdates(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        write_file(os.path.join(self.root, "idle.fbx"))
+        write_file(os.path.join(self.root, "walk", "run_01.fbx"))
+
+        self.tree = qt_file_tree.QtFileTree()
+
+    def tearDown(self):
+        self.tree._reset_tree()
+        self.tree.threadpool.waitForDone()
+        # deleted here on the UI thread, not whenever the garbage collector gets to it
+        self.tree.deleteLater()
+        QtWidgets.QApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+
+    def set_folder(self):
+        self.tree.set_folder(self.root, file_exts=[".fbx"])
+        self.assertTrue(wait_until(lambda: self.tree._watched_dir_configs or self.tree._polled_configs))
+
+    def wait_for_file_paths(self, *relative_paths):
+        expected = sorted(os.path.join(self.root, *relative_path.split("/")) for relative_path in relative_paths)
+        wait_until(lambda: get_file_paths(self.tree.model) == expected)
+        self.assertEqual(get_file_paths(self.tree.model), expected)
+
+    def get_folder_index(self, name):
+        for row in range(self.tree.proxy.rowCount()):
+            index = self.tree.proxy.index(row, 0)
+            if index.data() == name:
+                return index
+        return None
+
+    def test_watches_root_only(self):
+        self.set_folder()
+        self.assertEqual(self.tree.file_watcher.directories(), [self.root])
+
+    def test_added_and_removed_files(self):
+        self.set_folder()
+        write_file(os.path.join(self.root, "run_02.fbx"))
+        write_file(os.path.join(self.root, "notes.txt"))
+        self.wait_for_file_paths("idle.fbx", "run_02.fbx", "walk/run_01.fbx")
+
+        os.remove(os.path.join(self.root, "idle.fbx"))
+        self.wait_for_file_paths("run_02.fbx", "walk/run_01.fbx")
+
+    def test_expanded_folder_is_watched(self):
+        self.set_folder()
+        walk_path = os.path.join(self.root, "walk")
+        self.tree.expand(self.get_folder_index("walk"))
+        self.assertIn(walk_path, self.tree.file_watcher.directories())
+
+        write_file(os.path.join(walk_path, "run_03.fbx"))
+        self.wait_for_file_paths("idle.fbx", "walk/run_01.fbx", "walk/run_03.fbx")
+
+        self.tree.collapse(self.get_folder_index("walk"))
+        self.assertNotIn(walk_path, self.tree.file_watcher.directories())
+
+    def test_expanding_catches_up_on_changes(self):
+        self.set_folder()
+        write_file(os.path.join(self.root, "walk", "run_03.fbx"))
+        self.tree.expand(self.get_folder_index("walk"))
+        self.wait_for_file_paths("idle.fbx", "walk/run_01.fbx", "walk/run_03.fbx")
+
+    def test_network_share_is_polled(self):
+        with mock.patch.object(qt_file_tree, "is_network_path", return_value=True), \
+                mock.patch.object(qt_file_tree, "WATCH_POLL_INTERVAL_MS", 50):
+            self.set_folder()
+            self.assertEqual(self.tree.file_watcher.directories(), [])
+
+            write_file(os.path.join(self.root, "walk", "run_03.fbx"))
+            self.wait_for_file_paths("idle.fbx", "walk/run_01.fbx", "walk/run_03.fbx")
+
+    def test_reset_drops_queued_results(self):
+        other_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_root, True)
+        write_file(os.path.join(other_root, "jog.fbx"))
+
+        # the first crawl is done but its files are still queued for the UI thread
+        self.tree.set_folder(self.root, file_exts=[".fbx"])
+        self.tree.threadpool.waitForDone()
+        self.tree.set_folder(other_root, file_exts=[".fbx"])
+        self.assertTrue(wait_until(lambda: not self.tree._workers))
+        QtWidgets.QApplication.processEvents()
+        self.assertEqual(get_file_paths(self.tree.model), [os.path.join(other_root, "jog.fbx")])
+
+    def test_filter_matches_new_rows(self):
+        self.set_folder()
+        self.tree.set_filter("run")
+        self.assertEqual(get_row_names(self.tree.proxy), ["walk"])
+
+        write_file(os.path.join(self.root, "run_02.fbx"))
+        wait_until(lambda: get_row_names(self.tree.proxy) == ["run_02.fbx", "walk"])
+        self.assertEqual(get_row_names(self.tree.proxy), ["run_02.fbx", "walk"])
+
+        # the folder has nothing left to show once its only match is gone
+        os.remove(os.path.join(self.root, "walk", "run_01.fbx"))
+        self.tree.expand(self.get_folder_index("walk"))
+        wait_until(lambda: get_row_names(self.tree.proxy) == ["run_02.fbx"])
+        self.assertEqual(get_row_names(self.tree.proxy), ["run_02.fbx"])
+
+
+if __name__ == "__main__":
+    unittest.main()